@@ -0,0 +1,180 @@
+"""
+归档已完成的历史任务：把 task_date 早于 N 天前的已完成任务连同子任务移入 archived_tasks / archived_subtasks
+用法: python backend/archive.py --days 90 [--workspace <name>]
+"""
+import sys, os
+sys.path.append(os.path.dirname(__file__))
+
+import threading
+import time
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
+
+from database import ARCHIVE_AFTER_DAYS, engine, Task, SubTask, ArchivedTask
+from fastjson import IN_BATCH_SIZE, assemble, task_query
+from events import publish_changes
+
+# --- 冷热分离：tasks 只保留活跃任务，列表、计数、排序的开销不再随历史增长 ---
+# 归档在同一个数据库文件内的 archived_* 表中，每批一个 BEGIN IMMEDIATE 事务，写锁只持有很短时间。
+# daily_stats 继续覆盖归档任务（归档时把删除触发器扣掉的计数加回），日历、月度统计与 /api/stats 不受影响；
+# by-date / date-range 同时读取归档表（按 task_date 索引查找，范围内没有归档数据时只多一次索引探查）。
+# /api/tasks、/api/search、/api/changes 只包含活跃任务；修改或删除归档任务时先自动移回 tasks。
+# TODOEASE_ARCHIVE_AFTER_DAYS 大于 0 时启动后在后台执行，之后每隔 ARCHIVE_INTERVAL_SECONDS 执行一次；
+# 开启工作区时依次归档默认数据库和磁盘上的每个工作区（见 workspaces.py）。
+
+ARCHIVE_INTERVAL_SECONDS = 6 * 3600
+ARCHIVE_BATCH_SIZE = IN_BATCH_SIZE  # 每批任务数，同时受 SQLite 绑定参数上限约束
+
+TASK_COPY_COLUMNS = "id, title, description, completed, created_at, task_date, order_index"
+SUBTASK_COPY_COLUMNS = "id, title, completed, created_at, order_index, parent_task_id"
+
+
+def _archive_batch(conn, cutoff: str, archived_at: str, workspace: Optional[str]) -> int:
+    conn.exec_driver_sql("BEGIN IMMEDIATE")
+    try:
+        ids = [task_id for (task_id,) in conn.exec_driver_sql(
+            "SELECT id FROM tasks WHERE completed = 1 AND task_date < ? LIMIT ?", (cutoff, ARCHIVE_BATCH_SIZE)
+        )]
+        if not ids:
+            conn.rollback()
+            return 0
+        marks = ", ".join("?" * len(ids))
+        conn.exec_driver_sql(
+            f"INSERT INTO archived_tasks ({TASK_COPY_COLUMNS}, archived_at) "
+            f"SELECT {TASK_COPY_COLUMNS}, ? FROM tasks WHERE id IN ({marks})", (archived_at, *ids))
+        conn.exec_driver_sql(
+            f"INSERT INTO archived_subtasks ({SUBTASK_COPY_COLUMNS}, archived_at) "
+            f"SELECT {SUBTASK_COPY_COLUMNS}, ? FROM subtasks WHERE parent_task_id IN ({marks})", (archived_at, *ids))
+        conn.exec_driver_sql(f"DELETE FROM subtasks WHERE parent_task_id IN ({marks})", tuple(ids))
+        conn.exec_driver_sql(f"DELETE FROM tasks WHERE id IN ({marks})", tuple(ids))
+        # 删除触发器已从 daily_stats 扣掉这些任务，加回来：归档不改变每日汇总
+        conn.exec_driver_sql(
+            f"""INSERT INTO daily_stats (task_date, total, completed)
+                SELECT task_date, COUNT(*), SUM(COALESCE(completed, 0)) FROM archived_tasks
+                WHERE id IN ({marks}) GROUP BY task_date
+                ON CONFLICT (task_date) DO UPDATE SET
+                    total = total + excluded.total, completed = completed + excluded.completed""", tuple(ids))
+        revision = conn.exec_driver_sql("SELECT value FROM meta WHERE key = 'revision'").scalar()
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    # 统计结果不变，无需失效 stats_cache；客户端收到通知后刷新列表
+    publish_changes(revision, [{"type": "task", "action": "archived", "count": len(ids)}], workspace)
+    return len(ids)
+
+
+def archive_completed(days: int = ARCHIVE_AFTER_DAYS, today: Optional[date] = None,
+                      bind=engine, workspace: Optional[str] = None) -> int:
+    """归档 task_date 早于 today - days 的已完成任务，返回归档的任务数；bind 为 workspace 的引擎"""
+    cutoff = ((today or date.today()) - timedelta(days=days)).isoformat()
+    archived_at = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S.%f")
+    total = 0
+    with bind.connect() as conn:
+        while True:
+            count = _archive_batch(conn, cutoff, archived_at, workspace)
+            total += count
+            if count < ARCHIVE_BATCH_SIZE:
+                return total
+
+
+def start_archiver() -> None:
+    from workspaces import WORKSPACES_ENABLED, workspace_engine, workspace_names
+
+    def archive(workspace: Optional[str]) -> None:
+        try:
+            if workspace is None:
+                count = archive_completed()
+            else:
+                with workspace_engine(workspace) as bind:
+                    count = archive_completed(bind=bind, workspace=workspace)
+            if count:
+                print(f"[archive] {count} tasks archived" + (f" in workspace {workspace}" if workspace else ""))
+        except Exception as e:
+            # 归档失败（如数据库忙）不影响服务，下个周期重试
+            print(f"[archive] failed: {e}")
+
+    def run():
+        while True:
+            for workspace in [None] + (workspace_names() if WORKSPACES_ENABLED else []):
+                archive(workspace)
+            time.sleep(ARCHIVE_INTERVAL_SECONDS)
+
+    threading.Thread(target=run, name="archiver", daemon=True).start()
+
+
+# --- 读取 ---
+def archived_tasks(db, start: date, end: date) -> List[Dict]:
+    """task_date 在 [start, end] 内的归档任务（含子任务），结构与 fastjson.assemble 相同"""
+    rows = task_query(db, archived=True).filter(
+        ArchivedTask.task_date >= start,
+        ArchivedTask.task_date <= end
+    ).all()
+    return assemble(db, rows, archived=True) if rows else []
+
+
+# --- 恢复：对归档任务的写操作先把它移回 tasks ---
+def restore_task(db, task_id: int) -> bool:
+    """在调用方的事务中把归档任务及其子任务移回 tasks / subtasks；不是归档任务时返回 False"""
+    conn = db.connection()
+    row = conn.exec_driver_sql(
+        "SELECT task_date, completed FROM archived_tasks WHERE id = ?", (task_id,)
+    ).first()
+    if row is None:
+        return False
+    # 归档表没有 revision 列，写 0 占位，插入触发器随即分配新的 revision
+    conn.exec_driver_sql(
+        f"INSERT INTO tasks ({TASK_COPY_COLUMNS}, revision) "
+        f"SELECT {TASK_COPY_COLUMNS}, 0 FROM archived_tasks WHERE id = ?", (task_id,))
+    conn.exec_driver_sql(
+        f"INSERT INTO subtasks ({SUBTASK_COPY_COLUMNS}, revision) "
+        f"SELECT {SUBTASK_COPY_COLUMNS}, 0 FROM archived_subtasks WHERE parent_task_id = ?", (task_id,))
+    conn.exec_driver_sql("DELETE FROM archived_subtasks WHERE parent_task_id = ?", (task_id,))
+    conn.exec_driver_sql("DELETE FROM archived_tasks WHERE id = ?", (task_id,))
+    task_date, completed = row
+    if task_date is not None:
+        # 插入触发器又把任务计入了 daily_stats，扣回
+        conn.exec_driver_sql(
+            "UPDATE daily_stats SET total = total - 1, completed = completed - ? WHERE task_date = ?",
+            (int(bool(completed)), task_date))
+    return True
+
+
+def get_task(db, task_id: int) -> Optional[Task]:
+    """按 id 取任务，已归档的先恢复"""
+    task = db.get(Task, task_id)
+    if task is None and restore_task(db, task_id):
+        task = db.get(Task, task_id)
+    return task
+
+
+def get_subtask(db, subtask_id: int) -> Optional[SubTask]:
+    """按 id 取子任务，属于归档任务时先恢复整个父任务"""
+    subtask = db.get(SubTask, subtask_id)
+    if subtask is None:
+        parent_id = db.connection().exec_driver_sql(
+            "SELECT parent_task_id FROM archived_subtasks WHERE id = ?", (subtask_id,)
+        ).scalar()
+        if parent_id is not None and restore_task(db, parent_id):
+            subtask = db.get(SubTask, subtask_id)
+    return subtask
+
+
+if __name__ == "__main__":
+    import argparse
+    from database import create_tables
+
+    parser = argparse.ArgumentParser(description="归档已完成的历史任务")
+    parser.add_argument("--days", type=int, default=ARCHIVE_AFTER_DAYS or 90,
+                        help="归档 task_date 早于该天数之前的已完成任务")
+    parser.add_argument("--workspace", help="归档该工作区的数据库（默认为 todoease.db）")
+    args = parser.parse_args()
+    if args.workspace:
+        from workspaces import valid_name, workspace_engine
+        if not valid_name(args.workspace):
+            parser.error(f"invalid workspace name: {args.workspace!r}")
+        with workspace_engine(args.workspace) as bind:
+            print(f"archived: {archive_completed(args.days, bind=bind, workspace=args.workspace)} tasks")
+    else:
+        create_tables()
+        print(f"archived: {archive_completed(args.days)} tasks")
@@ -0,0 +1,107 @@
+import functools
+import inspect
+import os
+
+from fastapi import Depends, Request
+from fastapi.encoders import jsonable_encoder
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import Response
+
+from database import (DB_PATH, DB_POOL_SIZE, DB_POOL_TIMEOUT, SessionLocal, data_dir, apply_pragmas, begin_write,
+                      sqlite_url)
+from metrics import instrument_engine
+
+# --- 异步数据库模式：TODOEASE_ASYNC_DB=1 时使用 aiosqlite 引擎，端点不再占用线程池 ---
+
+ASYNC_DB = os.environ.get("TODOEASE_ASYNC_DB", "").lower() in ("1", "true", "yes", "on")
+
+async_engine = None
+AsyncSessionLocal = None
+
+
+def make_async_engine(path: str = DB_PATH, pool_size: int = DB_POOL_SIZE):
+    """与 database.make_engine 配置相同的 aiosqlite 引擎"""
+    from sqlalchemy import event
+    from sqlalchemy.ext.asyncio import create_async_engine
+    from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+    new_engine = create_async_engine(
+        sqlite_url(path).replace("sqlite:///", "sqlite+aiosqlite:///", 1),
+        poolclass=AsyncAdaptedQueuePool,
+        pool_size=pool_size,
+        max_overflow=0,
+        pool_timeout=DB_POOL_TIMEOUT,
+    )
+    event.listen(new_engine.sync_engine, "connect", apply_pragmas)
+    instrument_engine(new_engine.sync_engine, data_dir)
+    return new_engine
+
+
+if ASYNC_DB:
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+
+    async_engine = make_async_engine()
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False)
+    if hasattr(os, "register_at_fork"):
+        os.register_at_fork(after_in_child=lambda: async_engine.sync_engine.dispose(close=False))
+
+# 写请求的会话在端点开始执行时取得写锁（见 database.begin_write），多个线程或 worker 进程的写入按顺序排队。
+# 加锁与端点在同一次线程池调用中完成：持锁的请求不必再等待空闲线程，不会被排队的请求卡住。
+# 开启工作区（workspaces.py）时，WorkspaceMiddleware 把本次请求的工作区放在 scope["workspace"]，会话改由它创建。
+WRITE_METHODS = frozenset(("POST", "PUT", "PATCH", "DELETE"))
+
+
+def get_sync_db(request: Request):
+    workspace = request.scope.get("workspace")
+    db = workspace.SessionLocal() if workspace is not None else SessionLocal()
+    db.info["write"] = request.method in WRITE_METHODS
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+async def get_async_db(request: Request):
+    workspace = request.scope.get("workspace")
+    async with (workspace.AsyncSessionLocal if workspace is not None else AsyncSessionLocal)() as db:
+        db.info["write"] = request.method in WRITE_METHODS
+        yield db
+
+
+get_session = get_async_db if ASYNC_DB else get_sync_db
+
+
+def db_endpoint(func=None, *, lock: bool = True):
+    """
+    把同步写法的端点（参数 db: Session）包装成 async 端点
+    - 同步模式：在线程池中用普通 Session 执行，与原先的 def 端点一致
+    - 异步模式：通过 AsyncSession.run_sync 在事件循环上执行，IO 交给 aiosqlite
+    返回值在会话内编码成 JSON 兼容结构，避免离开会话后再触发懒加载
+    lock=False 时写请求不在开始时取得写锁，由端点在需要同步写入时自行调用 begin_write（见 writeback.py）
+    """
+    if func is None:
+        return functools.partial(db_endpoint, lock=lock)
+
+    signature = inspect.signature(func)
+    parameters = [
+        param.replace(default=Depends(get_session)) if name == "db" else param
+        for name, param in signature.parameters.items()
+    ]
+
+    def call(session, args, kwargs):
+        if lock and session.info.get("write"):
+            begin_write(session)
+        result = func(*args, db=session, **kwargs)
+        if isinstance(result, Response):
+            return result
+        return jsonable_encoder(result)
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        db = kwargs.pop("db")
+        if ASYNC_DB:
+            return await db.run_sync(call, args, kwargs)
+        return await run_in_threadpool(call, db, args, kwargs)
+
+    wrapper.__signature__ = signature.replace(parameters=parameters)
+    return wrapper
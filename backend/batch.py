@@ -0,0 +1,126 @@
+from typing import Dict, List
+
+from pydantic import ValidationError
+
+import models
+from database import Task, SubTask
+from ordering import ORDER_GAP, next_order_index
+from recurrence import get_subtask, get_task
+
+# --- 批量增删改：先逐条校验并暂存到会话，最后一次 flush 批量写入 ---
+
+
+class BatchError(Exception):
+    pass
+
+
+class _OrderAllocator:
+    """为同一批中的新条目分配排序键，每个范围只查询一次 max(order_index)"""
+
+    def __init__(self, db):
+        self.db = db
+        self.next: Dict[tuple, int] = {}
+
+    def allocate(self, key, model, scope) -> int:
+        if key not in self.next:
+            self.next[key] = next_order_index(self.db, model, scope) if scope is not None else 0
+        value = self.next[key]
+        self.next[key] = value + ORDER_GAP
+        return value
+
+
+def _validated(schema, data):
+    try:
+        return schema.model_validate(data)
+    except ValidationError as e:
+        raise BatchError("; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors()))
+
+
+def _get(db, model, item_id, label):
+    if item_id is None:
+        raise BatchError(f"{label} id is required")
+    # 与单条接口一致：虚拟的重复实例先落库，已归档的任务/子任务先移回活跃表
+    obj = get_task(db, item_id) if model is Task else get_subtask(db, item_id)
+    if obj is None:
+        raise BatchError(f"{label} not found")
+    # 同一批中已删除（含随父任务级联删除）的条目只是暂存为待删除，再修改会在提交时丢失或留下孤儿子任务
+    if obj in db.deleted:
+        raise BatchError(f"{label} was deleted earlier in this batch")
+    return obj
+
+
+def _apply(db, op, index, created: List, orders: _OrderAllocator):
+    if op.type == "task":
+        if op.op == "create":
+            data = _validated(models.TaskCreate, op.data).model_dump()
+            if data.get("task_date") is None:
+                data.pop("task_date", None)
+            obj = Task(**data)
+            obj.order_index = orders.allocate(("task",), Task, [])
+            db.add(obj)
+            return obj
+        obj = _get(db, Task, op.id, "Task")
+        if op.op == "update":
+            for field, value in _validated(models.TaskUpdate, op.data).model_dump(exclude_unset=True).items():
+                setattr(obj, field, value)
+        else:
+            db.delete(obj)
+        return obj
+
+    if op.op == "create":
+        data = _validated(models.SubTaskCreate, op.data).model_dump()
+        obj = SubTask(**data)
+        if op.task_ref is not None:
+            if not (0 <= op.task_ref < index) or not isinstance(created[op.task_ref], Task) \
+                    or created[op.task_ref] in db.deleted:
+                raise BatchError("task_ref must point to an earlier task operation")
+            parent = created[op.task_ref]
+            # 父任务可能尚未写入（没有 id），用关系挂接，flush 时一并插入
+            obj.parent_task = parent
+            key, scope = ("subtask", "ref", op.task_ref), None
+            if parent.id is not None:
+                key, scope = ("subtask", parent.id), [SubTask.parent_task_id == parent.id]
+        else:
+            parent = _get(db, Task, op.task_id, "Task")
+            obj.parent_task_id = parent.id
+            key, scope = ("subtask", parent.id), [SubTask.parent_task_id == parent.id]
+        obj.order_index = orders.allocate(key, SubTask, scope)
+        db.add(obj)
+        return obj
+    obj = _get(db, SubTask, op.id, "Subtask")
+    if op.op == "update":
+        for field, value in _validated(models.SubTaskUpdate, op.data).model_dump(exclude_unset=True).items():
+            setattr(obj, field, value)
+    else:
+        db.delete(obj)
+    return obj
+
+
+def apply_batch(db, operations: List[models.BatchOperation], atomic: bool = True) -> Dict:
+    """
+    执行一批操作并提交一次；返回 {"committed": bool, "results": [...]}
+    atomic=True 时任一操作失败则整批回滚；否则跳过失败项，其余照常提交
+    """
+    results, objects = [], []
+    orders = _OrderAllocator(db)
+    for index, op in enumerate(operations):
+        try:
+            objects.append(_apply(db, op, index, objects, orders))
+            results.append({"index": index, "ok": True, "id": op.id})
+        except BatchError as e:
+            objects.append(None)
+            results.append({"index": index, "ok": False, "error": str(e)})
+
+    if atomic and any(not r["ok"] for r in results):
+        db.rollback()
+        for r in results:
+            r["id"] = None
+        return {"committed": False, "results": results}
+
+    db.flush()
+    # 新建的条目以及由虚拟重复实例落库的任务在 flush 后才有实际 id
+    for r, obj in zip(results, objects):
+        if r["ok"]:
+            r["id"] = obj.id
+    db.commit()
+    return {"committed": True, "results": results}
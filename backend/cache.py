@@ -0,0 +1,157 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Hashable, Iterable, Optional, Tuple
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from database import Task, WORKERS, watch_connection
+
+# --- 统计/日历接口的进程内 LRU 缓存，写入提交后按月份失效 ---
+# 缓存条目属于某个“桶”：(year, month) 表示某个月，("year", year) 表示全年，ALL 表示全局统计。
+# 任务的新增、删除、completed 或 task_date 变化会让相关月份和 ALL 失效；
+# 只改排序、标题或子任务不影响这些统计，不会失效任何条目。
+# 多进程部署（TODOEASE_WORKERS > 1）时其他 worker 的写入不经过本进程的 Session 事件：
+# 每次读缓存前检查 PRAGMA data_version，数据库有任何新提交就整体清空（粒度变粗，但不会读到过期统计）。
+# 开启工作区（workspaces.py）时每个打开的工作区有自己的 StatsCache，由其 Session 的 info["stats_cache"] 指向，
+# 端点通过 cache_for(db) 取得；默认数据库使用模块级的 stats_cache。
+
+ALL = "all"
+Bucket = Optional[Hashable]
+
+STATS_AFFECTING = ("completed", "task_date")
+
+
+class _ExternalWrites:
+    """PRAGMA data_version 在其他连接提交后变化；使用连接池之外的独立连接，本进程的提交同样可见"""
+
+    def __init__(self, workspace: Optional[str] = None):
+        self._workspace = workspace
+        self._conn = None
+        self._version = None
+
+    def changed(self) -> bool:
+        if self._conn is None:
+            self._conn = watch_connection(self._workspace)
+        version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        changed = self._version is not None and version != self._version
+        self._version = version
+        return changed
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+class StatsCache:
+    def __init__(self, maxsize: int = 256, shared: bool = False, workspace: Optional[str] = None):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Hashable, Tuple[Bucket, object]]" = OrderedDict()
+        self._generation = {}
+        self._epoch = 0  # clear() 时加一
+        self._external = _ExternalWrites(workspace) if shared else None
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key: Hashable, bucket: Bucket, compute: Callable):
+        if self.maxsize <= 0:
+            return compute()
+        with self._lock:
+            if self._external is not None and self._external.changed():
+                self._clear()
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key][1]
+            self.misses += 1
+            generation = self._generation.get(bucket, 0)
+            epoch = self._epoch
+
+        value = compute()
+
+        with self._lock:
+            # 计算期间该桶被写入失效过，结果可能已过时，不缓存
+            if self._generation.get(bucket, 0) == generation and self._epoch == epoch:
+                self._data[key] = (bucket, value)
+                self._data.move_to_end(key)
+                while len(self._data) > self.maxsize:
+                    self._data.popitem(last=False)
+        return value
+
+    def invalidate(self, buckets: Iterable[Bucket]) -> None:
+        buckets = set(buckets)
+        if not buckets:
+            return
+        with self._lock:
+            for bucket in buckets:
+                self._generation[bucket] = self._generation.get(bucket, 0) + 1
+            for key in [k for k, (b, _) in self._data.items() if b in buckets]:
+                del self._data[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._clear()
+
+    def _clear(self) -> None:
+        self._epoch += 1
+        self._data.clear()
+
+    def info(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._data), "maxsize": self.maxsize}
+
+    def close(self) -> None:
+        """关闭工作区时释放检查外部写入用的连接"""
+        with self._lock:
+            self._clear()
+            if self._external is not None:
+                self._external.close()
+
+
+CACHE_SIZE = int(os.environ.get("TODOEASE_CACHE_SIZE", "256"))
+
+stats_cache = StatsCache(CACHE_SIZE, shared=WORKERS > 1)
+
+
+def cache_for(session) -> StatsCache:
+    """会话所属数据库的统计缓存"""
+    return session.info.get("stats_cache", stats_cache)
+
+
+def _month(value) -> Optional[Tuple[int, int]]:
+    return (value.year, value.month) if value is not None else None
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_dirty_months(session, flush_context):
+    months = session.info.setdefault("stats_buckets", set())
+    for obj in list(session.new) + list(session.deleted):
+        if isinstance(obj, Task):
+            months.update({_month(obj.task_date), ALL})
+    for obj in session.dirty:
+        if not isinstance(obj, Task):
+            continue
+        state = inspect(obj)
+        for attr in STATS_AFFECTING:
+            history = state.attrs[attr].history
+            if history.has_changes():
+                months.add(ALL)
+                if attr == "task_date":
+                    months.update(_month(v) for v in history.added + history.deleted)
+                else:
+                    months.add(_month(obj.task_date))
+    months.discard(None)
+    months.update({("year", b[0]) for b in list(months) if isinstance(b, tuple) and b[0] != "year"})
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_on_commit(session):
+    cache_for(session).invalidate(session.info.pop("stats_buckets", ()))
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_on_rollback(session):
+    session.info.pop("stats_buckets", None)
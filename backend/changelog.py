@@ -0,0 +1,47 @@
+from typing import Dict, Optional
+
+from fastapi import Request, Response
+from sqlalchemy import text
+
+from database import Task, SubTask, Tombstone, WRITE_BEHIND
+
+# --- 增量同步：全局 revision 由 migrations.CHANGELOG_DDL 中的触发器维护 ---
+
+
+def current_revision(db) -> int:
+    return db.execute(text("SELECT value FROM meta WHERE key = 'revision'")).scalar() or 0
+
+
+def check_etag(request: Request, response: Response, db) -> Optional[Response]:
+    """
+    给列表响应加上以 revision 为值的弱 ETag（工作区的数据库各自计数，ETag 带上工作区名以免通过请求头切换时误命中）
+    客户端 If-None-Match 命中时返回 304 响应，否则返回 None 继续正常处理
+    """
+    workspace = db.info.get("workspace")
+    revision = current_revision(db)
+    if WRITE_BEHIND:
+        from writeback import write_behind
+        revision = f"{revision}{write_behind.etag_suffix()}"  # 有未提交的合并修改时内容已变化
+    etag = f'W/"{workspace}-{revision}"' if workspace else f'W/"{revision}"'
+    candidates = [tag.strip() for tag in request.headers.get("if-none-match", "").split(",")]
+    if etag in candidates or "*" in candidates:
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    return None
+
+
+def collect_changes(db, since: int) -> Dict:
+    """revision 大于 since 的任务、子任务以及删除记录"""
+    revision = current_revision(db)
+    tasks = db.query(Task).filter(Task.revision > since).order_by(Task.revision).all()
+    subtasks = db.query(SubTask).filter(SubTask.revision > since).order_by(SubTask.revision).all()
+
+    # SQLite 可能复用已删除的 id：同一 id 之后又被新建时，删除记录已过时
+    live = {("task", t.id): t.revision for t in tasks}
+    live.update({("subtask", s.id): s.revision for s in subtasks})
+    deleted = [
+        {"type": t.entity, "id": t.entity_id, "revision": t.revision}
+        for t in db.query(Tombstone).filter(Tombstone.revision > since).order_by(Tombstone.revision)
+        if live.get((t.entity, t.entity_id), -1) < t.revision
+    ]
+    return {"revision": revision, "tasks": tasks, "subtasks": subtasks, "deleted": deleted}
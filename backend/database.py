@@ -1,7 +1,14 @@
-from sqlalchemy import create_engine, Column, Integer, String, Boolean, DateTime, Date, ForeignKey
+from sqlalchemy import create_engine, Column, Integer, String, Boolean, DateTime, Date, ForeignKey, Index, JSON, event, inspect, text
+from sqlalchemy.pool import QueuePool
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
+from contextlib import contextmanager
 from datetime import datetime, date
+from typing import Optional
+
+from metrics import instrument_engine
+from migrations import (NEW_DATABASE_STEPS, SCHEMA_VERSION, get_schema_version, migrate, run_steps,
+                        schema_transaction, stamp)
 
 # --- 可写数据目录：优先用 Electron 传入的 TODOEASE_DATA_DIR，兜底 ~/.todoease ---
 import os
@@ -12,10 +19,87 @@ if not data_dir:
     data_dir = str((Path.home() / ".todoease").resolve())
 
 Path(data_dir).mkdir(parents=True, exist_ok=True)
-SQLITE_DATABASE_URL = "sqlite:///" + str(Path(data_dir) / "todoease.db").replace("\\", "/")
+DB_PATH = str(Path(data_dir) / "todoease.db")
+WORKSPACES_DIR = str(Path(data_dir) / "workspaces")  # 工作区数据库目录，见 workspaces.py
+
+def database_path(workspace: Optional[str] = None) -> str:
+    """默认数据库或某个工作区的数据库文件路径；工作区名由 workspaces.py 校验"""
+    if workspace is None:
+        return DB_PATH
+    return str(Path(WORKSPACES_DIR) / f"{workspace}.db")
+
+def sqlite_url(path: str) -> str:
+    return "sqlite:///" + path.replace("\\", "/")
+
+SQLITE_DATABASE_URL = sqlite_url(DB_PATH)
+
+# 多进程部署（uvicorn --workers / gunicorn）时设为 worker 数，见 run.py；大于 1 时开启跨进程的缓存失效与事件转发
+WORKERS = int(os.environ.get("TODOEASE_WORKERS", "1"))
+
+# 可选功能的开关：定义在这里，main 启动时据此决定是否导入 archive / workspaces / writeback，关闭时不占用启动时间
+ARCHIVE_AFTER_DAYS = int(os.environ.get("TODOEASE_ARCHIVE_AFTER_DAYS", "0"))        # 见 archive.py
+WORKSPACES_ENABLED = os.environ.get("TODOEASE_WORKSPACES", "").lower() in ("1", "true", "yes", "on")  # 见 workspaces.py
+WRITE_BEHIND_MS = float(os.environ.get("TODOEASE_WRITE_BEHIND_MS", "0"))            # 见 writeback.py
+WRITE_BEHIND = WRITE_BEHIND_MS > 0 and WORKERS == 1  # 待写入的修改只在本进程内存中，多进程时不开启
+
+# --- SQLite 调优：TODOEASE_DB_PROFILE 选择预设，TODOEASE_DB_<PRAGMA> 可单独覆盖 ---
+DB_PROFILES = {
+    # WAL：读写互不阻塞；synchronous=NORMAL 在 WAL 下仍保证一致性，只可能丢失最后几次提交
+    "performance": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "mmap_size": 268435456,    # 256 MB
+        "cache_size": -65536,      # 负数单位为 KiB，即 64 MB
+        "temp_store": "MEMORY",
+        "busy_timeout": 5000,      # 毫秒
+    },
+    # 保持 SQLite 默认的回滚日志与 synchronous=FULL，只加忙等待
+    "compat": {
+        "busy_timeout": 5000,
+    },
+}
+
+DB_PROFILE = os.environ.get("TODOEASE_DB_PROFILE", "performance").lower()
+if DB_PROFILE not in DB_PROFILES:
+    raise ValueError(f"Unknown TODOEASE_DB_PROFILE: {DB_PROFILE!r} (choose from {', '.join(DB_PROFILES)})")
+
+SQLITE_PRAGMAS = dict(DB_PROFILES[DB_PROFILE])
+for _pragma in ("journal_mode", "synchronous", "mmap_size", "cache_size", "temp_store", "busy_timeout"):
+    _value = os.environ.get(f"TODOEASE_DB_{_pragma.upper()}")
+    if _value:
+        SQLITE_PRAGMAS[_pragma] = _value
+
+# SQLite 同一时刻只有一个写者，连接池不宜过大；max_overflow=0 保证连接数有上限
+DB_POOL_SIZE = int(os.environ.get("TODOEASE_DB_POOL_SIZE", "5"))
+DB_POOL_TIMEOUT = float(os.environ.get("TODOEASE_DB_POOL_TIMEOUT", "30"))
+
+def apply_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+        for pragma, value in SQLITE_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {pragma} = {value}")
+    finally:
+        cursor.close()
 
 # --- SQLAlchemy ---
-engine = create_engine(SQLITE_DATABASE_URL, connect_args={"check_same_thread": False})
+def make_engine(path: str = DB_PATH, pool_size: int = DB_POOL_SIZE):
+    """带 PRAGMA 与语句计时的同步引擎；默认数据库与各工作区的数据库共用同一套配置"""
+    new_engine = create_engine(
+        sqlite_url(path),
+        connect_args={"check_same_thread": False},
+        poolclass=QueuePool,
+        pool_size=pool_size,
+        max_overflow=0,
+        pool_timeout=DB_POOL_TIMEOUT,
+    )
+    event.listen(new_engine, "connect", apply_pragmas)
+    instrument_engine(new_engine, data_dir)  # 语句计数/计时，见 metrics.py
+    return new_engine
+
+engine = make_engine()
+if hasattr(os, "register_at_fork"):
+    # 导入后再 fork 的部署（如 gunicorn --preload）：子进程丢弃继承的连接，各自建立连接池
+    os.register_at_fork(after_in_child=lambda: engine.dispose(close=False))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
@@ -29,7 +113,26 @@ class Task(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     task_date = Column(Date, default=date.today)
     order_index = Column(Integer, default=0)
-    subtasks = relationship("SubTask", back_populates="parent_task", cascade="all, delete-orphan")
+    # 由变更日志触发器维护；server_default 与迁移 3/6 建出的列一致，外部脚本插入时可以省略该列
+    revision = Column(Integer, default=0, server_default=text("0"), nullable=False)
+    # selectin：一次 IN 查询批量加载整个结果集的子任务，避免序列化时 N+1
+    subtasks = relationship(
+        "SubTask",
+        back_populates="parent_task",
+        cascade="all, delete-orphan",
+        lazy="selectin",
+        order_by="(SubTask.order_index, SubTask.id)",
+    )
+
+    # 新库由 create_all 直接建索引；已有数据库由 migrations.py 补建
+    __table_args__ = (
+        Index("ix_tasks_date_order", "task_date", "order_index"),
+        Index("ix_tasks_order_id", "order_index", "id"),
+        Index("ix_tasks_completed", "completed"),
+        Index("ix_tasks_revision", "revision"),
+        # AUTOINCREMENT：id 不复用，归档后移走的任务 id 不会被新任务占用（旧库由迁移 6 重建）
+        {"sqlite_autoincrement": True},
+    )
 
 class SubTask(Base):
     __tablename__ = "subtasks"
@@ -39,15 +142,180 @@ class SubTask(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     order_index = Column(Integer, default=0)
     parent_task_id = Column(Integer, ForeignKey("tasks.id"))
+    revision = Column(Integer, default=0, server_default=text("0"), nullable=False)
     parent_task = relationship("Task", back_populates="subtasks")
 
+    __table_args__ = (
+        Index("ix_subtasks_parent_order", "parent_task_id", "order_index"),
+        Index("ix_subtasks_revision", "revision"),
+        {"sqlite_autoincrement": True},
+    )
+
+class ArchivedTask(Base):
+    """已归档的历史任务，列与 tasks 相同；由 archive.py 移入，仍计入 daily_stats"""
+    __tablename__ = "archived_tasks"
+    id = Column(Integer, primary_key=True)
+    title = Column(String, nullable=False)
+    description = Column(String, default="")
+    completed = Column(Boolean, default=False)
+    created_at = Column(DateTime)
+    task_date = Column(Date)
+    order_index = Column(Integer, default=0)
+    archived_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_archived_tasks_date_order", "task_date", "order_index"),
+    )
+
+class ArchivedSubTask(Base):
+    """已归档任务的子任务，随父任务一起移入/移回"""
+    __tablename__ = "archived_subtasks"
+    id = Column(Integer, primary_key=True)
+    title = Column(String, nullable=False)
+    completed = Column(Boolean, default=False)
+    created_at = Column(DateTime)
+    order_index = Column(Integer, default=0)
+    parent_task_id = Column(Integer, nullable=False)
+    archived_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_archived_subtasks_parent_order", "parent_task_id", "order_index"),
+    )
+
+class TaskTemplate(Base):
+    """重复任务模板：只保存一次规则，实例由 recurrence.py 按查询窗口展开"""
+    __tablename__ = "task_templates"
+    id = Column(Integer, primary_key=True)
+    title = Column(String, nullable=False)
+    description = Column(String, default="")
+    subtasks = Column(JSON, default=list)        # 子任务标题列表
+    frequency = Column(String, nullable=False)   # daily / weekly / monthly
+    interval = Column(Integer, nullable=False, default=1)
+    weekdays = Column(JSON, default=list)        # weekly：0=周一 ... 6=周日，为空时取 start_date 的星期
+    start_date = Column(Date, nullable=False, default=date.today)
+    end_date = Column(Date)
+    order_index = Column(Integer, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class TemplateOccurrence(Base):
+    """已落库（编辑/完成时转为真实任务）的实例；展开时跳过这些日期"""
+    __tablename__ = "template_occurrences"
+    template_id = Column(Integer, primary_key=True)
+    occurrence_date = Column(Date, primary_key=True)
+    task_id = Column(Integer)
+
+    __table_args__ = (
+        Index("ix_template_occurrences_date", "occurrence_date"),
+    )
+
+class Meta(Base):
+    """键值表：全局 revision 计数器，以及短词索引 search_grams 已同步到的 revision（见 search.py）"""
+    __tablename__ = "meta"
+    key = Column(String, primary_key=True)
+    value = Column(Integer, nullable=False, default=0)
+
+class Tombstone(Base):
+    """已删除条目的记录，供 /api/changes 增量同步"""
+    __tablename__ = "tombstones"
+    id = Column(Integer, primary_key=True)
+    entity = Column(String, nullable=False)   # "task" / "subtask"
+    entity_id = Column(Integer, nullable=False)
+    revision = Column(Integer, nullable=False, index=True)
+
+class DailyStat(Base):
+    """每日汇总，由 migrations.ROLLUP_DDL 中的触发器维护，可用 rollup.py 重建"""
+    __tablename__ = "daily_stats"
+    task_date = Column(Date, primary_key=True)
+    total = Column(Integer, nullable=False, default=0)
+    completed = Column(Integer, nullable=False, default=0)
+
 # --- 初始化工具 ---
-def create_tables():
-    Base.metadata.create_all(bind=engine)
+@contextmanager
+def schema_lock(path: str = DB_PATH):
+    """跨进程互斥锁（数据库文件旁的 .lock 文件），多个 worker 同时启动时只有一个执行建表与迁移"""
+    with open(path + ".lock", "a+b") as f:
+        if os.name == "nt":
+            import msvcrt
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:  # LK_LOCK 重试约 10 秒后放弃，迁移可能更久，继续等待
+                    pass
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+def create_tables(bind=engine, path: str = DB_PATH):
+    """建表并迁移到最新版本；版本号已是最新时只读一次 PRAGMA user_version 就返回"""
+    with bind.connect() as conn:
+        if get_schema_version(conn) == SCHEMA_VERSION:
+            return
+    with schema_lock(path):
+        # 等锁期间其他进程可能已完成迁移
+        with bind.connect() as conn:
+            if get_schema_version(conn) == SCHEMA_VERSION:
+                return
+        _create_or_migrate(bind)
 
-def get_db():
-    db = SessionLocal()
+def _create_or_migrate(bind):
+    if not inspect(bind).has_table(Task.__tablename__):
+        # 建表、触发器与版本号在同一事务中完成，中断后不会留下没有版本号的半成品
+        # 触发器、FTS 虚拟表无法由 create_all 创建；旧库由对应的迁移补建
+        with schema_transaction(bind) as conn:
+            Base.metadata.create_all(bind=conn)
+            run_steps(conn, NEW_DATABASE_STEPS)
+            stamp(conn)
+    else:
+        Base.metadata.create_all(bind=bind)  # 只补建缺少的表，可重复执行
+        migrate(bind)
+
+# 预热：TODOEASE_DB_WARMUP=1 时启动后在后台建立连接池中的连接（执行 PRAGMA、建立 mmap），
+# 并顺序读一遍任务/子任务及其排序索引，把页面读入操作系统缓存，首个列表请求不再等待磁盘
+DB_WARMUP = os.environ.get("TODOEASE_DB_WARMUP", "").lower() in ("1", "true", "yes", "on")
+
+WARMUP_QUERIES = [
+    "SELECT COUNT(*), MAX(title), MAX(description) FROM tasks",
+    "SELECT SUM(order_index) FROM tasks INDEXED BY ix_tasks_order_id",
+    "SELECT COUNT(*), MAX(title) FROM subtasks",
+    "SELECT SUM(order_index) FROM subtasks INDEXED BY ix_subtasks_parent_order",
+    "SELECT COUNT(*) FROM daily_stats",
+]
+
+def warm_up():
+    connections = []
     try:
-        yield db
+        for _ in range(DB_POOL_SIZE):
+            connections.append(engine.connect())
+        for sql in WARMUP_QUERIES:
+            connections[0].exec_driver_sql(sql).all()
+    except Exception as e:
+        # 预热失败不影响正常服务
+        print(f"[warmup] skipped: {e}")
     finally:
-        db.close()
+        for conn in connections:
+            conn.close()
+
+def begin_write(db) -> None:
+    """
+    以 BEGIN IMMEDIATE 开始会话的事务，先取得写锁再读取
+    默认的延迟事务先读后写，在另一连接（或另一进程）已提交后升级为写事务会直接报 database is locked，
+    不经过 busy_timeout 等待；立即事务则在开始时按 busy_timeout 排队
+    """
+    db.connection().exec_driver_sql("BEGIN IMMEDIATE")
+
+def watch_connection(workspace: Optional[str] = None):
+    """连接池之外的独立连接，用于读取 PRAGMA data_version / revision 以察觉其他进程的提交"""
+    import sqlite3
+    conn = sqlite3.connect(database_path(workspace), check_same_thread=False, isolation_level=None)
+    conn.execute(f"PRAGMA busy_timeout = {SQLITE_PRAGMAS.get('busy_timeout', 5000)}")
+    return conn
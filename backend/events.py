@@ -0,0 +1,220 @@
+import asyncio
+import json
+import threading
+from typing import Dict, List, Optional
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from starlette.middleware.gzip import GZipMiddleware
+
+from database import Task, SubTask, WORKERS, watch_connection
+
+# --- /api/events 推送：每次提交后向所有 SSE 订阅者广播一条变更通知 ---
+# 与 cache.py 一样挂在 Session 事件上：after_flush 收集本事务中新增/修改/删除的任务和子任务，
+# after_commit 广播，回滚则丢弃。不经过 ORM 的批量语句（如 bulk_reorder）由端点调用 notify() 补记。
+# 每个订阅者只是事件循环上的一个协程加一个有界队列，不占用线程；没有订阅者时不做任何收集。
+# 多进程部署时其他 worker 的提交不会在本进程广播：有订阅者期间每 EXTERNAL_POLL_SECONDS 读一次 revision，
+# 超过本进程已广播的 revision 时向订阅者发送 resync。
+# 开启工作区（workspaces.py）时订阅者只收到所订阅工作区的变更；工作区由 Session 的 info["workspace"] 标明，
+# 默认数据库为 None。revision 也按工作区分别记录。
+
+EVENTS_PATH = "/api/events"
+HEARTBEAT_SECONDS = 15       # 空闲时发送注释行，及时发现已断开的连接
+QUEUE_SIZE = 256             # 订阅者积压超过该数量时清空队列，改发一条 resync
+MAX_CHANGES_PER_EVENT = 100  # 单次提交的变更过多时截断，客户端据 truncated 整体刷新
+RETRY_MS = 3000
+EXTERNAL_POLL_SECONDS = 1.0
+
+_RESYNC = object()
+
+
+class Broadcaster:
+    def __init__(self, shared: bool = False):
+        self._subscribers = set()  # {(loop, queue, 工作区)}
+        self._lock = threading.Lock()
+        self._shared = shared
+        self._watcher = None       # 多进程模式下轮询 revision 的任务
+        self.last_revision = {}    # 工作区 -> 本进程已广播的最大 revision
+
+    @property
+    def active(self) -> bool:
+        return bool(self._subscribers)
+
+    def count(self) -> int:
+        return len(self._subscribers)
+
+    def publish(self, message: Dict, workspace: Optional[str] = None) -> None:
+        """可在任意线程调用（同步模式下提交发生在线程池中）；消息只编码一次，同一工作区的订阅者共享"""
+        if message.get("revision") is not None:
+            self.last_revision[workspace] = max(self.last_revision.get(workspace, 0), message["revision"])
+        self._send(_sse_message(message), workspace)
+
+    def _send(self, data, workspace: Optional[str]) -> None:
+        with self._lock:
+            subscribers = [s for s in self._subscribers if s[2] == workspace]
+        for subscriber in subscribers:
+            loop, queue, _ = subscriber
+            try:
+                loop.call_soon_threadsafe(_offer, queue, data)
+            except RuntimeError:  # 事件循环已关闭
+                self._discard(subscriber)
+
+    async def stream(self, resync: bool = False, workspace: Optional[str] = None):
+        """SSE 生成器；客户端断开时 StreamingResponse 取消该生成器，finally 中退订"""
+        subscriber = (asyncio.get_running_loop(), asyncio.Queue(QUEUE_SIZE), workspace)
+        with self._lock:
+            self._subscribers.add(subscriber)
+        if self._shared and (self._watcher is None or self._watcher.done()):
+            self._watcher = asyncio.create_task(self._watch_other_workers())
+        try:
+            yield f"retry: {RETRY_MS}\n\n"
+            if resync:
+                # 带 Last-Event-ID 的重连：断开期间的变更已经错过，让客户端整体刷新
+                yield "event: resync\ndata: {}\n\n"
+            queue = subscriber[1]
+            while True:
+                try:
+                    data = await asyncio.wait_for(queue.get(), HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                if data is _RESYNC:
+                    yield "event: resync\ndata: {}\n\n"
+                else:
+                    yield data
+        finally:
+            self._discard(subscriber)
+
+    def _discard(self, subscriber) -> None:
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    async def _watch_other_workers(self):
+        connections = {}  # 有订阅者的工作区 -> 独立连接
+
+        def read_revision(workspace):
+            return connections[workspace].execute("SELECT value FROM meta WHERE key = 'revision'").fetchone()[0]
+
+        try:
+            while self._subscribers:
+                with self._lock:
+                    watched = {s[2] for s in self._subscribers}
+                for workspace in set(connections) - watched:
+                    connections.pop(workspace).close()
+                for workspace in watched:
+                    first = workspace not in connections
+                    if first:
+                        connections[workspace] = watch_connection(workspace)
+                    revision = await asyncio.to_thread(read_revision, workspace)
+                    if revision > self.last_revision.get(workspace, 0):
+                        self.last_revision[workspace] = revision
+                        if not first:  # 首次读取只记下当前 revision
+                            self._send(_RESYNC, workspace)
+                await asyncio.sleep(EXTERNAL_POLL_SECONDS)
+        finally:
+            for conn in connections.values():
+                conn.close()
+
+
+def _offer(queue: asyncio.Queue, data: str) -> None:
+    if queue.full():
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(_RESYNC)
+    else:
+        queue.put_nowait(data)
+
+
+broadcaster = Broadcaster(shared=WORKERS > 1)
+
+
+def _sse_message(message: Dict) -> str:
+    # id 为提交后的 revision，断线重连时浏览器通过 Last-Event-ID 带回
+    event_id = f"id: {message['revision']}\n" if message.get("revision") is not None else ""
+    data = json.dumps(message, ensure_ascii=False, separators=(",", ":"))
+    return f"{event_id}event: change\ndata: {data}\n\n"
+
+
+def _format(revision: Optional[int], changes: List[Dict]) -> Dict:
+    message = {"revision": revision, "changes": changes[:MAX_CHANGES_PER_EVENT]}
+    if len(changes) > MAX_CHANGES_PER_EVENT:
+        message["truncated"] = True
+    return message
+
+
+def publish_changes(revision: Optional[int], changes: List[Dict], workspace: Optional[str] = None) -> None:
+    """广播一次提交中的变更；不经过 Session 的写入（如批量导入）提交后直接调用"""
+    if changes:
+        broadcaster.publish(_format(revision, changes), workspace)
+
+
+def _describe(obj, action: str) -> Optional[Dict]:
+    if isinstance(obj, Task):
+        return {"type": "task", "action": action, "id": obj.id}
+    if isinstance(obj, SubTask):
+        return {"type": "subtask", "action": action, "id": obj.id, "task_id": obj.parent_task_id}
+    return None
+
+
+def _record_revision(session) -> None:
+    # 变更日志触发器已在本事务内更新 meta.revision，客户端可据此调用 /api/changes?since=
+    session.info["events_revision"] = session.connection().exec_driver_sql(
+        "SELECT value FROM meta WHERE key = 'revision'"
+    ).scalar()
+
+
+def notify(session, change_type: str, action: str, **fields) -> None:
+    """记录 ORM 事件覆盖不到的变更（如 Core 批量 UPDATE），随本次提交一起广播"""
+    if not broadcaster.active:
+        return
+    session.info.setdefault("events", []).append({"type": change_type, "action": action, **fields})
+    _record_revision(session)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changes(session, flush_context):
+    if not broadcaster.active:
+        return
+    changes = session.info.setdefault("events", [])
+    for obj in session.new:
+        changes.append(_describe(obj, "created"))
+    for obj in session.dirty:
+        if not session.is_modified(obj, include_collections=False):
+            continue
+        # 只改了排序键（move 接口）时标为 reordered，客户端可只调整顺序
+        changed = {attr.key for attr in inspect(obj).attrs if attr.history.has_changes()}
+        changes.append(_describe(obj, "reordered" if changed == {"order_index"} else "updated"))
+    for obj in session.deleted:
+        changes.append(_describe(obj, "deleted"))
+    changes[:] = [c for c in changes if c is not None]
+    if changes:
+        _record_revision(session)
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_on_commit(session):
+    changes = session.info.pop("events", None)
+    revision = session.info.pop("events_revision", None)
+    publish_changes(revision, changes, session.info.get("workspace"))
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_on_rollback(session):
+    session.info.pop("events", None)
+    session.info.pop("events_revision", None)
+
+
+class EventStreamGZipMiddleware(GZipMiddleware):
+    """
+    与 GZipMiddleware 相同，但跳过 /api/events 等逐条推送的路径：gzip 会缓冲小块数据，消息无法及时送达
+    """
+
+    def __init__(self, app, exclude_paths=(EVENTS_PATH,), **kwargs):
+        super().__init__(app, **kwargs)
+        self.exclude_paths = frozenset(exclude_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"] in self.exclude_paths:
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
@@ -0,0 +1,82 @@
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Optional
+
+from starlette.responses import Response
+
+from database import Task, SubTask, ArchivedTask, ArchivedSubTask, WRITE_BEHIND
+
+# --- 列表接口的快速序列化：直接读列元组，一次拼装任务/子任务结构，跳过逐个 Pydantic 校验 ---
+# 输出字段与顺序与 models.Task / models.SubTask 保持一致，API 结构不变。
+
+try:
+    import orjson
+
+    def dumps(obj) -> bytes:
+        return orjson.dumps(obj)
+except ImportError:  # orjson 为可选依赖，缺失时退回标准库
+    import json
+
+    def _default(value):
+        if isinstance(value, (date, datetime)):
+            return value.isoformat()
+        raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+    def dumps(obj) -> bytes:
+        return json.dumps(obj, default=_default, ensure_ascii=False, separators=(",", ":")).encode()
+
+TASK_COLUMNS = (
+    Task.title, Task.description, Task.completed, Task.order_index,
+    Task.id, Task.created_at, Task.task_date,
+)
+SUBTASK_COLUMNS = (
+    SubTask.title, SubTask.completed, SubTask.order_index,
+    SubTask.id, SubTask.created_at, SubTask.parent_task_id,
+)
+TASK_FIELDS = [c.key for c in TASK_COLUMNS]
+SUBTASK_FIELDS = [c.key for c in SUBTASK_COLUMNS]
+# 归档表列名相同，按同样顺序取列即可复用下面的拼装逻辑
+ARCHIVED_TASK_COLUMNS = tuple(getattr(ArchivedTask, key) for key in TASK_FIELDS)
+ARCHIVED_SUBTASK_COLUMNS = tuple(getattr(ArchivedSubTask, key) for key in SUBTASK_FIELDS)
+
+# SQLite 单条语句的绑定参数有上限，子任务按批次查询
+IN_BATCH_SIZE = 500
+
+
+def task_query(db, archived: bool = False):
+    """只取任务列的查询，可继续 filter / order_by / limit；archived=True 时查询归档表"""
+    return db.query(*(ARCHIVED_TASK_COLUMNS if archived else TASK_COLUMNS))
+
+
+def assemble(db, rows: Iterable, archived: bool = False) -> List[Dict]:
+    """把任务行转成字典，并用每批一条 IN 查询挂上子任务（archived=True 时从归档子任务表读取）"""
+    model = ArchivedSubTask if archived else SubTask
+    columns = ARCHIVED_SUBTASK_COLUMNS if archived else SUBTASK_COLUMNS
+    tasks = [dict(zip(TASK_FIELDS, row)) for row in rows]
+    by_id = {}
+    for task in tasks:
+        task["subtasks"] = []
+        by_id[task["id"]] = task
+
+    ids = list(by_id)
+    for start in range(0, len(ids), IN_BATCH_SIZE):
+        subtasks = db.query(*columns).filter(
+            model.parent_task_id.in_(ids[start:start + IN_BATCH_SIZE])
+        ).order_by(model.parent_task_id, model.order_index, model.id)
+        for row in subtasks:
+            subtask = dict(zip(SUBTASK_FIELDS, row))
+            by_id[subtask["parent_task_id"]]["subtasks"].append(subtask)
+    if WRITE_BEHIND and not archived:
+        from writeback import write_behind
+        write_behind.overlay(db, tasks)  # 写合并模式下尚未提交的标题/勾选修改
+    return tasks
+
+
+def json_response(payload, response: Optional[Response] = None) -> Response:
+    """
+    直接返回编码好的 JSON；FastAPI 不会合并注入的 response 参数上的头，
+    这里把 ETag、X-Next-Cursor 等自定义头复制过来
+    """
+    headers = None
+    if response is not None:
+        headers = {k: v for k, v in response.headers.items() if k not in ("content-length", "content-type")}
+    return Response(content=dumps(payload), media_type="application/json", headers=headers)
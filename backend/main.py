@@ -1,18 +1,50 @@
-from fastapi import FastAPI, Depends, HTTPException
+import sys, os
+sys.path.append(os.path.dirname(__file__))  # 确保当前目录在模块搜索路径
+from startup import PROFILE_STARTUP, StartupTimer, mark  # 最先导入，启动计时从这里开始
+
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from sqlalchemy import func, case
 from sqlalchemy.orm import Session
+from contextlib import asynccontextmanager
+import asyncio
+from starlette.concurrency import run_in_threadpool
 from typing import List, Optional
 from datetime import datetime, timedelta, timezone, date
-import sys, os
-sys.path.append(os.path.dirname(__file__))  # 确保当前目录在模块搜索路径
+mark("import fastapi/sqlalchemy")
 
 import models
-from database import get_db, create_tables, Task, SubTask
+from database import create_tables, warm_up, begin_write, data_dir, DB_WARMUP, SessionLocal, Task, SubTask, DailyStat, TaskTemplate, TemplateOccurrence
+from database import ARCHIVE_AFTER_DAYS, WORKSPACES_ENABLED, WRITE_BEHIND, WRITE_BEHIND_MS
+from async_db import db_endpoint, get_session
+from pagination import encode_cursor, after_cursor, MAX_PAGE_SIZE
+from ordering import bulk_reorder, move_between, next_order_index
+from changelog import check_etag, collect_changes
+from cache import stats_cache, cache_for, ALL
+from fastjson import assemble, dumps, json_response, task_query
+from static_assets import FrontendAssets, CachedStaticFiles
+import metrics
+from events import EVENTS_PATH, EventStreamGZipMiddleware, broadcaster, notify
+# batch、search、transfer、archive、recurrence 只在对应接口首次调用时导入，不占用启动时间；
+# workspaces、writeback 及后台归档只在对应开关打开时导入（开关见 database.py）
+mark("import app modules")
+
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if WORKSPACES_ENABLED:
+        # 只有默认数据库的请求时，空闲的工作区也要按时关闭
+        idle_sweeper = asyncio.create_task(workspace_registry.close_idle())
+    yield
+    if WORKSPACES_ENABLED:
+        idle_sweeper.cancel()
+    if WRITE_BEHIND:
+        # 写合并模式下退出前提交内存中尚未写入的修改
+        from writeback import write_behind
+        await run_in_threadpool(write_behind.stop)
 
-app = FastAPI(title="ToDoEase API", version="1.0.0")
+app = FastAPI(title="ToDoEase API", version="1.0.0", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -22,7 +54,34 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# JSON 与静态资源超过阈值时 gzip 压缩；已有预压缩版本（Content-Encoding 已设置）的响应、SSE 和导入进度会被跳过
+app.add_middleware(EventStreamGZipMiddleware, exclude_paths=(EVENTS_PATH, "/api/import"),
+                   minimum_size=int(os.environ.get("TODOEASE_GZIP_MIN_SIZE", "1024")))
+
+# 请求耗时与 SQL 计数；在 GZip 之后添加，位于其外层，计时包含压缩
+if metrics.METRICS_ENABLED:
+    app.add_middleware(metrics.MetricsMiddleware)
+
+if PROFILE_STARTUP:
+    app.add_middleware(StartupTimer, data_dir=data_dir)
+
+# 工作区路由（TODOEASE_WORKSPACES=1）：最后添加，位于最外层，其他中间件与路由看到的是去掉 /w/<name> 前缀后的路径
+if WORKSPACES_ENABLED:
+    from workspaces import WorkspaceMiddleware, registry as workspace_registry
+    app.add_middleware(WorkspaceMiddleware, registry=workspace_registry)
+
+frontend_assets = FrontendAssets("frontend")
+
 create_tables()
+mark("schema check")
+if DB_WARMUP:
+    import threading
+    threading.Thread(target=warm_up, name="db-warmup", daemon=True).start()
+if ARCHIVE_AFTER_DAYS > 0:
+    from archive import start_archiver
+    start_archiver()
+if WRITE_BEHIND_MS > 0 and not WRITE_BEHIND:
+    print("[write-behind] disabled: pending updates are per process, requires TODOEASE_WORKERS=1")
 
 @app.get("/favicon.ico")
 async def favicon():
@@ -30,50 +89,165 @@ async def favicon():
 
 @app.get("/")
 @app.head("/")
-async def read_index():
-    return FileResponse("frontend/index.html")
+async def read_index(request: Request):
+    """index.html 需每次重新验证；其中的静态资源引用已带内容指纹，可长期缓存"""
+    return frontend_assets.index_response(request.headers)
 
-app.mount("/static", StaticFiles(directory="frontend"), name="static")
+app.mount("/static", CachedStaticFiles(directory="frontend", assets=frontend_assets), name="static")
 
 @app.get("/api/tasks", response_model=List[models.Task])
-def get_tasks(db: Session = Depends(get_db)):
-    """获取所有任务，按order_index排序"""
-    tasks = db.query(Task).order_by(Task.order_index).all()
-    return tasks
+@db_endpoint
+def get_tasks(
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    stream: bool = False,
+    db: Session = Depends(get_session),
+):
+    """
+    获取任务，按 (order_index, id) 排序
+    - 不带参数：返回全部任务（兼容旧前端）
+    - limit/cursor：键集分页，下一页游标放在 X-Next-Cursor 响应头
+    - stream=true：以 NDJSON 逐行输出，边读边写
+    支持 ETag / If-None-Match，数据未变化时返回 304
+    响应由 fastjson 直接从列元组拼装编码，结构与 models.Task 一致
+    """
+    not_modified = check_etag(request, response, db)
+    if not_modified:
+        return not_modified
+    try:
+        query = after_cursor(task_query(db), Task, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    query = query.order_by(Task.order_index, Task.id)
+
+    if stream:
+        # 依赖注入的会话要到响应发送完才关闭；先归还它的连接，流式读取只占用生成器自己的一个连接，
+        # 否则并发的流式请求数达到连接池大小时会互相等待直到超时
+        db.close()
+        return StreamingResponse(_stream_tasks(_workspace(request), cursor, limit), media_type="application/x-ndjson",
+                                 headers={"ETag": response.headers["ETag"]})
+
+    if limit is None:
+        return json_response(assemble(db, query.all()), response)
+
+    tasks = assemble(db, query.limit(limit + 1).all())
+    if len(tasks) > limit:
+        tasks = tasks[:limit]
+        last = tasks[-1]
+        response.headers["X-Next-Cursor"] = encode_cursor(last["order_index"], last["id"])
+    return json_response(tasks, response)
+
+STREAM_BATCH_SIZE = 500
+
+def _workspace(request: Request):
+    """WorkspaceMiddleware 为本次请求选中的工作区；使用默认数据库时为 None"""
+    return request.scope.get("workspace")
+
+def _stream_tasks(workspace, cursor: Optional[str], limit: Optional[int]):
+    """NDJSON 生成器：使用独立会话按键集分批读取，内存只与批大小相关"""
+    db = workspace.SessionLocal() if workspace is not None else SessionLocal()
+    try:
+        remaining = limit
+        while remaining is None or remaining > 0:
+            size = STREAM_BATCH_SIZE if remaining is None else min(STREAM_BATCH_SIZE, remaining)
+            rows = after_cursor(task_query(db), Task, cursor).order_by(Task.order_index, Task.id).limit(size).all()
+            if not rows:
+                break
+            tasks = assemble(db, rows)
+            yield b"".join(dumps(task) + b"\n" for task in tasks)
+            last = tasks[-1]
+            cursor = encode_cursor(last["order_index"], last["id"])
+            if remaining is not None:
+                remaining -= len(tasks)
+    finally:
+        db.close()
 
 @app.post("/api/tasks", response_model=models.Task)
-def create_task(task: models.TaskCreate, db: Session = Depends(get_db)):
+@db_endpoint
+def create_task(task: models.TaskCreate, db: Session = Depends(get_session)):
     """创建新任务"""
     task_data = task.model_dump()
     if task.task_date is None:
         task_data.pop('task_date', None)  # 使用数据库默认值
     
     db_task = Task(**task_data)
-    max_order = db.query(Task).count()
-    db_task.order_index = max_order
+    db_task.order_index = next_order_index(db, Task)
     db.add(db_task)
     db.commit()
     db.refresh(db_task)
     return db_task
 
-@app.put("/api/tasks/{task_id}", response_model=models.Task)
-def update_task(task_id: int, task: models.TaskUpdate, db: Session = Depends(get_db)):
-    """更新任务"""
+@app.put("/api/tasks/reorder")
+@db_endpoint
+def reorder_tasks(task_ids: List[int], db: Session = Depends(get_session)):
+    """重新排序任务（需注册在 /api/tasks/{task_id} 之前，否则会被其匹配）"""
+    bulk_reorder(db, Task, task_ids)
+    notify(db, "task", "reordered")
+    db.commit()
+    return {"message": "Tasks reordered"}
+
+@app.put("/api/tasks/{task_id}/move", response_model=models.Task)
+@db_endpoint
+def move_task(task_id: int, move: models.MoveRequest, db: Session = Depends(get_session)):
+    """把任务移动到 after_id 与 before_id 之间，通常只写一行"""
     db_task = db.query(Task).filter(Task.id == task_id).first()
     if not db_task:
         raise HTTPException(status_code=404, detail="Task not found")
     
-    for field, value in task.model_dump(exclude_unset=True).items():
+    neighbours = []
+    for neighbour_id in (move.after_id, move.before_id):
+        neighbour = None
+        if neighbour_id is not None:
+            if neighbour_id == task_id:
+                raise HTTPException(status_code=400, detail="Task cannot be its own neighbour")
+            neighbour = db.query(Task).filter(Task.id == neighbour_id).first()
+            if not neighbour:
+                raise HTTPException(status_code=404, detail="Neighbour task not found")
+        neighbours.append(neighbour)
+    
+    try:
+        move_between(db, Task, db_task, *neighbours)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    db.commit()
+    db.refresh(db_task)
+    return db_task
+
+@app.put("/api/tasks/{task_id}", response_model=models.Task)
+@db_endpoint(lock=not WRITE_BEHIND)
+def update_task(task_id: int, task: models.TaskUpdate, db: Session = Depends(get_session)):
+    """更新任务；开启写合并（TODOEASE_WRITE_BEHIND_MS）时只改标题/描述的修改先在内存中合并，稍后批量提交"""
+    from recurrence import get_task
+    fields = task.model_dump(exclude_unset=True)
+    if WRITE_BEHIND:
+        from writeback import write_behind
+        deferred = write_behind.update(db, Task, task_id, fields)
+        if deferred is not None:
+            return deferred
+        write_behind.flush_rows(db, [(Task, task_id)])
+        begin_write(db)
+    
+    db_task = get_task(db, task_id)  # 重复模板的虚拟实例先落库，已归档的任务先移回 tasks
+    if not db_task:
+        raise HTTPException(status_code=404, detail="Task not found")
+    
+    for field, value in fields.items():
         setattr(db_task, field, value)
     
     db.commit()
     db.refresh(db_task)
+    if WRITE_BEHIND:
+        return write_behind.apply(db, db_task)  # 子任务可能有尚未提交的修改
     return db_task
 
 @app.delete("/api/tasks/{task_id}")
-def delete_task(task_id: int, db: Session = Depends(get_db)):
+@db_endpoint
+def delete_task(task_id: int, db: Session = Depends(get_session)):
     """删除任务"""
-    db_task = db.query(Task).filter(Task.id == task_id).first()
+    from recurrence import get_task
+    db_task = get_task(db, task_id)
     if not db_task:
         raise HTTPException(status_code=404, detail="Task not found")
     
@@ -82,28 +256,40 @@ def delete_task(task_id: int, db: Session = Depends(get_db)):
     return {"message": "Task deleted"}
 
 @app.post("/api/tasks/{task_id}/subtasks", response_model=models.SubTask)
-def create_subtask(task_id: int, subtask: models.SubTaskCreate, db: Session = Depends(get_db)):
+@db_endpoint
+def create_subtask(task_id: int, subtask: models.SubTaskCreate, db: Session = Depends(get_session)):
     """为任务创建子任务"""
-    db_task = db.query(Task).filter(Task.id == task_id).first()
+    from recurrence import get_task
+    db_task = get_task(db, task_id)
     if not db_task:
         raise HTTPException(status_code=404, detail="Task not found")
     
     db_subtask = SubTask(**subtask.model_dump(), parent_task_id=task_id)
-    max_order = db.query(SubTask).filter(SubTask.parent_task_id == task_id).count()
-    db_subtask.order_index = max_order
+    db_subtask.order_index = next_order_index(db, SubTask, [SubTask.parent_task_id == task_id])
     db.add(db_subtask)
     db.commit()
     db.refresh(db_subtask)
     return db_subtask
 
 @app.put("/api/subtasks/{subtask_id}", response_model=models.SubTask)
-def update_subtask(subtask_id: int, subtask: models.SubTaskUpdate, db: Session = Depends(get_db)):
-    """更新子任务"""
-    db_subtask = db.query(SubTask).filter(SubTask.id == subtask_id).first()
+@db_endpoint(lock=not WRITE_BEHIND)
+def update_subtask(subtask_id: int, subtask: models.SubTaskUpdate, db: Session = Depends(get_session)):
+    """更新子任务；开启写合并时勾选与改标题先在内存中合并"""
+    from recurrence import get_subtask
+    fields = subtask.model_dump(exclude_unset=True)
+    if WRITE_BEHIND:
+        from writeback import write_behind
+        deferred = write_behind.update(db, SubTask, subtask_id, fields)
+        if deferred is not None:
+            return deferred
+        write_behind.flush_rows(db, [(SubTask, subtask_id)])
+        begin_write(db)
+    
+    db_subtask = get_subtask(db, subtask_id)
     if not db_subtask:
         raise HTTPException(status_code=404, detail="Subtask not found")
     
-    for field, value in subtask.model_dump(exclude_unset=True).items():
+    for field, value in fields.items():
         setattr(db_subtask, field, value)
     
     db.commit()
@@ -111,9 +297,11 @@ def update_subtask(subtask_id: int, subtask: models.SubTaskUpdate, db: Session =
     return db_subtask
 
 @app.delete("/api/subtasks/{subtask_id}")
-def delete_subtask(subtask_id: int, db: Session = Depends(get_db)):
+@db_endpoint
+def delete_subtask(subtask_id: int, db: Session = Depends(get_session)):
     """删除子任务"""
-    db_subtask = db.query(SubTask).filter(SubTask.id == subtask_id).first()
+    from recurrence import get_subtask
+    db_subtask = get_subtask(db, subtask_id)
     if not db_subtask:
         raise HTTPException(status_code=404, detail="Subtask not found")
     
@@ -121,146 +309,389 @@ def delete_subtask(subtask_id: int, db: Session = Depends(get_db)):
     db.commit()
     return {"message": "Subtask deleted"}
 
-@app.put("/api/tasks/reorder")
-def reorder_tasks(task_ids: List[int], db: Session = Depends(get_db)):
-    """重新排序任务"""
-    for index, task_id in enumerate(task_ids):
-        db_task = db.query(Task).filter(Task.id == task_id).first()
-        if db_task:
-            db_task.order_index = index
-    db.commit()
-    return {"message": "Tasks reordered"}
-
 @app.put("/api/tasks/{task_id}/subtasks/reorder")
-def reorder_subtasks(task_id: int, subtask_ids: List[int], db: Session = Depends(get_db)):
+@db_endpoint
+def reorder_subtasks(task_id: int, subtask_ids: List[int], db: Session = Depends(get_session)):
     """重新排序子任务"""
-    for index, subtask_id in enumerate(subtask_ids):
-        db_subtask = db.query(SubTask).filter(
-            SubTask.id == subtask_id, 
-            SubTask.parent_task_id == task_id
-        ).first()
-        if db_subtask:
-            db_subtask.order_index = index
+    bulk_reorder(db, SubTask, subtask_ids, scope=[SubTask.parent_task_id == task_id])
+    notify(db, "subtask", "reordered", task_id=task_id)
     db.commit()
     return {"message": "Subtasks reordered"}
 
-@app.get("/api/stats", response_model=models.TaskStats)
-def get_stats(db: Session = Depends(get_db)):
-    """获取任务统计信息"""
-    total_tasks = db.query(Task).count()
-    completed_tasks = db.query(Task).filter(Task.completed == True).count()
-    completion_percentage = (completed_tasks / total_tasks * 100) if total_tasks > 0 else 0
+@app.put("/api/subtasks/{subtask_id}/move", response_model=models.SubTask)
+@db_endpoint
+def move_subtask(subtask_id: int, move: models.MoveRequest, db: Session = Depends(get_session)):
+    """把子任务移动到同一父任务下 after_id 与 before_id 之间"""
+    db_subtask = db.query(SubTask).filter(SubTask.id == subtask_id).first()
+    if not db_subtask:
+        raise HTTPException(status_code=404, detail="Subtask not found")
     
-    return models.TaskStats(
-        total_tasks=total_tasks,
-        completed_tasks=completed_tasks,
-        completion_percentage=round(completion_percentage, 1)
+    neighbours = []
+    for neighbour_id in (move.after_id, move.before_id):
+        neighbour = None
+        if neighbour_id is not None:
+            neighbour = db.query(SubTask).filter(
+                SubTask.id == neighbour_id,
+                SubTask.parent_task_id == db_subtask.parent_task_id,
+                SubTask.id != subtask_id
+            ).first()
+            if not neighbour:
+                raise HTTPException(status_code=404, detail="Neighbour subtask not found")
+        neighbours.append(neighbour)
+    
+    try:
+        move_between(db, SubTask, db_subtask, *neighbours,
+                     scope=[SubTask.parent_task_id == db_subtask.parent_task_id])
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    db.commit()
+    db.refresh(db_subtask)
+    return db_subtask
+
+@app.get("/api/templates", response_model=List[models.Template])
+@db_endpoint
+def get_templates(db: Session = Depends(get_session)):
+    """重复任务模板列表"""
+    return db.query(TaskTemplate).order_by(TaskTemplate.order_index, TaskTemplate.id).all()
+
+def _check_template(db_template: TaskTemplate):
+    if db_template.end_date is not None and db_template.end_date < db_template.start_date:
+        raise HTTPException(status_code=400, detail="end_date must not be before start_date")
+
+@app.post("/api/templates", response_model=models.Template)
+@db_endpoint
+def create_template(template: models.TemplateCreate, db: Session = Depends(get_session)):
+    """
+    创建重复任务模板
+    实例在按日期查询时展开（负数 id），编辑、完成或删除某个实例时才写入 tasks
+    """
+    data = template.model_dump()
+    if data.get("start_date") is None:
+        data.pop("start_date", None)
+    db_template = TaskTemplate(**data)
+    if db_template.start_date is None:
+        db_template.start_date = date.today()
+    _check_template(db_template)
+    db.add(db_template)
+    notify(db, "template", "created")
+    db.commit()
+    db.refresh(db_template)
+    cache_for(db).clear()  # 日历/月度统计包含展开的实例
+    return db_template
+
+@app.put("/api/templates/{template_id}", response_model=models.Template)
+@db_endpoint
+def update_template(template_id: int, template: models.TemplateUpdate, db: Session = Depends(get_session)):
+    """更新模板；已落库的实例不受影响"""
+    db_template = db.get(TaskTemplate, template_id)
+    if not db_template:
+        raise HTTPException(status_code=404, detail="Template not found")
+    
+    for field, value in template.model_dump(exclude_unset=True).items():
+        setattr(db_template, field, value)
+    _check_template(db_template)
+    
+    notify(db, "template", "updated", id=template_id)
+    db.commit()
+    db.refresh(db_template)
+    cache_for(db).clear()
+    return db_template
+
+@app.delete("/api/templates/{template_id}")
+@db_endpoint
+def delete_template(template_id: int, db: Session = Depends(get_session)):
+    """删除模板及其落库记录；已落库的实例保留为普通任务"""
+    db_template = db.get(TaskTemplate, template_id)
+    if not db_template:
+        raise HTTPException(status_code=404, detail="Template not found")
+    
+    db.query(TemplateOccurrence).filter(TemplateOccurrence.template_id == template_id).delete()
+    db.delete(db_template)
+    notify(db, "template", "deleted", id=template_id)
+    db.commit()
+    cache_for(db).clear()
+    return {"message": "Template deleted"}
+
+@app.post("/api/batch", response_model=models.BatchResponse)
+@db_endpoint(lock=not WRITE_BEHIND)
+def run_batch(batch: models.BatchRequest, db: Session = Depends(get_session)):
+    """
+    在一个事务中执行一批任务/子任务的增删改，只提交一次
+    atomic=true（默认）时任一操作失败则整批回滚并返回 400
+    """
+    from batch import apply_batch
+    if WRITE_BEHIND:
+        from writeback import write_behind
+        # 先提交要修改的行在内存中合并的修改，再取得写锁
+        write_behind.flush_rows(db, [(Task if op.type == "task" else SubTask, op.id)
+                                     for op in batch.operations if op.op == "update" and op.id is not None])
+        begin_write(db)
+    result = apply_batch(db, batch.operations, atomic=batch.atomic)
+    if not result["committed"]:
+        return JSONResponse(status_code=400, content=result)
+    return result
+
+@app.get("/api/changes", response_model=models.Changes)
+@db_endpoint
+def get_changes(since: int = Query(0, ge=0), db: Session = Depends(get_session)):
+    """返回 revision 大于 since 的任务、子任务和删除记录，用于增量同步"""
+    return collect_changes(db, since)
+
+@app.get("/api/search", response_model=models.SearchResults)
+@db_endpoint
+def search_tasks(
+    q: str = Query(..., min_length=1),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    db: Session = Depends(get_session),
+):
+    """全文搜索任务标题、描述和子任务标题，支持中文子串匹配"""
+    from search import search, SearchUnavailable
+    try:
+        return search(db, q, limit, offset)
+    except SearchUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+@app.get(EVENTS_PATH)
+async def task_events(request: Request):
+    """
+    SSE 推送：每次提交后发送一条 change 事件，data 为 {"revision", "changes": [{type, action, id, ...}]}
+    action 为 created / updated / deleted / reordered；收到 resync 事件时客户端应整体刷新
+    """
+    workspace = _workspace(request)
+    return StreamingResponse(
+        broadcaster.stream(resync="last-event-id" in request.headers,
+                           workspace=workspace.name if workspace is not None else None),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
 
-@app.get("/api/tasks/by-date")
-def get_tasks_by_date(date: str, db: Session = Depends(get_db)):
+@app.get("/api/export")
+async def export_tasks(request: Request, format: str = Query("ndjson", pattern="^(ndjson|csv)$")):
+    """流式导出全部任务及子任务（NDJSON：每行一个任务；CSV：任务行后紧跟其子任务行）"""
+    from transfer import FORMATS, export_stream
+    filename = f"todoease-{date.today().isoformat()}.{format}"
+    return StreamingResponse(export_stream(format, _workspace(request)), media_type=FORMATS[format],
+                             headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+@app.post("/api/import")
+async def import_tasks(request: Request, format: str = Query("ndjson", pattern="^(ndjson|csv)$")):
+    """
+    流式导入（请求体为 /api/export 的输出格式），追加到现有任务之后并重新分配 id
+    每提交一块输出一行 NDJSON 进度 {"tasks", "subtasks", "seconds"}，结束时带 done 或 error
+    """
+    from transfer import ImportProgressResponse, import_stream
+    return ImportProgressResponse(import_stream(request, format, _workspace(request)),
+                                  media_type="application/x-ndjson")
+
+@app.get("/api/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Prometheus 文本格式的运行指标：按路由的请求耗时、每个请求的 SQL 语句数与耗时、统计缓存命中"""
+    if not metrics.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    # 统计缓存按数据库分开，这里汇总默认数据库与当前打开的工作区
+    caches = [stats_cache.info()]
+    if WORKSPACES_ENABLED:
+        caches += [w.stats_cache.info() for w in workspace_registry.open_workspaces()]
+    cache = {key: sum(c[key] for c in caches) for key in ("hits", "misses")}
+    extra = [
+        "# HELP todoease_stats_cache_hits_total Stats cache hits",
+        "# TYPE todoease_stats_cache_hits_total counter",
+        f"todoease_stats_cache_hits_total {cache['hits']}",
+        "# HELP todoease_stats_cache_misses_total Stats cache misses",
+        "# TYPE todoease_stats_cache_misses_total counter",
+        f"todoease_stats_cache_misses_total {cache['misses']}",
+        "# HELP todoease_sse_subscribers Open /api/events connections",
+        "# TYPE todoease_sse_subscribers gauge",
+        f"todoease_sse_subscribers {broadcaster.count()}",
+    ]
+    if WRITE_BEHIND:
+        from writeback import write_behind
+        extra += [
+            "# HELP todoease_write_behind_pending Coalesced updates not yet committed",
+            "# TYPE todoease_write_behind_pending gauge",
+            f"todoease_write_behind_pending {write_behind.pending()}",
+            "# HELP todoease_write_behind_commits_total Transactions committed by the write-behind queue",
+            "# TYPE todoease_write_behind_commits_total counter",
+            f"todoease_write_behind_commits_total {write_behind.commits}",
+            "# HELP todoease_write_behind_rows_total Rows committed by the write-behind queue",
+            "# TYPE todoease_write_behind_rows_total counter",
+            f"todoease_write_behind_rows_total {write_behind.flushed_rows}",
+        ]
+    if WORKSPACES_ENABLED:
+        extra += [
+            "# HELP todoease_workspaces_open Workspaces with an open engine in this process",
+            "# TYPE todoease_workspaces_open gauge",
+            f"todoease_workspaces_open {len(caches) - 1}",
+        ]
+    return PlainTextResponse(metrics.render(extra), media_type=metrics.CONTENT_TYPE)
+
+@app.get("/api/stats", response_model=models.TaskStats)
+@db_endpoint
+def get_stats(db: Session = Depends(get_session)):
+    """获取任务统计信息（带缓存，任务写入后失效）"""
+    def compute():
+        # 每日汇总同时覆盖活跃与归档任务；没有日期的任务不在汇总中，单独计数
+        total_tasks, completed_tasks = db.query(
+            func.coalesce(func.sum(DailyStat.total), 0),
+            func.coalesce(func.sum(DailyStat.completed), 0),
+        ).one()
+        undated_total, undated_completed = db.query(func.count(Task.id), _completed_sum()).filter(
+            Task.task_date.is_(None)
+        ).one()
+        total_tasks += undated_total
+        completed_tasks += undated_completed
+        completion_percentage = (completed_tasks / total_tasks * 100) if total_tasks > 0 else 0
+        
+        return models.TaskStats(
+            total_tasks=total_tasks,
+            completed_tasks=completed_tasks,
+            completion_percentage=round(completion_percentage, 1)
+        )
+    
+    return cache_for(db).get_or_compute(("stats",), ALL, compute)
+
+@app.get("/api/cache/stats")
+def get_cache_stats(request: Request):
+    """统计缓存的命中/未命中计数（开启工作区时为所选工作区的缓存）"""
+    workspace = _workspace(request)
+    return (workspace.stats_cache if workspace is not None else stats_cache).info()
+
+@app.get("/api/tasks/by-date", response_model=List[models.Task])
+@db_endpoint
+def get_tasks_by_date(date: str, request: Request, response: Response, db: Session = Depends(get_session)):
     """
     获取指定日期的任务
     日期格式：YYYY-MM-DD
     """
+    from archive import archived_tasks
+    from recurrence import virtual_tasks
+    not_modified = check_etag(request, response, db)
+    if not_modified:
+        return not_modified
     try:
         # 解析日期字符串
         target_date = datetime.strptime(date, "%Y-%m-%d").date()
         
         # 查询该日期的任务
-        tasks = db.query(Task).filter(
+        rows = task_query(db).filter(
             Task.task_date == target_date
         ).order_by(Task.order_index).all()
+        tasks = assemble(db, rows)
+        
+        # 已归档的历史任务和重复模板展开的实例同样按日期返回
+        extra = archived_tasks(db, target_date, target_date) + virtual_tasks(db, target_date, target_date)
+        if extra:
+            tasks = sorted(tasks + extra, key=lambda t: t["order_index"])
         
-        return tasks
+        return json_response(tasks, response)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=f"Invalid date format. Use YYYY-MM-DD. Error: {str(e)}")
 
-@app.get("/api/tasks/date-range")
-def get_tasks_by_date_range(start_date: str, end_date: str, db: Session = Depends(get_db)):
+@app.get("/api/tasks/date-range", response_model=List[models.Task])
+@db_endpoint
+def get_tasks_by_date_range(start_date: str, end_date: str, request: Request, response: Response,
+                            db: Session = Depends(get_session)):
     """
     获取日期范围内的任务
     日期格式：YYYY-MM-DD
     """
+    from archive import archived_tasks
+    from recurrence import virtual_tasks
+    not_modified = check_etag(request, response, db)
+    if not_modified:
+        return not_modified
     try:
         # 解析日期
         start = datetime.strptime(start_date, "%Y-%m-%d").date()
         end = datetime.strptime(end_date, "%Y-%m-%d").date()
         
         # 查询
-        tasks = db.query(Task).filter(
+        rows = task_query(db).filter(
             Task.task_date >= start,
             Task.task_date <= end
         ).order_by(Task.task_date.desc()).all()
+        tasks = assemble(db, rows)
+        
+        extra = archived_tasks(db, start, end) + virtual_tasks(db, start, end)
+        if extra:
+            tasks = sorted(tasks + extra, key=lambda t: t["task_date"], reverse=True)
         
-        return tasks
+        return json_response(tasks, response)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=f"Invalid date format. Use YYYY-MM-DD. Error: {str(e)}")
 
+def _month_range(year: int, month: int):
+    """返回 [当月1日, 下月1日)"""
+    start_date = date(year, month, 1)
+    if month == 12:
+        end_date = date(year + 1, 1, 1)
+    else:
+        end_date = date(year, month + 1, 1)
+    return start_date, end_date
+
+def _daily_rows(db, start_date: date, end_date: date):
+    """[start_date, end_date) 内每天的 (日期, 总数, 完成数)：每日汇总加上重复模板尚未落库的实例（均未完成）"""
+    from recurrence import daily_counts
+    rows = {
+        task_date: [total, completed]
+        for task_date, total, completed in db.query(DailyStat.task_date, DailyStat.total, DailyStat.completed).filter(
+            DailyStat.task_date >= start_date,
+            DailyStat.task_date < end_date
+        )
+    }
+    for day, count in daily_counts(db, start_date, end_date - timedelta(days=1)).items():
+        rows.setdefault(day, [0, 0])[0] += count
+    return [(task_date, total, completed) for task_date, (total, completed) in sorted(rows.items())]
+
+def _completed_sum():
+    return func.coalesce(func.sum(case((Task.completed == True, 1), else_=0)), 0)
+
 @app.get("/api/calendar/summary")
-def get_calendar_summary(year: int, month: int, db: Session = Depends(get_db)):
+@db_endpoint
+def get_calendar_summary(year: int, month: int, db: Session = Depends(get_session)):
     """
     获取指定月份的日历摘要（每天的任务统计）
-    返回该月每天的任务总数和完成数
+    返回该月每天的任务总数和完成数；结果按月缓存，该月任务写入后失效
     """
-    try:
-        # 计算月份的开始和结束日期
-        start_date = date(year, month, 1)
-        if month == 12:
-            end_date = date(year + 1, 1, 1)
-        else:
-            end_date = date(year, month + 1, 1)
+    def compute():
+        start_date, end_date = _month_range(year, month)
         
-        # 获取该月份的所有任务
-        tasks = db.query(Task).filter(
-            Task.task_date >= start_date,
-            Task.task_date < end_date
-        ).all()
-        
-        # 按日期统计
-        daily_stats = {}
-        for task in tasks:
-            # 获取任务日期
-            task_date = task.task_date.isoformat()
-            
-            if task_date not in daily_stats:
-                daily_stats[task_date] = {
-                    "date": task_date,
-                    "total": 0,
-                    "completed": 0
-                }
-            
-            daily_stats[task_date]["total"] += 1
-            if task.completed:
-                daily_stats[task_date]["completed"] += 1
+        # 直接读取每日汇总表（最多 31 行），叠加重复模板的实例
+        rows = _daily_rows(db, start_date, end_date)
         
         return {
             "year": year,
             "month": month,
-            "daily_stats": list(daily_stats.values())
+            "daily_stats": [
+                {"date": task_date.isoformat(), "total": total, "completed": completed}
+                for task_date, total, completed in rows
+            ]
         }
+    
+    try:
+        return cache_for(db).get_or_compute(("calendar", year, month), (year, month), compute)
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Error getting calendar summary: {str(e)}")
 
 @app.get("/api/stats/monthly")
-def get_monthly_stats(year: int, month: int, db: Session = Depends(get_db)):
-    """获取指定月份的统计信息"""
-    try:
-        # 计算月份的开始和结束日期
-        start_date = date(year, month, 1)
-        if month == 12:
-            end_date = date(year + 1, 1, 1)
-        else:
-            end_date = date(year, month + 1, 1)
-        
-        # 获取该月份的任务
-        tasks = db.query(Task).filter(
-            Task.task_date >= start_date,
-            Task.task_date < end_date
-        ).all()
+@db_endpoint
+def get_monthly_stats(year: int, month: int, db: Session = Depends(get_session)):
+    """获取指定月份的统计信息（按月缓存）"""
+    from recurrence import daily_counts
+
+    def compute():
+        start_date, end_date = _month_range(year, month)
         
-        total_tasks = len(tasks)
-        completed_tasks = len([t for t in tasks if t.completed])
+        # 汇总当月最多 31 行每日统计
+        total_tasks, completed_tasks = db.query(
+            func.coalesce(func.sum(DailyStat.total), 0),
+            func.coalesce(func.sum(DailyStat.completed), 0),
+        ).filter(
+            DailyStat.task_date >= start_date,
+            DailyStat.task_date < end_date
+        ).one()
+        total_tasks += sum(daily_counts(db, start_date, end_date - timedelta(days=1)).values())
         
         return {
             "year": year,
@@ -269,9 +700,37 @@ def get_monthly_stats(year: int, month: int, db: Session = Depends(get_db)):
             "completed_tasks": completed_tasks,
             "completion_percentage": round((completed_tasks / total_tasks * 100), 1) if total_tasks > 0 else 0
         }
+    
+    try:
+        return cache_for(db).get_or_compute(("monthly", year, month), (year, month), compute)
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Error getting monthly stats: {str(e)}")
 
+@app.get("/api/calendar/year")
+@db_endpoint
+def get_year_heatmap(year: int, db: Session = Depends(get_session)):
+    """全年热力图：每天的任务总数和完成数，读取至多 366 行每日汇总并叠加重复模板的实例"""
+    def compute():
+        rows = _daily_rows(db, date(year, 1, 1), date(year + 1, 1, 1))
+        
+        return {
+            "year": year,
+            "daily_stats": [
+                {"date": task_date.isoformat(), "total": total, "completed": completed}
+                for task_date, total, completed in rows
+            ]
+        }
+    
+    try:
+        return cache_for(db).get_or_compute(("year", year), ("year", year), compute)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Error getting year heatmap: {str(e)}")
+
+mark("register routes")
+
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="127.0.0.1", port=8000)
\ No newline at end of file
+    mark("import uvicorn")
+    # 不使用 WebSocket：ws="none" 避免加载 websockets 库
+    # SSE 连接不会自行结束，退出时最多等待 3 秒
+    uvicorn.run(app, host="127.0.0.1", port=8000, ws="none", timeout_graceful_shutdown=3)
\ No newline at end of file
@@ -0,0 +1,215 @@
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from logging.handlers import RotatingFileHandler
+from typing import Dict, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+
+# --- 运行指标：请求耗时与每个请求的 SQL 语句数/耗时，以 Prometheus 文本格式由 /api/metrics 输出 ---
+# 中间件是纯 ASGI 实现，每个请求只做几次计时和一次加锁的计数更新；SQL 计数挂在引擎的
+# before/after_cursor_execute 事件上。默认开启，TODOEASE_METRICS=0 关闭。
+# TODOEASE_SLOW_QUERY_MS 大于 0 时，耗时超过该阈值的语句写入数据目录下的 slow-queries.log（自动轮转）。
+
+METRICS_ENABLED = os.environ.get("TODOEASE_METRICS", "1").lower() not in ("0", "false", "no", "off")
+SLOW_QUERY_MS = float(os.environ.get("TODOEASE_SLOW_QUERY_MS", "0"))
+SLOW_QUERY_LOG = "slow-queries.log"
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+UNMATCHED = "unmatched"  # 未匹配任何路由（404）的请求合并为一个标签，避免标签数量随路径无限增长
+
+CONTENT_TYPE = "text/plain; version=0.0.4"  # Starlette 会补上 charset=utf-8
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, buckets: Sequence[float], labels: Sequence[str]):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        self.labels = tuple(labels)
+        self._series: Dict[Tuple, list] = {}  # 标签值 -> [各桶计数..., 总和, 总数]
+
+    def observe(self, label_values: Tuple, value: float) -> None:
+        series = self._series.get(label_values)
+        if series is None:
+            series = self._series[label_values] = [0] * len(self.buckets) + [0.0, 0]
+        index = bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            series[index] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help_text}"
+        yield f"# TYPE {self.name} histogram"
+        for label_values, series in sorted(self._series.items()):
+            labels = _format_labels(self.labels, label_values)
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                yield f'{self.name}_bucket{{{labels},le="{bound:g}"}} {cumulative}'
+            yield f'{self.name}_bucket{{{labels},le="+Inf"}} {series[-1]}'
+            yield f"{self.name}_sum{{{labels}}} {round(series[-2], 6)}"
+            yield f"{self.name}_count{{{labels}}} {series[-1]}"
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, label_values: Tuple = (), amount: float = 1) -> None:
+        self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        yield f"# HELP {self.name} {self.help_text}"
+        yield f"# TYPE {self.name} counter"
+        for label_values, value in sorted(self._values.items()):
+            labels = _format_labels(self.labels, label_values)
+            yield f"{self.name}{{{labels}}} {value:g}" if labels else f"{self.name} {value:g}"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names, values) -> str:
+    return ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+
+
+_lock = threading.Lock()
+
+request_duration = Histogram(
+    "todoease_http_request_duration_seconds", "HTTP request latency by route",
+    LATENCY_BUCKETS, ("method", "route"),
+)
+requests_total = Counter(
+    "todoease_http_requests_total", "HTTP requests by route and status", ("method", "route", "status"),
+)
+request_statements = Histogram(
+    "todoease_http_request_sql_statements", "SQL statements executed per HTTP request",
+    STATEMENT_BUCKETS, ("method", "route"),
+)
+request_sql_duration = Histogram(
+    "todoease_http_request_sql_duration_seconds", "Total SQL time per HTTP request",
+    LATENCY_BUCKETS, ("method", "route"),
+)
+statements_total = Counter("todoease_sql_statements_total", "SQL statements executed, including outside requests")
+slow_statements_total = Counter("todoease_sql_slow_statements_total", "SQL statements slower than TODOEASE_SLOW_QUERY_MS")
+
+REGISTRY = (request_duration, requests_total, request_statements, request_sql_duration,
+            statements_total, slow_statements_total)
+
+
+class _RequestSql:
+    """当前请求的 SQL 计数；通过 ContextVar 传递，线程池和 run_sync 中执行的语句也会记到这里"""
+    __slots__ = ("path", "statements", "seconds")
+
+    def __init__(self, path: str):
+        self.path = path
+        self.statements = 0
+        self.seconds = 0.0
+
+
+_current_request: ContextVar[Optional[_RequestSql]] = ContextVar("todoease_request_sql", default=None)
+
+
+# --- SQLAlchemy 事件 ---
+_slow_log: Optional[logging.Logger] = None
+
+
+def instrument_engine(engine, data_dir: str) -> None:
+    """在引擎上挂载语句计时；同步引擎与 aiosqlite 引擎的 sync_engine 都可使用"""
+    global _slow_log
+    if not METRICS_ENABLED:
+        return
+    if SLOW_QUERY_MS > 0 and _slow_log is None:
+        _slow_log = logging.getLogger("todoease.slow_query")
+        _slow_log.propagate = False
+        _slow_log.setLevel(logging.INFO)
+        handler = RotatingFileHandler(os.path.join(data_dir, SLOW_QUERY_LOG), maxBytes=5 * 1024 * 1024,
+                                      backupCount=2, encoding="utf-8")
+        handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+        _slow_log.addHandler(handler)
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start"].pop()
+    request = _current_request.get()
+    if request is not None:
+        request.statements += 1
+        request.seconds += elapsed
+    slow = _slow_log is not None and elapsed * 1000 >= SLOW_QUERY_MS
+    with _lock:
+        statements_total.inc()
+        if slow:
+            slow_statements_total.inc()
+    if slow:
+        params = repr(parameters)
+        if len(params) > 200:
+            params = params[:200] + "..."
+        _slow_log.info("%.1fms %s %s params=%s", elapsed * 1000,
+                       request.path if request is not None else "-", " ".join(statement.split()), params)
+
+
+# --- ASGI 中间件 ---
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+        self._route_labels = None
+
+    def _route_label(self, scope) -> str:
+        # 路由匹配后 Starlette 把端点写入 scope["endpoint"]，按端点找回路由模板（如 /api/tasks/{task_id}）
+        if self._route_labels is None:
+            self._route_labels = {
+                getattr(route, "endpoint", None) or getattr(route, "app", None): route.path
+                for route in scope["app"].routes
+            }
+        return self._route_labels.get(scope.get("endpoint"), UNMATCHED)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        start = time.perf_counter()
+        method = scope["method"]
+        sql = _RequestSql(scope["path"])
+        token = _current_request.set(sql)
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current_request.reset(token)
+            elapsed = time.perf_counter() - start
+            labels = (method, self._route_label(scope))
+            with _lock:
+                request_duration.observe(labels, elapsed)
+                requests_total.inc(labels + (str(status),))
+                request_statements.observe(labels, sql.statements)
+                request_sql_duration.observe(labels, sql.seconds)
+
+
+def render(extra: Sequence[str] = ()) -> str:
+    with _lock:
+        lines = [line for metric in REGISTRY for line in metric.render()]
+    return "\n".join(lines + list(extra)) + "\n"
@@ -0,0 +1,283 @@
+from contextlib import contextmanager
+from typing import Callable, List, Tuple, Union
+
+from sqlalchemy.exc import OperationalError
+
+# --- 版本化迁移：版本号记录在 SQLite 的 PRAGMA user_version 中 ---
+# 每条迁移为 (版本号, 说明, 步骤列表)；步骤可以是 SQL 字符串，也可以是接收连接的函数。
+# 只允许在末尾追加新迁移，已发布的迁移不要修改。
+
+Step = Union[str, Callable]
+
+# 变更日志：每次写入 tasks/subtasks 都会把 meta.revision 加一并记到行上，删除记入 tombstones。
+# 用触发器实现，ORM、Core 批量语句和外部脚本的写入都会被记录。
+# UPDATE 触发器的 WHEN 条件避免触发器内部回写 revision 时再次触发。
+CHANGELOG_DDL: List[str] = [
+    "INSERT OR IGNORE INTO meta (key, value) VALUES ('revision', 0)",
+] + [
+    sql
+    for table, entity in (("tasks", "task"), ("subtasks", "subtask"))
+    for sql in (
+        f"""CREATE TRIGGER IF NOT EXISTS trg_{table}_rev_insert AFTER INSERT ON {table} BEGIN
+            UPDATE meta SET value = value + 1 WHERE key = 'revision';
+            UPDATE {table} SET revision = (SELECT value FROM meta WHERE key = 'revision') WHERE id = NEW.id;
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS trg_{table}_rev_update AFTER UPDATE ON {table}
+        WHEN NEW.revision IS OLD.revision BEGIN
+            UPDATE meta SET value = value + 1 WHERE key = 'revision';
+            UPDATE {table} SET revision = (SELECT value FROM meta WHERE key = 'revision') WHERE id = NEW.id;
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS trg_{table}_rev_delete AFTER DELETE ON {table} BEGIN
+            UPDATE meta SET value = value + 1 WHERE key = 'revision';
+            INSERT INTO tombstones (entity, entity_id, revision)
+            VALUES ('{entity}', OLD.id, (SELECT value FROM meta WHERE key = 'revision'));
+        END""",
+    )
+]
+
+# 每日汇总：daily_stats 按 task_date 保存总数/完成数，由触发器在同一事务内增量维护。
+# 只在 completed / task_date 变化时触发，排序和标题修改不产生额外写入。
+_ROLLUP_ADD = """INSERT INTO daily_stats (task_date, total, completed)
+            VALUES (NEW.task_date, 1, COALESCE(NEW.completed, 0))
+            ON CONFLICT (task_date) DO UPDATE SET
+                total = total + 1, completed = completed + excluded.completed;"""
+_ROLLUP_REMOVE = """UPDATE daily_stats SET total = total - 1, completed = completed - COALESCE(OLD.completed, 0)
+            WHERE task_date = OLD.task_date;
+            DELETE FROM daily_stats WHERE task_date = OLD.task_date AND total <= 0;"""
+
+ROLLUP_DDL: List[str] = [
+    f"""CREATE TRIGGER IF NOT EXISTS trg_tasks_rollup_insert AFTER INSERT ON tasks
+        WHEN NEW.task_date IS NOT NULL BEGIN
+            {_ROLLUP_ADD}
+        END""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_tasks_rollup_delete AFTER DELETE ON tasks
+        WHEN OLD.task_date IS NOT NULL BEGIN
+            {_ROLLUP_REMOVE}
+        END""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_tasks_rollup_remove_old AFTER UPDATE OF completed, task_date ON tasks
+        WHEN OLD.task_date IS NOT NULL BEGIN
+            {_ROLLUP_REMOVE}
+        END""",
+    f"""CREATE TRIGGER IF NOT EXISTS trg_tasks_rollup_add_new AFTER UPDATE OF completed, task_date ON tasks
+        WHEN NEW.task_date IS NOT NULL BEGIN
+            {_ROLLUP_ADD}
+        END""",
+]
+
+REBUILD_ROLLUP_SQL: List[str] = [
+    "DELETE FROM daily_stats",
+    """INSERT INTO daily_stats (task_date, total, completed)
+       SELECT task_date, COUNT(*), SUM(COALESCE(completed, 0)) FROM tasks
+       WHERE task_date IS NOT NULL GROUP BY task_date""",
+]
+
+# 全文搜索：FTS5 虚拟表 search_index，trigram 分词支持中文等无空格文本的任意子串匹配。
+# rowid 为任务 id，子任务取 -id，便于触发器按 rowid 精确删除/更新。
+SEARCH_TRIGGERS: List[str] = [
+    """CREATE TRIGGER IF NOT EXISTS trg_tasks_search_insert AFTER INSERT ON tasks BEGIN
+        INSERT INTO search_index (rowid, kind, task_id, title, description)
+        VALUES (NEW.id, 'task', NEW.id, NEW.title, COALESCE(NEW.description, ''));
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_tasks_search_update AFTER UPDATE OF title, description ON tasks BEGIN
+        UPDATE search_index SET title = NEW.title, description = COALESCE(NEW.description, '')
+        WHERE rowid = NEW.id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_tasks_search_delete AFTER DELETE ON tasks BEGIN
+        DELETE FROM search_index WHERE rowid = OLD.id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_subtasks_search_insert AFTER INSERT ON subtasks BEGIN
+        INSERT INTO search_index (rowid, kind, task_id, title, description)
+        VALUES (-NEW.id, 'subtask', NEW.parent_task_id, NEW.title, '');
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_subtasks_search_update AFTER UPDATE OF title, parent_task_id ON subtasks BEGIN
+        UPDATE search_index SET title = NEW.title, task_id = NEW.parent_task_id WHERE rowid = -NEW.id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS trg_subtasks_search_delete AFTER DELETE ON subtasks BEGIN
+        DELETE FROM search_index WHERE rowid = -OLD.id;
+    END""",
+]
+
+
+def create_search_index(conn) -> None:
+    """建立 FTS5 索引、同步触发器并导入现有数据；SQLite 不支持 FTS5/trigram 时跳过（搜索接口返回 503）"""
+    try:
+        conn.exec_driver_sql(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5("
+            "kind UNINDEXED, task_id UNINDEXED, title, description, tokenize = 'trigram')"
+        )
+    except OperationalError as e:
+        print(f"[migrate] full-text search disabled: {e}")
+        return
+    for sql in SEARCH_TRIGGERS:
+        conn.exec_driver_sql(sql)
+    conn.exec_driver_sql("DELETE FROM search_index")
+    conn.exec_driver_sql(
+        "INSERT INTO search_index (rowid, kind, task_id, title, description) "
+        "SELECT id, 'task', id, title, COALESCE(description, '') FROM tasks"
+    )
+    conn.exec_driver_sql(
+        "INSERT INTO search_index (rowid, kind, task_id, title, description) "
+        "SELECT -id, 'subtask', parent_task_id, title, '' FROM subtasks"
+    )
+
+
+# AUTOINCREMENT 重建：SQLite 只能在建表时指定 AUTOINCREMENT，需新建表、复制数据再改名。
+# 建表语句按迁移时的结构固定写出；索引和触发器随旧表删除，从 sqlite_master 读出原语句后重建。
+TASKS_AUTOINCREMENT_DDL = """CREATE TABLE tasks_rebuild (
+    id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT,
+    title VARCHAR NOT NULL,
+    description VARCHAR,
+    completed BOOLEAN,
+    created_at DATETIME,
+    task_date DATE,
+    order_index INTEGER,
+    revision INTEGER NOT NULL DEFAULT 0
+)"""
+
+SUBTASKS_AUTOINCREMENT_DDL = """CREATE TABLE subtasks_rebuild (
+    id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT,
+    title VARCHAR NOT NULL,
+    completed BOOLEAN,
+    created_at DATETIME,
+    order_index INTEGER,
+    parent_task_id INTEGER,
+    revision INTEGER NOT NULL DEFAULT 0,
+    FOREIGN KEY(parent_task_id) REFERENCES tasks (id)
+)"""
+
+
+def rebuild_table(table: str, ddl: str, columns: str) -> Step:
+    def step(conn) -> None:
+        dependents = [sql for (sql,) in conn.exec_driver_sql(
+            "SELECT sql FROM sqlite_master WHERE tbl_name = ? AND type IN ('index', 'trigger') AND sql IS NOT NULL",
+            (table,),
+        )]
+        # 迁移在事务中执行，不会留下临时表；这里仍先清理，兼容事务化之前中断过的数据库
+        conn.exec_driver_sql(f"DROP TABLE IF EXISTS {table}_rebuild")
+        conn.exec_driver_sql(ddl)
+        conn.exec_driver_sql(f"INSERT INTO {table}_rebuild ({columns}) SELECT {columns} FROM {table}")
+        conn.exec_driver_sql(f"DROP TABLE {table}")
+        conn.exec_driver_sql(f"ALTER TABLE {table}_rebuild RENAME TO {table}")
+        for sql in dependents:
+            conn.exec_driver_sql(sql)
+    return step
+
+
+# 重复任务模板：模板变化会改变按日期展开的虚拟实例，同样推进 revision，列表接口的 ETag 随之失效
+TEMPLATE_DDL: List[str] = [
+    f"""CREATE TRIGGER IF NOT EXISTS trg_task_templates_rev_{op.lower()} AFTER {op} ON task_templates BEGIN
+        UPDATE meta SET value = value + 1 WHERE key = 'revision';
+    END"""
+    for op in ("INSERT", "UPDATE", "DELETE")
+]
+
+
+TASKS_REBUILD_COLUMNS = "id, title, description, completed, created_at, task_date, order_index, revision"
+SUBTASKS_REBUILD_COLUMNS = "id, title, completed, created_at, order_index, parent_task_id, revision"
+
+
+def add_revision_default(conn) -> None:
+    """
+    由 create_all 新建的数据库（版本 8 及以前）revision 列没有数据库默认值，经迁移 3/6 升级的库有 DEFAULT 0；
+    只重建缺少默认值的表，使两种库的结构一致
+    """
+    for table, ddl, columns in (("tasks", TASKS_AUTOINCREMENT_DDL, TASKS_REBUILD_COLUMNS),
+                                ("subtasks", SUBTASKS_AUTOINCREMENT_DDL, SUBTASKS_REBUILD_COLUMNS)):
+        default = [row[4] for row in conn.exec_driver_sql(f"PRAGMA table_info({table})") if row[1] == "revision"]
+        if default == [None]:
+            rebuild_table(table, ddl, columns)(conn)
+
+
+def create_search_grams(conn) -> None:
+    """
+    建立 1–2 个字符搜索词使用的短词索引 search_grams 并导入现有数据，之后由搜索接口按 revision 增量同步
+    片段在 Python 中切分（见 search.grams），detail=none 只记录包含每个片段的行，不记位置
+    """
+    try:
+        conn.exec_driver_sql("CREATE VIRTUAL TABLE IF NOT EXISTS search_grams USING fts5(grams, detail = none)")
+    except OperationalError as e:
+        print(f"[migrate] short-term search index disabled: {e}")
+        return
+    from search import sync_grams
+    sync_grams(conn)
+
+
+# 新建数据库时由 create_tables() 在 create_all 之后执行（触发器、虚拟表无法由 create_all 创建）
+NEW_DATABASE_STEPS: List[Step] = CHANGELOG_DDL + ROLLUP_DDL + [create_search_index] + TEMPLATE_DDL + [create_search_grams]
+
+MIGRATIONS: List[Tuple[int, str, List[Step]]] = [
+    (1, "日期/排序/完成状态/子任务父键索引", [
+        "CREATE INDEX IF NOT EXISTS ix_tasks_date_order ON tasks (task_date, order_index)",
+        "CREATE INDEX IF NOT EXISTS ix_tasks_order_id ON tasks (order_index, id)",
+        "CREATE INDEX IF NOT EXISTS ix_tasks_completed ON tasks (completed)",
+        "CREATE INDEX IF NOT EXISTS ix_subtasks_parent_order ON subtasks (parent_task_id, order_index)",
+    ]),
+    (2, "排序键改为间隔 1024 的整数（见 ordering.ORDER_GAP）", [
+        "UPDATE tasks SET order_index = order_index * 1024",
+        "UPDATE subtasks SET order_index = order_index * 1024",
+    ]),
+    (3, "revision 列与变更日志触发器（meta/tombstones 表由 create_all 创建）", [
+        "ALTER TABLE tasks ADD COLUMN revision INTEGER NOT NULL DEFAULT 0",
+        "ALTER TABLE subtasks ADD COLUMN revision INTEGER NOT NULL DEFAULT 0",
+        "CREATE INDEX IF NOT EXISTS ix_tasks_revision ON tasks (revision)",
+        "CREATE INDEX IF NOT EXISTS ix_subtasks_revision ON subtasks (revision)",
+        # 已有数据记为 revision 1，使 since=0 的增量请求也能拿到它们
+        "UPDATE tasks SET revision = 1",
+        "UPDATE subtasks SET revision = 1",
+        "INSERT OR REPLACE INTO meta (key, value) VALUES ('revision', 1)",
+    ] + CHANGELOG_DDL),
+    (4, "daily_stats 每日汇总触发器，并从 tasks 重建（表由 create_all 创建）",
+        ROLLUP_DDL + REBUILD_ROLLUP_SQL),
+    (5, "FTS5 全文搜索索引 search_index", [create_search_index]),
+    (6, "tasks/subtasks 改为 AUTOINCREMENT，归档任务的 id 不再复用（archived_* 表由 create_all 创建）", [
+        rebuild_table("tasks", TASKS_AUTOINCREMENT_DDL, TASKS_REBUILD_COLUMNS),
+        rebuild_table("subtasks", SUBTASKS_AUTOINCREMENT_DDL, SUBTASKS_REBUILD_COLUMNS),
+    ]),
+    (7, "重复任务模板的 revision 触发器（task_templates / template_occurrences 表由 create_all 创建）", TEMPLATE_DDL),
+    (8, "1–2 个字符搜索词的短词索引 search_grams", [create_search_grams]),
+    (9, "新建库的 revision 列补上 DEFAULT 0，与迁移升级的库一致", [add_revision_default]),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def get_schema_version(conn) -> int:
+    return conn.exec_driver_sql("PRAGMA user_version").scalar() or 0
+
+
+def run_steps(conn, steps: List[Step]) -> None:
+    for step in steps:
+        if callable(step):
+            step(conn)
+        else:
+            conn.exec_driver_sql(step)
+
+
+@contextmanager
+def schema_transaction(engine):
+    """
+    建表/迁移用的事务。pysqlite 只在 DML 前自动发出 BEGIN，engine.begin() 中的 DDL 与 PRAGMA user_version
+    会逐条自动提交；这里显式 BEGIN IMMEDIATE，中途失败时整体回滚，重新启动后从原版本再次迁移
+    """
+    with engine.begin() as conn:
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+        yield conn
+
+
+def stamp(conn, version: int = SCHEMA_VERSION) -> None:
+    """新建的数据库由 create_all 直接建成最新结构，只需记录版本号"""
+    conn.exec_driver_sql(f"PRAGMA user_version = {version}")
+
+
+def migrate(engine) -> int:
+    """把数据库升级到 SCHEMA_VERSION，返回迁移后的版本号；全部迁移在同一个事务中执行"""
+    with schema_transaction(engine) as conn:
+        current = get_schema_version(conn)
+        for version, description, steps in MIGRATIONS:
+            if version <= current:
+                continue
+            print(f"[migrate] {current} -> {version}: {description}")
+            run_steps(conn, steps)
+            conn.exec_driver_sql(f"PRAGMA user_version = {version}")
+            current = version
+    return current
@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import List, Optional
+from pydantic import BaseModel, Field, field_validator
+from typing import Any, Dict, List, Literal, Optional
 from datetime import datetime, date
 
 class SubTaskBase(BaseModel):
@@ -46,6 +46,101 @@ class Task(TaskBase):
     
     model_config = {"from_attributes": True}
 
+Weekday = Literal[0, 1, 2, 3, 4, 5, 6]  # 0=周一
+
+class TemplateBase(BaseModel):
+    """重复任务模板：frequency 为 daily / weekly / monthly，每 interval 个周期重复一次"""
+    title: str
+    description: str = ""
+    subtasks: List[str] = Field([], max_length=100)
+    frequency: Literal["daily", "weekly", "monthly"]
+    interval: int = Field(1, ge=1)
+    weekdays: List[Weekday] = []
+    start_date: Optional[date] = None
+    end_date: Optional[date] = None
+    order_index: int = 0
+
+class TemplateCreate(TemplateBase):
+    pass
+
+class TemplateUpdate(BaseModel):
+    title: Optional[str] = None
+    description: Optional[str] = None
+    subtasks: Optional[List[str]] = Field(None, max_length=100)
+    frequency: Optional[Literal["daily", "weekly", "monthly"]] = None
+    interval: Optional[int] = Field(None, ge=1)
+    weekdays: Optional[List[Weekday]] = None
+    start_date: Optional[date] = None
+    end_date: Optional[date] = None
+    order_index: Optional[int] = None
+
+    @field_validator("title", "description", "subtasks", "frequency", "interval", "weekdays",
+                     "start_date", "order_index", mode="before")
+    @classmethod
+    def not_null(cls, value):
+        """省略表示不修改；只有 end_date 可以显式传 null（清除结束日期），其余字段对应非空列"""
+        if value is None:
+            raise ValueError("may be omitted but not null")
+        return value
+
+class Template(TemplateBase):
+    id: int
+    start_date: date
+    created_at: datetime
+    
+    model_config = {"from_attributes": True}
+
+class MoveRequest(BaseModel):
+    """单项移动：把条目放到 after_id 与 before_id 之间"""
+    after_id: Optional[int] = None
+    before_id: Optional[int] = None
+
+class BatchOperation(BaseModel):
+    """批量接口中的一条操作"""
+    op: Literal["create", "update", "delete"]
+    type: Literal["task", "subtask"]
+    id: Optional[int] = None        # update / delete 的目标
+    task_id: Optional[int] = None   # 创建子任务时的父任务 id
+    task_ref: Optional[int] = None  # 或者：同一批中某条任务操作的下标
+    data: Dict[str, Any] = {}
+
+class BatchRequest(BaseModel):
+    operations: List[BatchOperation]
+    atomic: bool = True             # 任一操作失败则整批回滚
+
+class BatchResult(BaseModel):
+    index: int
+    ok: bool
+    id: Optional[int] = None
+    error: Optional[str] = None
+
+class BatchResponse(BaseModel):
+    committed: bool
+    results: List[BatchResult]
+
+class DeletedItem(BaseModel):
+    type: Literal["task", "subtask"]
+    id: int
+    revision: int
+
+class Changes(BaseModel):
+    """自 since 之后的增量；客户端下次以 revision 作为 since 继续拉取"""
+    revision: int
+    tasks: List[Task]
+    subtasks: List[SubTask]
+    deleted: List[DeletedItem]
+
+class SearchHit(BaseModel):
+    type: Literal["task", "subtask"]
+    id: int
+    task_id: Optional[int] = None
+    title: str
+    snippet: str
+
+class SearchResults(BaseModel):
+    results: List[SearchHit]
+    next_offset: Optional[int] = None
+
 class TaskStats(BaseModel):
     total_tasks: int
     completed_tasks: int
@@ -0,0 +1,83 @@
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import and_, bindparam, func, or_, update
+
+# --- 排序键：间隔为 ORDER_GAP 的整数，新项取两邻居的中点 ---
+# 插入和移动只写一行；只有两邻居之间没有空位时才整体重新铺开（rebalance）。
+
+ORDER_GAP = 1024
+
+
+def next_order_index(db, model, scope: Iterable = ()) -> int:
+    """列表末尾的新键：max(order_index) + ORDER_GAP，走 order_index 索引而不是 count()"""
+    current = db.query(func.max(model.order_index)).filter(*scope).scalar()
+    return 0 if current is None else current + ORDER_GAP
+
+
+def bulk_reorder(db, model, ids: List[int], scope: Iterable = ()) -> Dict[int, int]:
+    """按 ids 的顺序以 ORDER_GAP 为间隔重新编号，一条 executemany UPDATE 完成"""
+    positions = {item_id: index * ORDER_GAP for index, item_id in enumerate(ids)}
+    if not positions:
+        return positions
+    table = model.__table__
+    stmt = (
+        update(table)
+        .where(table.c.id == bindparam("b_id"), *scope)
+        .values(order_index=bindparam("b_order"))
+    )
+    db.execute(stmt, [{"b_id": item_id, "b_order": order} for item_id, order in positions.items()])
+    return positions
+
+
+def rebalance(db, model, scope: Iterable = (), exclude_id: Optional[int] = None) -> Dict[int, int]:
+    """按当前顺序把范围内所有项重新铺开，返回 id -> 新 order_index"""
+    scope = list(scope)
+    query = db.query(model.id).filter(*scope)
+    if exclude_id is not None:
+        query = query.filter(model.id != exclude_id)
+    ids = [row[0] for row in query.order_by(model.order_index, model.id)]
+    return bulk_reorder(db, model, ids, scope)
+
+
+def _adjacent(db, model, ref, scope, exclude_id: int, forward: bool):
+    """ref 在 (order_index, id) 顺序上紧邻的下一项（forward）或上一项"""
+    if forward:
+        cond = or_(model.order_index > ref.order_index,
+                   and_(model.order_index == ref.order_index, model.id > ref.id))
+        order = (model.order_index, model.id)
+    else:
+        cond = or_(model.order_index < ref.order_index,
+                   and_(model.order_index == ref.order_index, model.id < ref.id))
+        order = (model.order_index.desc(), model.id.desc())
+    return db.query(model).filter(*scope, cond, model.id != exclude_id).order_by(*order).first()
+
+
+def move_between(db, model, item, after=None, before=None, scope: Iterable = ()) -> None:
+    """
+    把 item 移到 after 与 before 之间（只给一侧时自动查找另一侧的紧邻项）
+    通常只写 item 一行；邻居键相邻时先 rebalance 再取中点
+    """
+    if after is None and before is None:
+        raise ValueError("after_id or before_id is required")
+    scope = list(scope)
+
+    if before is None:
+        before = _adjacent(db, model, after, scope, item.id, forward=True)
+    elif after is None:
+        after = _adjacent(db, model, before, scope, item.id, forward=False)
+
+    lo: Optional[int] = after.order_index if after is not None else None
+    hi: Optional[int] = before.order_index if before is not None else None
+
+    if lo is not None and hi is not None and hi - lo <= 1:
+        positions = rebalance(db, model, scope, exclude_id=item.id)
+        lo, hi = positions[after.id], positions[before.id]
+        if hi <= lo:
+            raise ValueError("after_id must come before before_id")
+
+    if lo is None:
+        item.order_index = hi - ORDER_GAP
+    elif hi is None:
+        item.order_index = lo + ORDER_GAP
+    else:
+        item.order_index = (lo + hi) // 2
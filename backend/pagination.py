@@ -0,0 +1,36 @@
+import base64
+import json
+from typing import Optional, Tuple
+
+from sqlalchemy import and_, or_
+
+# --- 键集分页：按 (order_index, id) 排序，游标对客户端不透明 ---
+
+MAX_PAGE_SIZE = 1000
+
+
+def encode_cursor(order_index: int, item_id: int) -> str:
+    """把最后一行的排序键编码成不透明游标"""
+    raw = json.dumps([order_index, item_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[int, int]:
+    """解析游标，格式错误时抛出 ValueError"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        order_index, item_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return int(order_index), int(item_id)
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+
+
+def after_cursor(query, model, cursor: Optional[str]):
+    """在查询上追加 (order_index, id) > 游标 的条件"""
+    if not cursor:
+        return query
+    order_index, item_id = decode_cursor(cursor)
+    return query.filter(or_(
+        model.order_index > order_index,
+        and_(model.order_index == order_index, model.id > item_id),
+    ))
@@ -0,0 +1,135 @@
+from collections import Counter
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import or_
+
+import archive
+from database import Task, SubTask, TaskTemplate, TemplateOccurrence
+from ordering import ORDER_GAP
+
+# --- 重复任务：规则只在 task_templates 中保存一次，实例按查询窗口即时展开 ---
+# 展开的开销与窗口天数 × 窗口内有效的模板数成正比，与规则已经重复了多久无关。
+# 虚拟实例没有对应的行，id 为负数（编码模板 id 与日期）；对它的修改、完成、删除或添加子任务
+# 会先把它落库为普通任务，并在 template_occurrences 中记下该日期，之后展开时跳过。
+# 虚拟子任务的 id 同样为负数，由父实例 id 与子任务位置编码。
+
+_DATE_SPAN = 10 ** 6        # date.toordinal() 小于该值
+_SUBTASK_SPAN = 100         # 每个模板最多 100 个子任务（见 models.TemplateBase）
+
+
+def occurrence_id(template_id: int, day: date) -> int:
+    return -(template_id * _DATE_SPAN + day.toordinal())
+
+
+def _decode(task_id: int) -> Tuple[int, date]:
+    template_id, ordinal = divmod(-task_id, _DATE_SPAN)
+    return template_id, date.fromordinal(max(ordinal, 1))
+
+
+def occurs(template: TaskTemplate, day: date) -> bool:
+    start = template.start_date
+    if day < start or (template.end_date is not None and day > template.end_date):
+        return False
+    if template.frequency == "daily":
+        return (day - start).days % template.interval == 0
+    if template.frequency == "weekly":
+        weekdays = template.weekdays or [start.weekday()]
+        # 以 start_date 所在周的周一为第 0 周
+        weeks = (day - (start - timedelta(days=start.weekday()))).days // 7
+        return day.weekday() in weekdays and weeks % template.interval == 0
+    # monthly：与 start_date 同一天；没有该日的月份（如 31 日）跳过
+    months = (day.year - start.year) * 12 + day.month - start.month
+    return day.day == start.day and months % template.interval == 0
+
+
+def expand(db, start: date, end: date) -> List[Tuple[TaskTemplate, date]]:
+    """[start, end] 内尚未落库的实例，按日期排序"""
+    templates = db.query(TaskTemplate).filter(
+        TaskTemplate.start_date <= end,
+        or_(TaskTemplate.end_date.is_(None), TaskTemplate.end_date >= start)
+    ).order_by(TaskTemplate.order_index, TaskTemplate.id).all()
+    if not templates:
+        return []
+    handled = set(db.query(TemplateOccurrence.template_id, TemplateOccurrence.occurrence_date).filter(
+        TemplateOccurrence.occurrence_date >= start,
+        TemplateOccurrence.occurrence_date <= end
+    ))
+    occurrences = []
+    for offset in range((end - start).days + 1):
+        day = start + timedelta(days=offset)
+        for template in templates:
+            if (template.id, day) not in handled and occurs(template, day):
+                occurrences.append((template, day))
+    return occurrences
+
+
+def _as_task(template: TaskTemplate, day: date) -> Dict:
+    """虚拟实例，字段与 fastjson.assemble 的输出相同，另带 template_id"""
+    task_id = occurrence_id(template.id, day)
+    return {
+        "title": template.title,
+        "description": template.description or "",
+        "completed": False,
+        "order_index": template.order_index,
+        "id": task_id,
+        "created_at": template.created_at,
+        "task_date": day,
+        "subtasks": [
+            {"title": title, "completed": False, "order_index": position * ORDER_GAP,
+             "id": task_id * _SUBTASK_SPAN - position, "created_at": template.created_at,
+             "parent_task_id": task_id}
+            for position, title in enumerate(template.subtasks or [])
+        ],
+        "template_id": template.id,
+    }
+
+
+def virtual_tasks(db, start: date, end: date) -> List[Dict]:
+    return [_as_task(template, day) for template, day in expand(db, start, end)]
+
+
+def daily_counts(db, start: date, end: date) -> Counter:
+    """每天的虚拟实例数（均未完成），供日历/月度统计叠加到 daily_stats 上"""
+    return Counter(day for _, day in expand(db, start, end))
+
+
+# --- 落库 ---
+def materialize(db, task_id: int) -> Optional[Task]:
+    """把虚拟实例写成普通任务（在调用方的事务中）；已落库时返回之前的任务，不存在时返回 None"""
+    template_id, day = _decode(task_id)
+    template = db.get(TaskTemplate, template_id)
+    if template is None or not occurs(template, day):
+        return None
+    occurrence = db.get(TemplateOccurrence, (template_id, day))
+    if occurrence is not None:
+        return db.get(Task, occurrence.task_id) if occurrence.task_id is not None else None
+    task = Task(
+        title=template.title,
+        description=template.description or "",
+        task_date=day,
+        order_index=template.order_index,
+        subtasks=[SubTask(title=title, order_index=position * ORDER_GAP)
+                  for position, title in enumerate(template.subtasks or [])],
+    )
+    db.add(task)
+    db.flush()
+    db.add(TemplateOccurrence(template_id=template_id, occurrence_date=day, task_id=task.id))
+    return task
+
+
+def get_task(db, task_id: int) -> Optional[Task]:
+    """按 id 取任务：虚拟实例先落库，已归档的任务先移回 tasks"""
+    if task_id < 0:
+        return materialize(db, task_id)
+    return archive.get_task(db, task_id)
+
+
+def get_subtask(db, subtask_id: int) -> Optional[SubTask]:
+    if subtask_id < 0:
+        task_id, position = divmod(-subtask_id, _SUBTASK_SPAN)
+        task = materialize(db, -task_id)
+        if task is None or position >= len(task.subtasks):
+            return None
+        return task.subtasks[position]
+    return archive.get_subtask(db, subtask_id)
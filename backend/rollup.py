@@ -0,0 +1,32 @@
+"""
+重建每日汇总表 daily_stats（正常运行时由触发器增量维护，一般无需手动执行）
+用法: python backend/rollup.py
+"""
+import sys, os
+sys.path.append(os.path.dirname(__file__))
+
+from database import engine, create_tables
+
+# 与迁移 4 的 REBUILD_ROLLUP_SQL 相同，但同时汇总已归档的任务（见 archive.py）
+REBUILD_SQL = [
+    "DELETE FROM daily_stats",
+    """INSERT INTO daily_stats (task_date, total, completed)
+       SELECT task_date, COUNT(*), SUM(COALESCE(completed, 0)) FROM (
+           SELECT task_date, completed FROM tasks
+           UNION ALL
+           SELECT task_date, completed FROM archived_tasks
+       ) WHERE task_date IS NOT NULL GROUP BY task_date""",
+]
+
+
+def rebuild(engine) -> int:
+    """从 tasks 与 archived_tasks 重新生成 daily_stats，返回汇总的天数"""
+    with engine.begin() as conn:
+        for sql in REBUILD_SQL:
+            conn.exec_driver_sql(sql)
+        return conn.exec_driver_sql("SELECT COUNT(*) FROM daily_stats").scalar()
+
+
+if __name__ == "__main__":
+    create_tables()
+    print(f"daily_stats rebuilt: {rebuild(engine)} days")
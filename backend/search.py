@@ -0,0 +1,145 @@
+from typing import Dict, Iterable, List, Set, Tuple
+
+from sqlalchemy import text
+
+# --- 全文搜索：查询 migrations.create_search_index 建立的 FTS5 表 search_index ---
+# trigram 分词只能匹配不少于 3 个字符的片段；更短的词（常见于两字中文词）改查短词索引 search_grams（同为 FTS5）：
+# 每行的每个两字片段是一个词元，两字词精确匹配，单字按前缀匹配，都走索引，不扫描全表。
+# 片段以 UTF-8 十六进制写入，任何字符（包括标点）都不会被 FTS5 分词器拆开或丢弃。
+# search_grams 不用触发器维护（切分在 Python 中完成，外部脚本的写入不能依赖它）：meta 中记录已同步到的 revision，
+# 搜索短词前把 revision 更大的任务/子任务和删除记录补进索引，开销只与上次同步以来的修改量有关。
+
+MIN_MATCH_LENGTH = 3
+GRAMS_KEY = "search_grams"       # meta 中的同步水位
+GRAMS_BATCH_SIZE = 500          # 按 rowid 删除时每条语句的行数
+
+
+class SearchUnavailable(Exception):
+    pass
+
+
+def search_available(db) -> bool:
+    return db.execute(text(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'search_index'"
+    )).first() is not None
+
+
+def _split_terms(q: str) -> Tuple[List[str], List[str]]:
+    """按空白拆词；返回 (可用 MATCH 的词, 查短词索引的短词)"""
+    terms = [t for t in q.split() if t]
+    return ([t for t in terms if len(t) >= MIN_MATCH_LENGTH],
+            [t.lower() for t in terms if len(t) < MIN_MATCH_LENGTH])
+
+
+# --- 短词索引 ---
+def grams(*fields: str) -> Set[str]:
+    """
+    每个非空白字符与其后一个字符组成的片段；后面是空白或已到末尾时只记该字符
+    搜索词不含空白，含空白的片段永远不会被查到，不必保存
+    """
+    result = set()
+    for value in fields:
+        value = (value or "").lower()
+        for i, char in enumerate(value):
+            if char.isspace():
+                continue
+            following = value[i + 1:i + 2]
+            result.add(char + following if following and not following.isspace() else char)
+    return result
+
+
+def _revision(db, key: str) -> int:
+    """db 可以是 Session 或 Connection"""
+    return db.execute(text("SELECT value FROM meta WHERE key = :key"), {"key": key}).scalar() or 0
+
+
+def grams_behind(db) -> bool:
+    return _revision(db, GRAMS_KEY) < _revision(db, "revision")
+
+
+def _chunks(items: List, size: int = GRAMS_BATCH_SIZE) -> Iterable[List]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _token(gram: str) -> str:
+    return gram.encode("utf-8").hex()
+
+
+def sync_grams(conn) -> int:
+    """
+    把 revision 大于水位的任务/子任务重新切分写入 search_grams，删除记录对应的行一并删除；返回处理的行数
+    conn 为 Connection，调用方需已取得写锁（迁移事务或 begin_write），并负责提交
+    """
+    since = _revision(conn, GRAMS_KEY)
+    revision = _revision(conn, "revision")
+    if since >= revision:
+        return 0
+    rows = [(task_id, grams(title, description)) for task_id, title, description in conn.exec_driver_sql(
+        "SELECT id, title, description FROM tasks WHERE revision > ?", (since,))]
+    rows += [(-subtask_id, grams(title)) for subtask_id, title in conn.exec_driver_sql(
+        "SELECT id, title FROM subtasks WHERE revision > ?", (since,))]
+
+    if since == 0:
+        conn.exec_driver_sql("DELETE FROM search_grams")  # 首次建立
+        refs = [ref for ref, _ in rows]
+    else:
+        refs = [entity_id if entity == "task" else -entity_id for entity, entity_id in conn.exec_driver_sql(
+            "SELECT entity, entity_id FROM tombstones WHERE revision > ?", (since,))]
+        refs += [ref for ref, _ in rows]
+        for chunk in _chunks(refs):
+            conn.exec_driver_sql(f"DELETE FROM search_grams WHERE rowid IN ({','.join(str(ref) for ref in chunk)})")
+    values = [(ref, " ".join(_token(gram) for gram in row_grams)) for ref, row_grams in rows if row_grams]
+    if values:
+        conn.exec_driver_sql("INSERT INTO search_grams (rowid, grams) VALUES (?, ?)", values)
+    conn.exec_driver_sql("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (GRAMS_KEY, revision))
+    return len(refs)
+
+
+def _grams_query(terms: List[str]) -> str:
+    """短词的 MATCH 表达式：两字词为完整词元，单字为以它开头的词元前缀"""
+    return " AND ".join(f'"{_token(term)}"' + ("*" if len(term) == 1 else "") for term in terms)
+
+
+def search(db, q: str, limit: int, offset: int) -> Dict:
+    """
+    在任务标题/描述和子任务标题中搜索，多个词之间为 AND
+    有长词时按 bm25 排序并返回高亮片段；只有短词时任务按 id 倒序在前、子任务在后
+    """
+    if not search_available(db):
+        raise SearchUnavailable("Full-text search is not available in this SQLite build")
+
+    match_terms, gram_terms = _split_terms(q)
+    if not match_terms and not gram_terms:
+        return {"results": [], "next_offset": None}
+    if gram_terms and grams_behind(db):
+        from database import begin_write
+        begin_write(db)
+        sync_grams(db.connection())
+        db.commit()
+
+    params = {"limit": limit + 1, "offset": offset}
+    if gram_terms:
+        params["grams"] = _grams_query(gram_terms)
+    if match_terms:
+        # 每个词加双引号作为短语，避免用户输入被解析成 FTS5 语法
+        where = "search_index MATCH :match"
+        params["match"] = " AND ".join('"' + t.replace('"', '""') + '"' for t in match_terms)
+        if gram_terms:
+            # 逐行检查短词：只查长词匹配到的行，不展开短词的全部匹配
+            where += (" AND EXISTS (SELECT 1 FROM search_grams "
+                      "WHERE search_grams MATCH :grams AND search_grams.rowid = search_index.rowid)")
+        sql = (f"SELECT rowid, kind, task_id, title, snippet(search_index, -1, '[', ']', '…', 16) AS snippet "
+               f"FROM search_index WHERE {where} ORDER BY rank LIMIT :limit OFFSET :offset")
+    else:
+        # 先在短词索引中按 rowid 倒序取出这一页，再按 rowid 读取这些行
+        sql = ("SELECT rowid, kind, task_id, title, title AS snippet FROM search_index WHERE rowid IN ("
+               "SELECT rowid FROM search_grams WHERE search_grams MATCH :grams "
+               "ORDER BY rowid DESC LIMIT :limit OFFSET :offset) ORDER BY rowid DESC")
+    rows = db.execute(text(sql), params).all()
+
+    results = [
+        {"type": kind, "id": abs(rowid), "task_id": task_id, "title": title, "snippet": snippet}
+        for rowid, kind, task_id, title, snippet in rows[:limit]
+    ]
+    return {"results": results, "next_offset": offset + limit if len(rows) > limit else None}
@@ -0,0 +1,73 @@
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+# --- 冷启动计时：main.py 在各阶段结束时调用 mark()，记录与上一个标记之间的耗时 ---
+# 使用 --profile-startup 参数或 TODOEASE_PROFILE_STARTUP=1 启动时，收到第一个请求后打印各阶段耗时，
+# 并追加一行 JSON 到数据目录下的 startup-profile.jsonl，便于比较不同打包版本。
+# 本模块只依赖标准库，需在 fastapi / sqlalchemy 之前导入，计时才包含框架导入。
+
+PROFILE_STARTUP = "--profile-startup" in sys.argv or \
+    os.environ.get("TODOEASE_PROFILE_STARTUP", "").lower() in ("1", "true", "yes", "on")
+
+PROFILE_FILE = "startup-profile.jsonl"
+
+_started = time.perf_counter()
+_last = _started
+phases = []  # [(阶段名, 秒)]
+
+
+def mark(name: str) -> None:
+    """记录从上一个标记（或本模块导入时）到现在的阶段耗时"""
+    global _last
+    now = time.perf_counter()
+    phases.append((name, now - _last))
+    _last = now
+
+
+def report() -> dict:
+    total = _last - _started
+    print("[startup] " + ", ".join(f"{name} {seconds * 1000:.1f} ms" for name, seconds in phases)
+          + f"; total {total * 1000:.1f} ms")
+    return {
+        "time": datetime.now().isoformat(timespec="seconds"),
+        "frozen": bool(getattr(sys, "frozen", False)),   # PyInstaller 打包版本
+        "phases_ms": {name: round(seconds * 1000, 1) for name, seconds in phases},
+        "total_ms": round(total * 1000, 1),
+    }
+
+
+def save(profile: dict, data_dir: str) -> None:
+    try:
+        with open(os.path.join(data_dir, PROFILE_FILE), "a", encoding="utf-8") as f:
+            f.write(json.dumps(profile, ensure_ascii=False) + "\n")
+    except OSError as e:
+        print(f"[startup] failed to save profile: {e}")
+
+
+class StartupTimer:
+    """
+    ASGI 中间件：lifespan 启动完成时记一个阶段，第一个 HTTP 请求到达时记最后一个阶段并输出报告
+    只在开启计时时挂载，之后的请求直接透传
+    """
+
+    def __init__(self, app, data_dir: str):
+        self.app = app
+        self.data_dir = data_dir
+        self.pending = True
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            async def send_wrapper(message):
+                if message["type"] == "lifespan.startup.complete":
+                    mark("server startup")
+                await send(message)
+            return await self.app(scope, receive, send_wrapper)
+
+        if self.pending and scope["type"] == "http":
+            self.pending = False
+            mark("until first request")
+            save(report(), self.data_dir)
+        return await self.app(scope, receive, send)
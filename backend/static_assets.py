@@ -0,0 +1,130 @@
+"""
+前端静态资源：内容指纹、长期缓存与预压缩
+打包时执行 `python backend/static_assets.py <frontend 目录>` 生成 .gz / .br 预压缩文件
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import sys
+from pathlib import Path
+from typing import Dict
+
+import anyio
+from starlette.datastructures import Headers, QueryParams
+from starlette.responses import Response
+from starlette.staticfiles import StaticFiles
+
+try:
+    import brotli  # 可选依赖，仅用于生成 .br 预压缩文件
+except ImportError:
+    brotli = None
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+
+PRECOMPRESS_SUFFIXES = (".html", ".js", ".css", ".svg", ".json")
+PRECOMPRESS_MIN_SIZE = 1024
+# 按优先级排列：客户端同时支持时优先 br
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+_STATIC_REF = re.compile(r'(/static/([\w./-]+?\.(?:js|css|png|ico|svg)))(\?v=[\w.-]*)?(?=["\'])')
+
+
+def file_hash(path: Path) -> str:
+    return hashlib.sha256(path.read_bytes()).hexdigest()[:12]
+
+
+class FrontendAssets:
+    """启动时计算一次指纹，并把 index.html 中的 /static/ 引用改写为 ?v=<内容哈希>"""
+
+    def __init__(self, directory: str):
+        self.directory = Path(directory)
+        self._hashes: Dict[str, str] = {}
+        self._index = None
+
+    def version(self, rel_path: str) -> str:
+        if rel_path not in self._hashes:
+            path = self.directory / rel_path
+            self._hashes[rel_path] = file_hash(path) if path.is_file() else ""
+        return self._hashes[rel_path]
+
+    def index(self):
+        """返回 (改写后的 index.html, ETag)"""
+        if self._index is None:
+            html = (self.directory / "index.html").read_text(encoding="utf-8")
+            html = _STATIC_REF.sub(lambda m: f"{m.group(1)}?v={self.version(m.group(2))}", html)
+            body = html.encode("utf-8")
+            self._index = (body, f'"{hashlib.sha256(body).hexdigest()[:16]}"')
+        return self._index
+
+    def index_response(self, request_headers: Headers) -> Response:
+        body, etag = self.index()
+        headers = {"ETag": etag, "Cache-Control": REVALIDATE}
+        if request_headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers=headers)
+        return Response(body, media_type="text/html", headers=headers)
+
+
+class CachedStaticFiles(StaticFiles):
+    """
+    - 请求带有与当前内容一致的 ?v=<哈希> 时返回 immutable 长期缓存头，否则要求重新验证
+    - 存在 .br / .gz 预压缩文件且客户端支持时直接返回压缩文件
+    """
+
+    def __init__(self, *args, assets: FrontendAssets, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.assets = assets
+
+    async def get_response(self, path: str, scope) -> Response:
+        response = await self._precompressed(path, scope) or await super().get_response(path, scope)
+        version = QueryParams(scope.get("query_string", b"")).get("v")
+        fingerprinted = version and version == self.assets.version(path)
+        response.headers["Cache-Control"] = IMMUTABLE if fingerprinted else REVALIDATE
+        return response
+
+    async def _precompressed(self, path: str, scope):
+        if scope["method"] not in ("GET", "HEAD"):
+            return None
+        accept = Headers(scope=scope).get("accept-encoding", "")
+        if not any(encoding in accept for encoding, _ in ENCODINGS):
+            return None
+        _, original = await anyio.to_thread.run_sync(self.lookup_path, path)
+        if original is None:
+            return None
+        for encoding, suffix in ENCODINGS:
+            if encoding not in accept:
+                continue
+            full_path, stat_result = await anyio.to_thread.run_sync(self.lookup_path, path + suffix)
+            # 源文件比预压缩文件新时（开发中修改过）不使用过期的压缩版本
+            if stat_result is None or stat_result.st_mtime < original.st_mtime:
+                continue
+            response = self.file_response(full_path, stat_result, scope)
+            response.headers["Content-Encoding"] = encoding
+            response.headers["Content-Type"] = mimetypes.guess_type(path)[0] or "application/octet-stream"
+            response.headers.add_vary_header("Accept-Encoding")
+            return response
+        return None
+
+
+def precompress(directory: str) -> int:
+    """为目录下的文本资源生成 .gz（以及安装了 brotli 时的 .br），返回生成的文件数"""
+    count = 0
+    for path in Path(directory).rglob("*"):
+        if not path.is_file() or path.suffix not in PRECOMPRESS_SUFFIXES:
+            continue
+        data = path.read_bytes()
+        if len(data) < PRECOMPRESS_MIN_SIZE:
+            continue
+        path.with_name(path.name + ".gz").write_bytes(gzip.compress(data, compresslevel=9, mtime=0))
+        count += 1
+        if brotli is not None:
+            path.with_name(path.name + ".br").write_bytes(brotli.compress(data, quality=11))
+            count += 1
+    return count
+
+
+if __name__ == "__main__":
+    target = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(__file__), "..", "frontend")
+    print(f"precompressed {precompress(target)} files in {target}")
@@ -0,0 +1,314 @@
+import csv
+import io
+import itertools
+import json
+import time
+from datetime import date, datetime, timezone
+from typing import Dict, Iterator, List, Optional
+
+import anyio.from_thread
+from sqlalchemy import select
+from starlette.responses import StreamingResponse
+
+from database import engine, Task, SubTask, ArchivedTask, ArchivedSubTask, WRITE_BEHIND
+from fastjson import (dumps, ARCHIVED_SUBTASK_COLUMNS, ARCHIVED_TASK_COLUMNS, SUBTASK_COLUMNS, SUBTASK_FIELDS,
+                      TASK_COLUMNS, TASK_FIELDS)
+from ordering import ORDER_GAP
+from cache import stats_cache
+from events import publish_changes
+
+# --- 批量导出 / 导入 ---
+# 导出：一条 tasks LEFT JOIN subtasks 查询按 yield_per 分批读取，边读边写，内存与数据量无关。
+#   活跃任务在前，归档任务（archive.py）在后，导出内容始终是完整数据。
+#   NDJSON 每行一个任务（结构同 /api/tasks 的元素）；CSV 每行一个任务或子任务，子任务紧跟在所属任务之后。
+# 导入：逐块读取上传内容，每 IMPORT_CHUNK_ROWS 行用 executemany 写入并提交一次，每块提交后输出一行进度。
+#   导入的数据追加在现有任务之后，id 重新分配；子任务必须紧跟所属任务，因此只需记住当前任务。
+# workspace 为 WorkspaceMiddleware 选中的工作区（workspaces.Workspace），None 表示默认数据库。
+
+EXPORT_BATCH_ROWS = 2000
+EXPORT_CHUNK_BYTES = 64 * 1024
+IMPORT_CHUNK_ROWS = 5000
+
+FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+CSV_COLUMNS = ["type", "id", "parent_id", "title", "description", "completed", "task_date", "order_index",
+               "created_at"]
+
+
+class TransferError(ValueError):
+    pass
+
+
+_TASK_ID = TASK_FIELDS.index("id")
+_SUBTASK_ID = len(TASK_FIELDS) + SUBTASK_FIELDS.index("id")
+
+
+# --- 导出 ---
+def _export_rows(conn, archived: bool = False):
+    task, subtask = (ArchivedTask, ArchivedSubTask) if archived else (Task, SubTask)
+    stmt = (
+        select(*(ARCHIVED_TASK_COLUMNS + ARCHIVED_SUBTASK_COLUMNS if archived else TASK_COLUMNS + SUBTASK_COLUMNS))
+        .outerjoin(subtask, subtask.parent_task_id == task.id)
+        .order_by(task.order_index, task.id, subtask.order_index, subtask.id)
+    )
+    return conn.execution_options(yield_per=EXPORT_BATCH_ROWS).execute(stmt)
+
+
+def _grouped_tasks(rows) -> Iterator[Dict]:
+    """把 JOIN 结果按任务合并；结果已按任务排序，同一时刻只持有一个任务"""
+    n_task = len(TASK_FIELDS)
+    current = None
+    for row in rows:
+        if current is None or current["id"] != row[_TASK_ID]:
+            if current is not None:
+                yield current
+            current = dict(zip(TASK_FIELDS, row[:n_task]))
+            current["subtasks"] = []
+        if row[_SUBTASK_ID] is not None:  # LEFT JOIN 没有子任务时子任务列为 NULL
+            current["subtasks"].append(dict(zip(SUBTASK_FIELDS, row[n_task:])))
+    if current is not None:
+        yield current
+
+
+def _csv_lines(tasks: Iterator[Dict]) -> Iterator[List]:
+    yield CSV_COLUMNS
+    for task in tasks:
+        yield ["task", task["id"], "", task["title"], task["description"], int(bool(task["completed"])),
+               task["task_date"] or "", task["order_index"], task["created_at"]]
+        for sub in task["subtasks"]:
+            yield ["subtask", sub["id"], task["id"], sub["title"], "", int(bool(sub["completed"])), "",
+                   sub["order_index"], sub["created_at"]]
+
+
+def export_stream(fmt: str, workspace=None) -> Iterator[bytes]:
+    """同步生成器，由 StreamingResponse 在线程池中迭代；输出按约 64 KB 分块"""
+    if WRITE_BEHIND:
+        from writeback import write_behind
+        write_behind.flush(workspace.name if workspace is not None else None)  # 导出内容包含写合并中尚未提交的修改
+    with (workspace.engine if workspace is not None else engine).connect() as conn:
+        # chain 惰性求值：活跃任务读完后才执行归档表的查询
+        tasks = itertools.chain(_grouped_tasks(_export_rows(conn)),
+                                _grouped_tasks(_export_rows(conn, archived=True)))
+        if fmt == "ndjson":
+            chunk = bytearray()
+            for task in tasks:
+                chunk += dumps(task) + b"\n"
+                if len(chunk) >= EXPORT_CHUNK_BYTES:
+                    yield bytes(chunk)
+                    chunk.clear()
+            yield bytes(chunk)
+        else:
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            for line in _csv_lines(tasks):
+                writer.writerow(line)
+                if buffer.tell() >= EXPORT_CHUNK_BYTES:
+                    yield buffer.getvalue().encode("utf-8")
+                    buffer.seek(0)
+                    buffer.truncate()
+            yield buffer.getvalue().encode("utf-8")
+
+
+# --- 导入：字段解析 ---
+def _bool(value) -> bool:
+    if isinstance(value, bool):
+        return value
+    if value in (None, "", 0, "0") or str(value).lower() in ("false", "no"):
+        return False
+    if value in (1, "1") or str(value).lower() in ("true", "yes"):
+        return True
+    raise TransferError(f"invalid boolean: {value!r}")
+
+
+def _date(value) -> str:
+    # 导出的数据总带有 task_date；缺失时不猜测日期，否则任务会被悄悄移到导入当天
+    if value in (None, ""):
+        raise TransferError("task_date is required")
+    try:
+        return date.fromisoformat(str(value)[:10]).isoformat()
+    except ValueError:
+        raise TransferError(f"invalid date: {value!r}")
+
+
+def _datetime(value) -> str:
+    # 与 SQLAlchemy 在 SQLite 中保存 DateTime 的格式一致
+    if value in (None, ""):
+        return datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S.%f")
+    try:
+        parsed = datetime.fromisoformat(str(value))
+    except ValueError:
+        raise TransferError(f"invalid datetime: {value!r}")
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed.strftime("%Y-%m-%d %H:%M:%S.%f")
+
+
+def _title(value) -> str:
+    if not isinstance(value, str) or not value:
+        raise TransferError("title is required")
+    return value
+
+
+def _ndjson_records(text) -> Iterator:
+    """产出 (行号, "task"/"subtask", 字段)"""
+    for line_no, line in enumerate(text, 1):
+        if not line.strip():
+            continue
+        try:
+            obj = json.loads(line)
+        except ValueError as e:
+            raise TransferError(f"line {line_no}: invalid JSON ({e})")
+        if not isinstance(obj, dict):
+            raise TransferError(f"line {line_no}: expected a JSON object")
+        yield line_no, "task", obj
+        for sub in obj.get("subtasks") or []:
+            yield line_no, "subtask", sub
+
+
+def _csv_records(text) -> Iterator:
+    reader = csv.DictReader(text)
+    missing = {"type", "title"} - set(reader.fieldnames or ())
+    if missing:
+        raise TransferError(f"CSV header is missing columns: {', '.join(sorted(missing))}")
+    last_task_id = None
+    for row in reader:
+        kind = row.get("type")
+        if kind == "task":
+            last_task_id = row.get("id")
+        elif kind == "subtask":
+            if last_task_id is None or (row.get("parent_id") and row["parent_id"] != last_task_id):
+                raise TransferError(f"line {reader.line_num}: subtask must directly follow its parent task")
+        else:
+            raise TransferError(f"line {reader.line_num}: type must be 'task' or 'subtask'")
+        yield reader.line_num, kind, row
+
+
+# --- 导入：分块写入 ---
+class _Importer:
+    def __init__(self, workspace=None):
+        self.stats_cache = workspace.stats_cache if workspace is not None else stats_cache
+        self.workspace = workspace.name if workspace is not None else None
+        self.tasks: List[list] = []      # [占位, title, description, completed, created_at, task_date]
+        self.subtasks: List[list] = []   # [父任务占位, title, completed, created_at, order_index]
+        self.parent: Optional[list] = None
+        self.position = 0
+        self.task_count = 0
+        self.subtask_count = 0
+
+    def add(self, kind: str, fields: Dict) -> None:
+        if kind == "task":
+            # 占位列表在写入时填入新 id，子任务通过它引用父任务
+            self.parent = [None]
+            self.position = 0
+            self.tasks.append([self.parent, _title(fields.get("title")), fields.get("description") or "",
+                               _bool(fields.get("completed")), _datetime(fields.get("created_at")),
+                               _date(fields.get("task_date"))])
+        else:
+            self.subtasks.append([self.parent, _title(fields.get("title")), _bool(fields.get("completed")),
+                                  _datetime(fields.get("created_at")), self.position * ORDER_GAP])
+            self.position += 1
+
+    def pending(self) -> int:
+        return len(self.tasks) + len(self.subtasks)
+
+    def flush(self, conn) -> None:
+        """一个事务写入当前块；BEGIN IMMEDIATE 先拿写锁，再分配 id 与排序键，避免与并发写入冲突"""
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+        try:
+            # tasks 为 AUTOINCREMENT，sqlite_sequence 记录了用过的最大 id（含已归档移走的任务）
+            max_id, max_order = conn.exec_driver_sql(
+                "SELECT MAX(COALESCE(MAX(id), 0), "
+                "COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'tasks'), 0)), MAX(order_index) FROM tasks"
+            ).one()
+            next_order = 0 if max_order is None else max_order + ORDER_GAP
+            rows = []
+            for offset, (holder, title, description, completed, created_at, task_date) in enumerate(self.tasks, 1):
+                holder[0] = max_id + offset
+                rows.append((holder[0], title, description, completed, created_at, task_date,
+                             next_order + (offset - 1) * ORDER_GAP))
+            if rows:
+                conn.exec_driver_sql(
+                    "INSERT INTO tasks (id, title, description, completed, created_at, task_date, order_index, "
+                    "revision) VALUES (?, ?, ?, ?, ?, ?, ?, 0)", rows)
+            if self.subtasks:
+                conn.exec_driver_sql(
+                    "INSERT INTO subtasks (title, completed, created_at, order_index, parent_task_id, revision) "
+                    "VALUES (?, ?, ?, ?, ?, 0)",
+                    [(title, completed, created_at, order_index, holder[0])
+                     for holder, title, completed, created_at, order_index in self.subtasks])
+            revision = conn.exec_driver_sql("SELECT value FROM meta WHERE key = 'revision'").scalar()
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        self.task_count += len(self.tasks)
+        self.subtask_count += len(self.subtasks)
+        # 直接执行的 SQL 不经过 Session 事件，这里手动失效统计缓存并广播
+        self.stats_cache.clear()
+        publish_changes(revision, [{"type": "task", "action": "imported", "count": len(self.tasks)}],
+                        self.workspace)
+        self.tasks, self.subtasks = [], []
+
+
+def run_import(text, fmt: str, workspace=None) -> Iterator[Dict]:
+    """逐块导入，每提交一块产出一条进度；出错时产出 error（此前已提交的块保留）后结束"""
+    started = time.perf_counter()
+    importer = _Importer(workspace)
+    records = _ndjson_records(text) if fmt == "ndjson" else _csv_records(text)
+
+    def progress(**extra):
+        return {"tasks": importer.task_count, "subtasks": importer.subtask_count,
+                "seconds": round(time.perf_counter() - started, 2), **extra}
+
+    with (workspace.engine if workspace is not None else engine).connect() as conn:
+        try:
+            for line_no, kind, fields in records:
+                try:
+                    importer.add(kind, fields)
+                except TransferError as e:
+                    raise TransferError(f"line {line_no}: {e}")
+                if importer.pending() >= IMPORT_CHUNK_ROWS:
+                    importer.flush(conn)
+                    yield progress()
+            importer.flush(conn)
+        except (TransferError, UnicodeDecodeError) as e:
+            yield progress(error=str(e))
+            return
+    yield progress(done=True)
+
+
+# --- 把异步的请求体转换为同步文件对象，供 csv / 逐行解析在线程池中使用 ---
+class _RequestBody(io.RawIOBase):
+    def __init__(self, request):
+        self._chunks = request.stream().__aiter__()
+        self._buffer = b""
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        while not self._buffer:
+            try:
+                # 在线程池线程中回到事件循环取下一块上传数据
+                self._buffer = anyio.from_thread.run(self._chunks.__anext__)
+            except StopAsyncIteration:
+                return 0
+        n = min(len(b), len(self._buffer))
+        b[:n] = self._buffer[:n]
+        self._buffer = self._buffer[n:]
+        return n
+
+
+def import_stream(request, fmt: str, workspace=None) -> Iterator[bytes]:
+    text = io.TextIOWrapper(io.BufferedReader(_RequestBody(request)), encoding="utf-8-sig", newline="")
+    for progress in run_import(text, fmt, workspace):
+        yield dumps(progress) + b"\n"
+
+
+class ImportProgressResponse(StreamingResponse):
+    """
+    边读取上传内容边输出进度
+    StreamingResponse 会并行监听 http.disconnect 并因此吞掉尚未读取的请求体，这里只保留输出部分
+    """
+
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
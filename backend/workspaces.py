@@ -0,0 +1,229 @@
+import asyncio
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import List, Optional
+
+from sqlalchemy.orm import sessionmaker
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse
+
+from database import WORKERS, WORKSPACES_DIR, WORKSPACES_ENABLED, create_tables, database_path, make_engine
+from async_db import ASYNC_DB, make_async_engine
+from cache import CACHE_SIZE, StatsCache
+
+# --- 工作区：托管部署时每个工作区使用单独的 SQLite 文件，不同工作区的写入互不争用 ---
+# TODOEASE_WORKSPACES=1 时开启。请求通过 /w/<name>/ 路径前缀或 X-Workspace 请求头选择工作区，
+# 都没有时使用默认数据库 todoease.db；工作区数据库位于数据目录下的 workspaces/<name>.db，首次访问时建表。
+# 打开的工作区（引擎与连接池、统计缓存）保存在进程内的 LRU 中：超过 TODOEASE_WORKSPACE_CACHE 个，
+# 或空闲超过 TODOEASE_WORKSPACE_IDLE_SECONDS 秒时关闭最久未用的（每次工作区请求结束时检查，
+# 另有后台任务定期检查，只有默认数据库的请求时也会关闭），连接数与内存不随工作区总数增长。
+# 正在处理请求（包括 SSE、导入导出等流式响应）的工作区不会被关闭。
+
+WORKSPACE_CACHE_SIZE = int(os.environ.get("TODOEASE_WORKSPACE_CACHE", "64"))
+WORKSPACE_IDLE_SECONDS = float(os.environ.get("TODOEASE_WORKSPACE_IDLE_SECONDS", "300"))
+# 每个工作区的连接池；工作区很多时每个池都保持较小
+WORKSPACE_POOL_SIZE = int(os.environ.get("TODOEASE_WORKSPACE_POOL_SIZE", "2"))
+
+WORKSPACE_HEADER = b"x-workspace"
+WORKSPACE_PREFIX = "/w/"
+SWEEP_INTERVAL_SECONDS = 1.0  # 空闲检查的最小间隔
+MAX_IDLE_CHECK_SECONDS = 60.0  # 后台空闲检查的最大间隔
+
+_NAME = re.compile(r"[A-Za-z0-9_-]{1,64}")  # 同时用作文件名，不允许路径分隔符和点
+
+
+def valid_name(name: str) -> bool:
+    return _NAME.fullmatch(name) is not None
+
+
+def workspace_names() -> List[str]:
+    """磁盘上已有的工作区（含当前未打开的）"""
+    if not os.path.isdir(WORKSPACES_DIR):
+        return []
+    return sorted(path.stem for path in Path(WORKSPACES_DIR).glob("*.db") if valid_name(path.stem))
+
+
+class Workspace:
+    """一个打开的工作区：引擎、会话工厂与统计缓存"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.path = database_path(name)
+        self.engine = make_engine(self.path, WORKSPACE_POOL_SIZE)
+        try:
+            create_tables(self.engine, self.path)
+        except Exception:
+            self.engine.dispose()
+            raise
+        self.stats_cache = StatsCache(CACHE_SIZE, shared=WORKERS > 1, workspace=name)
+        # cache.cache_for 与 events 的提交广播通过会话的 info 找到所属工作区
+        info = {"workspace": name, "stats_cache": self.stats_cache}
+        self.SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=self.engine, info=info)
+        self.async_engine = self.AsyncSessionLocal = None
+        if ASYNC_DB:
+            from sqlalchemy.ext.asyncio import async_sessionmaker
+            self.async_engine = make_async_engine(self.path, WORKSPACE_POOL_SIZE)
+            self.AsyncSessionLocal = async_sessionmaker(self.async_engine, autoflush=False, info=info)
+        self.active = 0                   # 进行中的请求数
+        self.last_used = time.monotonic()
+
+    async def close(self) -> None:
+        if self.async_engine is not None:
+            await self.async_engine.dispose()
+        await run_in_threadpool(self._close_sync)
+
+    def _close_sync(self) -> None:
+        self.engine.dispose()
+        self.stats_cache.close()
+
+    def forget(self) -> None:
+        """fork 后的子进程中丢弃继承的连接，不关闭父进程仍在使用的连接"""
+        self.engine.dispose(close=False)
+        if self.async_engine is not None:
+            self.async_engine.sync_engine.dispose(close=False)
+
+
+class WorkspaceRegistry:
+    """已打开工作区的 LRU；acquire / release 成对调用，关闭由 collect() 的调用方在事件循环上完成"""
+
+    def __init__(self, maxsize: int = WORKSPACE_CACHE_SIZE, idle_seconds: float = WORKSPACE_IDLE_SECONDS):
+        self.maxsize = maxsize
+        self.idle_seconds = idle_seconds
+        self._open: "OrderedDict[str, Workspace]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._open_lock = threading.Lock()  # 打开（建引擎、检查表结构）在主锁之外进行，同一时刻只打开一个
+        self._next_sweep = 0.0
+
+    def _take(self, name: str) -> Optional[Workspace]:
+        workspace = self._open.get(name)
+        if workspace is not None:
+            self._open.move_to_end(name)
+            workspace.active += 1
+        return workspace
+
+    def acquire(self, name: str, create: bool = True) -> Optional[Workspace]:
+        """占用工作区，未打开时打开（create=False 时返回 None）；可能读写磁盘，应在线程池中调用"""
+        with self._lock:
+            workspace = self._take(name)
+        if workspace is not None or not create:
+            return workspace
+        with self._open_lock:
+            with self._lock:
+                workspace = self._take(name)
+            if workspace is None:
+                Path(WORKSPACES_DIR).mkdir(parents=True, exist_ok=True)
+                workspace = Workspace(name)
+                with self._lock:
+                    self._open[name] = workspace
+                    workspace.active += 1
+        return workspace
+
+    def release(self, workspace: Workspace) -> None:
+        with self._lock:
+            workspace.active -= 1
+            workspace.last_used = time.monotonic()
+
+    def collect(self) -> List[Workspace]:
+        """取出应关闭的工作区：超出容量或空闲超时，且没有进行中的请求"""
+        now = time.monotonic()
+        with self._lock:
+            if len(self._open) <= self.maxsize and now < self._next_sweep:
+                return []
+            self._next_sweep = now + SWEEP_INTERVAL_SECONDS
+            excess = len(self._open) - self.maxsize
+            evicted = []
+            for name, workspace in list(self._open.items()):  # 最久未用的在前
+                if workspace.active:
+                    continue
+                if excess > 0 or now - workspace.last_used > self.idle_seconds:
+                    del self._open[name]
+                    evicted.append(workspace)
+                    excess -= 1
+            return evicted
+
+    async def close_idle(self) -> None:
+        """后台任务（见 main.lifespan）：每隔空闲时限的一半检查一次并关闭取出的工作区，直到被取消"""
+        interval = max(SWEEP_INTERVAL_SECONDS, min(self.idle_seconds / 2, MAX_IDLE_CHECK_SECONDS))
+        while True:
+            await asyncio.sleep(interval)
+            for workspace in self.collect():
+                try:
+                    await workspace.close()
+                except Exception as e:
+                    print(f"[workspaces] failed to close {workspace.name}: {e}")
+
+    def open_workspaces(self) -> List[Workspace]:
+        with self._lock:
+            return list(self._open.values())
+
+    def _forget_all(self) -> None:
+        for workspace in self._open.values():
+            workspace.forget()
+        self._open.clear()
+
+
+registry = WorkspaceRegistry()
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=registry._forget_all)
+
+
+@contextmanager
+def workspace_engine(name: str):
+    """后台任务与命令行工具使用的临时引擎，不经过 LRU，用完即关闭"""
+    path = database_path(name)
+    bind = make_engine(path, pool_size=1)
+    try:
+        create_tables(bind, path)
+        yield bind
+    finally:
+        bind.dispose()
+
+
+class WorkspaceMiddleware:
+    """
+    ASGI 中间件：从 /w/<name>/ 前缀或 X-Workspace 请求头取得工作区，去掉前缀后再交给路由
+    /api/ 请求在处理期间占用该工作区并放在 scope["workspace"]，async_db 的会话依赖据此选择数据库
+    需位于最外层：GZip 等中间件按去掉前缀后的路径判断
+    """
+
+    def __init__(self, app, registry: WorkspaceRegistry = registry):
+        self.app = app
+        self.registry = registry
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        name = None
+        path = scope["path"]
+        if path.startswith(WORKSPACE_PREFIX):
+            # 页面与静态资源同样可以带前缀访问，前端据此给 API 请求加上相同前缀
+            name, _, rest = path[len(WORKSPACE_PREFIX):].partition("/")
+            scope["path"] = "/" + rest
+        else:
+            for key, value in scope["headers"]:
+                if key == WORKSPACE_HEADER:
+                    name = value.decode("latin-1")
+                    break
+
+        if name is None:
+            return await self.app(scope, receive, send)
+        if not valid_name(name):
+            response = JSONResponse({"detail": "Invalid workspace name"}, status_code=400)
+            return await response(scope, receive, send)
+        if not scope["path"].startswith("/api/"):
+            return await self.app(scope, receive, send)
+
+        workspace = self.registry.acquire(name, create=False) or await run_in_threadpool(self.registry.acquire, name)
+        scope["workspace"] = workspace
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.registry.release(workspace)
+            for evicted in self.registry.collect():
+                await evicted.close()
@@ -0,0 +1,208 @@
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from database import Task, SubTask, SessionLocal, WORKERS, WRITE_BEHIND_MS, begin_write
+
+# --- 写合并（write-behind）：界面上连续勾选子任务、编辑标题时，短时间内对同一行的修改先在内存中合并 ---
+# TODOEASE_WRITE_BEHIND_MS 大于 0 时开启，值为合并窗口：窗口内的修改由后台线程在一个事务中提交，
+# 一次提交代替逐个请求的提交与 fsync。只合并不影响排序与统计的字段（DEFERRABLE），其余修改照常同步提交。
+# 读取时叠加尚未提交的修改：列表/按日期接口（fastjson.assemble）、PUT 的返回值与 ETag 都反映最新状态；
+# /api/changes、/api/search 与其他客户端的 SSE 通知在提交后才可见，/api/export 导出前先提交。
+# 同步写入同一行之前先用请求自己的会话提交该行的待写入修改（flush_rows），不另占连接，异步模式下也不阻塞事件循环。
+# 待写入的修改只在本进程内存中，多进程部署（TODOEASE_WORKERS > 1）时不开启；关闭服务时提交全部修改。
+
+WRITE_BEHIND_MAX_ROWS = 1000  # 待写入的行数达到该值时不等窗口结束，立即提交
+
+DEFERRABLE = {
+    Task: frozenset(("title", "description")),
+    SubTask: frozenset(("title", "completed")),
+}
+
+Key = Tuple[Optional[str], type, int]  # (工作区, 模型, id)
+
+
+class WriteBehindQueue:
+    def __init__(self, window_ms: float = WRITE_BEHIND_MS):
+        self.window = window_ms / 1000
+        self.enabled = window_ms > 0 and WORKERS == 1  # 同 database.WRITE_BEHIND
+        self.version = 0   # 每次合并加一，列表接口的 ETag 据此区分待写入状态
+        self.commits = 0
+        self.flushed_rows = 0
+        self._pending: Dict[Key, Dict] = {}
+        self._flushing: Dict[Key, Dict] = {}  # 已取出、正在提交的修改，提交完成前读取仍需叠加
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._full = threading.Event()
+        self._thread = None
+
+    def pending(self) -> int:
+        return len(self._pending)
+
+    # --- 写入 ---
+    def update(self, db, model, obj_id: int, fields: Dict):
+        """
+        只涉及可合并字段、且目标行在活跃表中的修改记入内存，返回叠加了待写入修改的对象（会话不提交）
+        其他情况返回 None，由调用方先 flush_rows 再同步写入
+        """
+        if obj_id <= 0 or not fields or not fields.keys() <= DEFERRABLE[model]:
+            return None
+        obj = db.get(model, obj_id)
+        if obj is None:  # 已归档、重复实例或不存在，交给同步路径处理
+            return None
+        key = (db.info.get("workspace"), model, obj_id)
+        with self._lock:
+            self._pending.setdefault(key, {}).update(fields)
+            self.version += 1
+            full = len(self._pending) >= WRITE_BEHIND_MAX_ROWS
+        self._start()
+        self._wake.set()
+        if full:
+            self._full.set()
+        return self.apply(db, obj)
+
+    def flush_rows(self, db, keys: Iterable[Tuple[type, int]]) -> None:
+        """
+        同步写入这些行之前调用（调用方尚未取得写锁）：在请求的会话中先提交它们的待写入修改，避免之后被旧值覆盖
+        提交后会话回到事务之外，调用方再用 begin_write 开始自己的写事务
+        """
+        if not self._pending:
+            return
+        workspace = db.info.get("workspace")
+        wanted = {(workspace, model, obj_id) for model, obj_id in keys}
+        with self._lock:
+            if not wanted & self._pending.keys():
+                return
+        self._commit(db, workspace, wanted)
+
+    # --- 提交 ---
+    def flush(self, workspace: Optional[str] = ...) -> int:
+        """提交待写入的修改（默认所有工作区，传入工作区名时只提交该工作区，None 为默认数据库），返回提交的行数"""
+        with self._lock:
+            workspaces = {key[0] for key in self._pending}
+        if workspace is not ...:
+            workspaces &= {workspace}
+        return sum(self._flush_workspace(w) for w in workspaces)
+
+    def _flush_workspace(self, workspace: Optional[str], keys: Optional[set] = None) -> int:
+        """后台线程与关闭服务时调用：用单独的会话提交"""
+        with self._session(workspace) as db:
+            return self._commit(db, workspace, keys)
+
+    def _commit(self, db, workspace: Optional[str], keys: Optional[set] = None) -> int:
+        from archive import get_subtask, get_task
+
+        # 先取得写锁再取出修改：与调用 flush_rows 后同步写入的请求按写锁排序，不会用旧值覆盖新值
+        begin_write(db)
+        with self._lock:
+            entries = {key: fields for key, fields in self._pending.items()
+                       if key[0] == workspace and (keys is None or key in keys)}
+            for key in entries:
+                del self._pending[key]
+            self._flushing.update(entries)
+        try:
+            for (_, model, obj_id), fields in entries.items():
+                # 合并期间被归档的行先移回活跃表；已删除的行跳过
+                obj = get_task(db, obj_id) if model is Task else get_subtask(db, obj_id)
+                if obj is not None:
+                    for field, value in fields.items():
+                        setattr(obj, field, value)
+            db.commit()
+        except Exception:
+            db.rollback()
+            with self._lock:
+                for key, fields in entries.items():
+                    # 失败的修改放回队列，之后到达的同字段修改优先
+                    self._pending[key] = {**fields, **self._pending.get(key, {})}
+            self._wake.set()
+            raise
+        finally:
+            with self._lock:
+                for key, fields in entries.items():
+                    if self._flushing.get(key) is fields:
+                        del self._flushing[key]
+        if entries:
+            with self._lock:
+                self.commits += 1
+                self.flushed_rows += len(entries)
+        return len(entries)
+
+    @contextmanager
+    def _session(self, workspace: Optional[str]):
+        if workspace is None:
+            db = SessionLocal()
+            try:
+                yield db
+            finally:
+                db.close()
+            return
+        from workspaces import registry
+        opened = registry.acquire(workspace)
+        db = opened.SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+            registry.release(opened)
+
+    def _start(self) -> None:
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+                    self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            self._wake.wait()
+            self._full.wait(self.window)
+            self._wake.clear()
+            self._full.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                # 数据库忙等失败时修改已放回队列，下个窗口重试
+                print(f"[write-behind] flush failed: {e}")
+
+    def stop(self) -> None:
+        """关闭服务时调用：提交全部待写入的修改"""
+        if self._pending:
+            rows = self.flush()
+            print(f"[write-behind] flushed {rows} pending updates on shutdown")
+
+    # --- 读取：叠加待写入的修改 ---
+    def _fields(self, key: Key) -> Optional[Dict]:
+        flushing, pending = self._flushing.get(key), self._pending.get(key)
+        if flushing and pending:
+            return {**flushing, **pending}
+        return pending or flushing
+
+    def apply(self, db, obj):
+        """叠加到 ORM 对象上（任务连同其子任务）并返回该对象；只用于响应，会话不提交"""
+        if not (self._pending or self._flushing):
+            return obj
+        workspace = db.info.get("workspace")
+        objects = [obj] + (list(obj.subtasks) if isinstance(obj, Task) else [])
+        with self._lock:
+            for item in objects:
+                for field, value in (self._fields((workspace, type(item), item.id)) or {}).items():
+                    setattr(item, field, value)
+        return obj
+
+    def overlay(self, db, tasks: List[Dict]) -> None:
+        """叠加到 fastjson.assemble 输出的任务字典上"""
+        if not (self._pending or self._flushing):
+            return
+        workspace = db.info.get("workspace")
+        with self._lock:
+            for task in tasks:
+                task.update(self._fields((workspace, Task, task["id"])) or {})
+                for subtask in task["subtasks"]:
+                    subtask.update(self._fields((workspace, SubTask, subtask["id"])) or {})
+
+    def etag_suffix(self) -> str:
+        """有待写入的修改时附加到 ETag 上：修改尚未提交，revision 不变，但列表内容已变化"""
+        return f".{self.version}" if self._pending or self._flushing else ""
+
+
+write_behind = WriteBehindQueue()
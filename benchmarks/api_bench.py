@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+API 基准：在临时数据目录中生成合成数据，进程内通过 ASGI 逐个压测 backend/main.py 的接口，
+输出每个接口的吞吐量、p50/p95/p99 延迟、该接口运行期间的峰值内存以及进程峰值内存（JSON），便于跨版本对比
+用法: python benchmarks/api_bench.py [--tasks 2000] [--subtasks 3] [--days 90] [--requests 200]
+                                     [--output result.json] [--compare baseline.json]
+需要额外安装 httpx
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+import httpx
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def peak_rss_mb():
+    """整个进程生命周期的峰值常驻内存（含生成数据）；Windows 没有 resource 模块时返回 None"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 单位为 KiB，macOS 为字节
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _proc_status_mb(field):
+    with open("/proc/self/status", encoding="ascii") as f:
+        for line in f:
+            if line.startswith(field + ":"):
+                return round(int(line.split()[1]) / 1024, 1)  # 单位为 kB
+    return None
+
+
+def reset_peak_rss():
+    """
+    把本进程的峰值常驻内存（VmHWM）重置为当前值，返回当前常驻内存（MB）
+    ru_maxrss 是整个进程生命周期的峰值，不能重置；只有 Linux 支持向 /proc/self/clear_refs 写 5 重置，其他平台返回 None
+    """
+    try:
+        with open("/proc/self/clear_refs", "w", encoding="ascii") as f:
+            f.write("5")
+        return _proc_status_mb("VmRSS")
+    except OSError:
+        return None
+
+
+def scenario_memory(rss_at_start):
+    """reset_peak_rss 之后的峰值常驻内存及相对开始时的增长（MB）"""
+    if rss_at_start is None:
+        return {"peak_rss_mb": None, "rss_growth_mb": None}
+    peak = _proc_status_mb("VmHWM")
+    return {"peak_rss_mb": peak, "rss_growth_mb": round(peak - rss_at_start, 1)}
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def seed(engine, n_tasks, n_subtasks, days, start):
+    """用 executemany 直接写库；触发器照常维护 revision、daily_stats 与搜索索引"""
+    from ordering import ORDER_GAP
+
+    now = datetime.utcnow().isoformat(" ")
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            "INSERT INTO tasks (id, title, description, completed, created_at, task_date, order_index, revision) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, 0)",
+            [(i, f"task {i} project{i % 50}", f"description for task {i}", i % 3 == 0, now,
+              (start + timedelta(days=i % days)).isoformat(), i * ORDER_GAP)
+             for i in range(1, n_tasks + 1)],
+        )
+        conn.exec_driver_sql(
+            "INSERT INTO subtasks (title, completed, created_at, order_index, parent_task_id, revision) "
+            "VALUES (?, ?, ?, ?, ?, 0)",
+            [(f"subtask {j} of {i}", j % 2 == 0, now, j * ORDER_GAP, i)
+             for i in range(1, n_tasks + 1) for j in range(n_subtasks)],
+        )
+
+
+def scenarios(n_tasks, n_subtasks, days, start):
+    """
+    (名称, 生成请求的函数)；函数接收第 i 次调用和共享状态，返回 (method, url, json)
+    读接口在前，写接口在后；删除只作用于本次压测新建的任务，读数据集规模保持不变
+    """
+    mid = start + timedelta(days=days // 2)
+    all_ids = list(range(1, n_tasks + 1))
+
+    def day(i):
+        return (start + timedelta(days=i % days)).isoformat()
+
+    def task_id(i):
+        return i % n_tasks + 1
+
+    def subtask_id(i):
+        return i % (n_tasks * n_subtasks) + 1 if n_subtasks else 1
+
+    def created(state, i):
+        return state["created"][i % len(state["created"])]
+
+    def delete_created(state, i):
+        return ("DELETE", f"/api/tasks/{state['created'].pop()}", None)
+
+    return [
+        ("list-all", lambda s, i: ("GET", "/api/tasks", None)),
+        ("list-page", lambda s, i: ("GET", "/api/tasks?limit=50", None)),
+        ("by-date", lambda s, i: ("GET", f"/api/tasks/by-date?date={day(i)}", None)),
+        ("date-range", lambda s, i: ("GET", f"/api/tasks/date-range?start_date={day(i)}"
+                                            f"&end_date={(start + timedelta(days=i % days + 6)).isoformat()}", None)),
+        ("calendar-summary", lambda s, i: ("GET", f"/api/calendar/summary?year={mid.year}&month={mid.month}", None)),
+        ("calendar-year", lambda s, i: ("GET", f"/api/calendar/year?year={mid.year}", None)),
+        ("stats", lambda s, i: ("GET", "/api/stats", None)),
+        ("stats-monthly", lambda s, i: ("GET", f"/api/stats/monthly?year={mid.year}&month={mid.month}", None)),
+        ("search", lambda s, i: ("GET", f"/api/search?q=project{i % 50}", None)),
+        ("changes", lambda s, i: ("GET", f"/api/changes?since={s['revision']}", None)),
+        ("create-task", lambda s, i: ("POST", "/api/tasks", {"title": f"bench {i}", "task_date": day(i)})),
+        ("update-task", lambda s, i: ("PUT", f"/api/tasks/{task_id(i)}", {"completed": i % 2 == 0})),
+        ("move-task", lambda s, i: ("PUT", f"/api/tasks/{task_id(i)}/move",
+                                    {"after_id": task_id(i + 1), "before_id": None})),
+        ("create-subtask", lambda s, i: ("POST", f"/api/tasks/{created(s, i)}/subtasks", {"title": f"bench sub {i}"})),
+        ("update-subtask", lambda s, i: ("PUT", f"/api/subtasks/{subtask_id(i)}", {"completed": i % 2 == 1})),
+        ("reorder", lambda s, i: ("PUT", "/api/tasks/reorder", all_ids[i % 2::2] + all_ids[1 - i % 2::2])),
+        ("batch", lambda s, i: ("POST", "/api/batch", {"operations": [
+            {"type": "task", "op": "update", "id": task_id(i + k), "data": {"title": f"batch {i}.{k}"}}
+            for k in range(10)
+        ]})),
+        ("delete-task", delete_created),
+    ]
+
+
+def summarize(latencies, errors, elapsed, memory):
+    latencies.sort()
+    pct = lambda p: round(latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000, 2)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 1),
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 2),
+        "p50_ms": pct(0.50),
+        "p95_ms": pct(0.95),
+        "p99_ms": pct(0.99),
+        **memory,
+    }
+
+
+async def run(app, plan, n_requests, warmup):
+    state = {"created": [], "revision": 0}
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+        # 增量同步取最近 100 次变更：从列表接口的 ETag（W/"<revision>"）读出当前 revision
+        etag = (await client.get("/api/tasks?limit=1")).headers["etag"]
+        state["revision"] = max(0, int(etag.split('"')[1]) - 100)
+        for name, make in plan:
+            latencies, errors = [], 0
+            total = warmup + n_requests
+            started = None
+            rss_at_start = reset_peak_rss()  # 峰值只统计本接口（含预热）期间
+            for i in range(total):
+                if i == warmup:
+                    latencies, errors, started = [], 0, time.perf_counter()
+                method, url, body = make(state, i)
+                t0 = time.perf_counter()
+                r = await client.request(method, url, json=body)
+                latencies.append(time.perf_counter() - t0)
+                if r.status_code >= 400:
+                    errors += 1
+                elif name == "create-task":
+                    state["created"].append(r.json()["id"])
+            results[name] = summarize(latencies, errors, time.perf_counter() - started, scenario_memory(rss_at_start))
+            print(f"{name:<18} {results[name]['rps']:>9} {results[name]['p50_ms']:>9} "
+                  f"{results[name]['p95_ms']:>9} {results[name]['p99_ms']:>9}", file=sys.stderr)
+    return results
+
+
+def compare(result, baseline_path, threshold):
+    """与基线结果对比 p95；变慢超过 threshold 倍的接口视为回退，返回回退列表"""
+    saved = json.loads(Path(baseline_path).read_text(encoding="utf-8"))
+    if {k: v for k, v in saved["dataset"].items() if k != "seed_seconds"} != \
+            {k: v for k, v in result["dataset"].items() if k != "seed_seconds"}:
+        print("warning: baseline was recorded with a different dataset size", file=sys.stderr)
+    baseline, current = saved["endpoints"], result["endpoints"]
+    regressions = []
+    print(f"\n{'endpoint':<18} {'base p95':>9} {'p95':>9} {'ratio':>7}", file=sys.stderr)
+    for name, result in current.items():
+        if name not in baseline:
+            continue
+        base, now = baseline[name]["p95_ms"], result["p95_ms"]
+        ratio = now / base if base else float("inf")
+        flag = "  REGRESSION" if ratio > threshold else ""
+        print(f"{name:<18} {base:>9} {now:>9} {ratio:>7.2f}{flag}", file=sys.stderr)
+        if flag:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tasks", type=int, default=2000)
+    parser.add_argument("--subtasks", type=int, default=3)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--requests", type=int, default=200, help="每个接口计时的请求数")
+    parser.add_argument("--warmup", type=int, default=10, help="每个接口计时前的预热请求数")
+    parser.add_argument("--async-db", action="store_true", help="使用 TODOEASE_ASYNC_DB=1 的异步引擎")
+    parser.add_argument("--output", help="结果 JSON 写入该文件（默认输出到标准输出）")
+    parser.add_argument("--compare", help="与之前保存的结果 JSON 对比 p95")
+    parser.add_argument("--threshold", type=float, default=1.25, help="p95 变慢超过该倍数视为回退")
+    args = parser.parse_args()
+
+    # 必须在导入后端模块之前设置，database.py 在导入时读取数据目录
+    os.environ["TODOEASE_DATA_DIR"] = tempfile.mkdtemp(prefix="todoease-bench-")
+    os.environ["TODOEASE_ASYNC_DB"] = "1" if args.async_db else "0"
+    sys.path.insert(0, str(ROOT / "backend"))
+    os.chdir(ROOT)  # 静态资源以相对路径 frontend/ 挂载
+
+    from database import create_tables, engine
+
+    create_tables()
+    start = date.today() - timedelta(days=args.days // 2)
+    t0 = time.perf_counter()
+    seed(engine, args.tasks, args.subtasks, args.days, start)
+    seed_seconds = time.perf_counter() - t0
+
+    import main as backend
+
+    print(f"{'endpoint':<18} {'rps':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}", file=sys.stderr)
+    plan = scenarios(args.tasks, args.subtasks, args.days, start)
+    peak_before_run = peak_rss_mb()  # reset_peak_rss 同时会重置 ru_maxrss，先记下生成数据阶段的峰值
+    endpoints = asyncio.run(run(backend.app, plan, args.requests, args.warmup))
+
+    result = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "git_revision": git_revision(),
+            "app_version": backend.app.version,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "async_db": args.async_db,
+            "db_profile": os.environ.get("TODOEASE_DB_PROFILE", "performance"),
+        },
+        "dataset": {"tasks": args.tasks, "subtasks_per_task": args.subtasks, "days": args.days,
+                    "seed_seconds": round(seed_seconds, 2)},
+        "params": {"requests": args.requests, "warmup": args.warmup},
+        "endpoints": endpoints,
+        "peak_rss_mb": max((v for v in [peak_before_run, peak_rss_mb()] +
+                            [e["peak_rss_mb"] for e in endpoints.values()] if v is not None), default=None),
+    }
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n", encoding="utf-8")
+    else:
+        print(text)
+
+    if args.compare and compare(result, args.compare, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
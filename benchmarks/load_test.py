@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+同步 / 异步数据库模式的并发压测：分别启动 uvicorn，统计每秒请求数与 p50/p99 延迟
+用法: python benchmarks/load_test.py [--clients 50 100 200] [--duration 10] [--tasks 2000]
+需要额外安装 httpx
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+import httpx
+
+ROOT = Path(__file__).resolve().parent.parent
+
+MODES = {
+    "sync": {"TODOEASE_ASYNC_DB": "0"},
+    "async": {"TODOEASE_ASYNC_DB": "1"},
+}
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(env_overrides, port, extra_args=()):
+    env = dict(os.environ, TODOEASE_DATA_DIR=tempfile.mkdtemp(prefix="todoease-load-"), **env_overrides)
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.main:app", "--host", "127.0.0.1",
+         "--port", str(port), "--log-level", "warning", *extra_args],
+        cwd=ROOT, env=env,
+    )
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/api/stats", timeout=1)
+            return proc
+        except httpx.TransportError:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError("server did not start")
+
+
+async def seed(base, n_tasks, days):
+    start = date.today() - timedelta(days=days // 2)
+    async with httpx.AsyncClient(base_url=base, timeout=30) as client:
+        sem = asyncio.Semaphore(20)
+
+        async def one(i):
+            async with sem:
+                day = (start + timedelta(days=i % days)).isoformat()
+                await client.post("/api/tasks", json={"title": f"task {i}", "task_date": day})
+
+        await asyncio.gather(*(one(i) for i in range(n_tasks)))
+
+
+def request_mix():
+    today = date.today()
+    return [
+        ("GET", "/api/tasks?limit=50", None),
+        ("GET", f"/api/tasks/by-date?date={today.isoformat()}", None),
+        ("GET", f"/api/calendar/summary?year={today.year}&month={today.month}", None),
+        ("GET", f"/api/stats/monthly?year={today.year}&month={today.month}", None),
+        ("GET", "/api/stats", None),
+        ("POST", "/api/tasks", {"title": "load"}),
+    ]
+
+
+async def drive(base, clients, duration):
+    """clients 个并发客户端循环发送 request_mix，返回 (各请求延迟, 错误数, 耗时)"""
+    mix = request_mix()
+    latencies, errors = [], 0
+    stop_at = time.perf_counter() + duration
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+
+    async with httpx.AsyncClient(base_url=base, timeout=60, limits=limits) as client:
+        async def worker(k):
+            nonlocal errors
+            i = k
+            while time.perf_counter() < stop_at:
+                method, url, body = mix[i % len(mix)]
+                i += 1
+                t0 = time.perf_counter()
+                try:
+                    r = await client.request(method, url, json=body)
+                    if r.status_code >= 400:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append(time.perf_counter() - t0)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(k) for k in range(clients)))
+        elapsed = time.perf_counter() - started
+    return latencies, errors, elapsed
+
+
+def summarize(clients, latencies, errors, elapsed):
+    latencies.sort()
+    pct = lambda p: latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+    return {
+        "clients": clients,
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(pct(0.50), 1),
+        "p99_ms": round(pct(0.99), 1),
+    }
+
+
+async def run_level(base, clients, duration):
+    return summarize(clients, *await drive(base, clients, duration))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--clients", type=int, nargs="+", default=[50, 100, 200])
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--tasks", type=int, default=2000)
+    parser.add_argument("--days", type=int, default=60)
+    args = parser.parse_args()
+
+    print(f"{'mode':<6} {'clients':>7} {'requests':>9} {'errors':>6} {'rps':>8} {'p50 ms':>8} {'p99 ms':>8}")
+    for mode, env in MODES.items():
+        port = free_port()
+        proc = start_server(env, port)
+        base = f"http://127.0.0.1:{port}"
+        try:
+            asyncio.run(seed(base, args.tasks, args.days))
+            for clients in args.clients:
+                r = asyncio.run(run_level(base, clients, args.duration))
+                print(f"{mode:<6} {r['clients']:>7} {r['requests']:>9} {r['errors']:>6} "
+                      f"{r['rps']:>8} {r['p50_ms']:>8} {r['p99_ms']:>8}")
+        finally:
+            proc.terminate()
+            proc.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+对比迁移前后的查询计划与耗时
+用法: python benchmarks/query_plans.py [--tasks 50000] [--subtasks 3] [--days 365]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+QUERIES = {
+    "by-date": (
+        "SELECT * FROM tasks WHERE task_date = :d ORDER BY order_index",
+        lambda start, days: {"d": (start + timedelta(days=days // 2)).isoformat()},
+    ),
+    "date-range": (
+        "SELECT * FROM tasks WHERE task_date >= :s AND task_date <= :e ORDER BY task_date DESC",
+        lambda start, days: {"s": (start + timedelta(days=days // 2)).isoformat(),
+                             "e": (start + timedelta(days=days // 2 + 6)).isoformat()},
+    ),
+    "calendar": (
+        "SELECT task_date, COUNT(*), SUM(completed) FROM tasks "
+        "WHERE task_date >= :s AND task_date < :e GROUP BY task_date",
+        lambda start, days: {"s": (start + timedelta(days=days // 2)).isoformat(),
+                             "e": (start + timedelta(days=days // 2 + 31)).isoformat()},
+    ),
+    "subtasks-of-task": (
+        "SELECT * FROM subtasks WHERE parent_task_id = :p ORDER BY order_index",
+        lambda start, days: {"p": 1},
+    ),
+    "list-page": (
+        "SELECT * FROM tasks ORDER BY order_index, id LIMIT 100",
+        lambda start, days: {},
+    ),
+}
+
+
+# 迁移前（user_version = 0）的表结构，按当时 create_all 生成的语句固定写出；
+# 之后的列、索引和触发器都由迁移补上，基准同时验证整条迁移链
+BASELINE_DDL = [
+    """CREATE TABLE tasks (
+        id INTEGER NOT NULL,
+        title VARCHAR NOT NULL,
+        description VARCHAR,
+        completed BOOLEAN,
+        created_at DATETIME,
+        task_date DATE,
+        order_index INTEGER,
+        PRIMARY KEY (id)
+    )""",
+    "CREATE INDEX ix_tasks_id ON tasks (id)",
+    """CREATE TABLE subtasks (
+        id INTEGER NOT NULL,
+        title VARCHAR NOT NULL,
+        completed BOOLEAN,
+        created_at DATETIME,
+        order_index INTEGER,
+        parent_task_id INTEGER,
+        PRIMARY KEY (id),
+        FOREIGN KEY(parent_task_id) REFERENCES tasks (id)
+    )""",
+    "CREATE INDEX ix_subtasks_id ON subtasks (id)",
+]
+
+
+def seed(conn, n_tasks, n_subtasks, days, start):
+    now = datetime.utcnow().isoformat(" ")
+    conn.exec_driver_sql(
+        "INSERT INTO tasks (id, title, description, completed, created_at, task_date, order_index) "
+        "VALUES (?, ?, '', ?, ?, ?, ?)",
+        [(i, f"task {i}", i % 3 == 0, now, (start + timedelta(days=i % days)).isoformat(), i)
+         for i in range(1, n_tasks + 1)],
+    )
+    conn.exec_driver_sql(
+        "INSERT INTO subtasks (title, completed, created_at, order_index, parent_task_id) "
+        "VALUES (?, 0, ?, ?, ?)",
+        [(f"sub {j}", now, j, i) for i in range(1, n_tasks + 1) for j in range(n_subtasks)],
+    )
+
+
+def measure(conn, start, days, repeat):
+    from sqlalchemy import text
+    results = {}
+    for name, (sql, params) in QUERIES.items():
+        bound = params(start, days)
+        plan = [row[-1] for row in conn.execute(text("EXPLAIN QUERY PLAN " + sql), bound)]
+        t0 = time.perf_counter()
+        for _ in range(repeat):
+            conn.execute(text(sql), bound).fetchall()
+        elapsed = (time.perf_counter() - t0) / repeat * 1000
+        results[name] = (plan, elapsed)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tasks", type=int, default=50000)
+    parser.add_argument("--subtasks", type=int, default=3)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    os.environ["TODOEASE_DATA_DIR"] = tempfile.mkdtemp(prefix="todoease-bench-")
+    sys.path.insert(0, str(ROOT / "backend"))
+    import database
+    from migrations import MIGRATIONS
+
+    # 旧版数据库：迁移前的表结构、只有主键索引、user_version = 0
+    start = date.today() - timedelta(days=args.days)
+    with database.engine.begin() as conn:
+        for sql in BASELINE_DDL:
+            conn.exec_driver_sql(sql)
+        seed(conn, args.tasks, args.subtasks, args.days, start)
+
+    with database.engine.connect() as conn:
+        before = measure(conn, start, args.days, args.repeat)
+    # 与启动时相同：create_all 补建新表，再依次执行全部迁移
+    database.create_tables()
+    with database.engine.connect() as conn:
+        after = measure(conn, start, args.days, args.repeat)
+
+    print(f"\n{args.tasks} tasks x {args.subtasks} subtasks over {args.days} days "
+          f"(schema v0 -> v{MIGRATIONS[-1][0]})\n")
+    for name in QUERIES:
+        (plan_b, ms_b), (plan_a, ms_a) = before[name], after[name]
+        print(f"{name}: {ms_b:.2f} ms -> {ms_a:.2f} ms")
+        print(f"  before: {' | '.join(plan_b)}")
+        print(f"  after:  {' | '.join(plan_a)}")
+
+
+if __name__ == "__main__":
+    main()
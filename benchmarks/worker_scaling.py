@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+多 worker 吞吐量基准：分别以 1、2、4... 个 uvicorn worker 启动后端（共享同一个数据库文件），
+用多个客户端进程施加与 load_test.py 相同的读写混合负载，输出每种 worker 数的吞吐量、延迟与错误数
+用法: python benchmarks/worker_scaling.py [--workers 1 2 4] [--clients 200] [--client-procs 4]
+                                          [--duration 10] [--async-db] [--output result.json]
+需要额外安装 httpx；客户端进程与服务端共用 CPU，核数较少时结果偏保守
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import sys
+
+from load_test import drive, free_port, seed, start_server, summarize
+
+
+def _drive_in_process(job):
+    base, clients, duration = job
+    return asyncio.run(drive(base, clients, duration))
+
+
+def run_load(pool, base, clients, procs, duration):
+    """把 clients 个并发客户端平均分到 procs 个进程，合并各进程的延迟后统计"""
+    jobs = [(base, clients // procs + (1 if k < clients % procs else 0), duration) for k in range(procs)]
+    latencies, errors, elapsed = [], 0, 0.0
+    for part_latencies, part_errors, part_elapsed in pool.map(_drive_in_process, [j for j in jobs if j[1]]):
+        latencies += part_latencies
+        errors += part_errors
+        elapsed = max(elapsed, part_elapsed)
+    return summarize(clients, latencies, errors, elapsed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--clients", type=int, default=200, help="并发客户端总数")
+    parser.add_argument("--client-procs", type=int, default=max(1, min(4, (os.cpu_count() or 2) // 2)),
+                        help="施压的客户端进程数")
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--warmup", type=float, default=2, help="每轮计时前的预热秒数（等待所有 worker 就绪）")
+    parser.add_argument("--tasks", type=int, default=2000)
+    parser.add_argument("--days", type=int, default=60)
+    parser.add_argument("--async-db", action="store_true", help="使用 TODOEASE_ASYNC_DB=1 的异步引擎")
+    parser.add_argument("--output", help="结果 JSON 写入该文件")
+    args = parser.parse_args()
+
+    results = []
+    print(f"{'workers':>7} {'clients':>7} {'requests':>9} {'errors':>6} {'rps':>8} {'p50 ms':>8} {'p99 ms':>8}",
+          file=sys.stderr)
+    with multiprocessing.Pool(args.client_procs) as pool:
+        for workers in args.workers:
+            env = {"TODOEASE_WORKERS": str(workers), "TODOEASE_ASYNC_DB": "1" if args.async_db else "0"}
+            extra = ("--workers", str(workers)) if workers > 1 else ()
+            port = free_port()
+            proc = start_server(env, port, extra)
+            base = f"http://127.0.0.1:{port}"
+            try:
+                asyncio.run(seed(base, args.tasks, args.days))
+                run_load(pool, base, args.client_procs, args.client_procs, args.warmup)
+                r = run_load(pool, base, args.clients, args.client_procs, args.duration)
+            finally:
+                proc.terminate()
+                proc.wait()
+            r["workers"] = workers
+            results.append(r)
+            print(f"{workers:>7} {r['clients']:>7} {r['requests']:>9} {r['errors']:>6} "
+                  f"{r['rps']:>8} {r['p50_ms']:>8} {r['p99_ms']:>8}", file=sys.stderr)
+
+    output = {
+        "cpu_count": os.cpu_count(),
+        "client_procs": args.client_procs,
+        "duration": args.duration,
+        "async_db": args.async_db,
+        "results": results,
+    }
+    text = json.dumps(output, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
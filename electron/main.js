@@ -4,8 +4,7 @@ const path = require('path');
 const { spawn } = require('child_process');
 const http = require('http');
 const fs = require('fs');
-// 禁用 HTTP 缓存（开发/打包都生效）
-app.commandLine.appendSwitch('disable-http-cache');
+// 不再禁用 HTTP 缓存：index.html 每次重新验证，静态资源带内容指纹可长期缓存（见 backend/static_assets.py）
 
 let mainWindow;
 let pythonProcess;
@@ -58,23 +57,13 @@ function createWindow() {
     mainWindow.loadURL('data:text/html;charset=utf-8,' + encodeURIComponent(inline));
   }
 
-  // wait then switch
-  // wait then switch（清缓存 + 加时间戳防缓存）
-  waitForServer(BACKEND_URL, 60000, 300)
-    .then(async () => {
-      try {
-        // 清理缓存与 ServiceWorker/caches
-        await mainWindow.webContents.session.clearCache();
-        await mainWindow.webContents.session.clearStorageData({
-          storages: ['serviceworkers', 'caches']
-        });
-      } catch (e) {
-        // 忽略清理异常，继续加载
-        console.warn('clear cache error:', e);
-      }
-      // 加上时间戳参数，确保 index.html 不被缓存
-      const urlWithTs = `${BACKEND_URL}?t=${Date.now()}`;
-      return mainWindow.loadURL(urlWithTs);
+  // wait then switch（保留 HTTP 缓存，未变化的资源直接命中缓存或得到 304）
+  // 轮询间隔 100ms：后端就绪后最多多等一个间隔
+  const waitStart = Date.now();
+  waitForServer(BACKEND_URL, 60000, 100)
+    .then(() => {
+      console.log(`backend ready in ${Date.now() - waitStart} ms`);
+      return mainWindow.loadURL(BACKEND_URL);
     })
     .catch((err) => {
       dialog.showErrorBox('Backend failed to start', (err && err.message) || String(err));
@@ -86,7 +75,7 @@ function createWindow() {
 function startPythonBackend() {
   if (isDev) {
     const py = process.platform === 'win32' ? 'python' : 'python3';
-    pythonProcess = spawn(py, ['-m', 'uvicorn', 'backend.main:app', '--host', '127.0.0.1', '--port', '8000'], {
+    pythonProcess = spawn(py, ['-m', 'uvicorn', 'backend.main:app', '--host', '127.0.0.1', '--port', '8000', '--ws', 'none'], {
       cwd: path.join(__dirname, '..'),
       stdio: 'inherit',
       shell: false
@@ -1,3 +1,6 @@
+/** 通过 /w/<工作区>/ 打开页面时，API 请求加上相同前缀（见 backend/workspaces.py） **/
+const API_ROOT = (location.pathname.match(/^\/w\/[A-Za-z0-9_-]+/) || [""])[0];
+
 class ToDoEase {
   constructor() {
     /** 任务与 UI 状态 **/
@@ -29,6 +32,27 @@ class ToDoEase {
     this.updateTopDate(today);   // 同步头部日期显示
 
     this.loadTasks();
+    this.subscribeEvents();
+  }
+
+  /** ------------ 实时更新：/api/events 推送，其他窗口的修改到达后重新加载 ------------ **/
+  subscribeEvents() {
+    if (!window.EventSource) return;
+    const source = new EventSource(`${API_ROOT}/api/events`);
+    const reload = () => {
+      clearTimeout(this.reloadTimer);
+      // 合并短时间内的多条通知；正在输入时推迟，避免打断编辑
+      this.reloadTimer = setTimeout(() => {
+        const active = document.activeElement;
+        if (active && (active.tagName === "INPUT" || active.tagName === "TEXTAREA") && active.value) {
+          reload();
+          return;
+        }
+        this.loadTasks();
+      }, 300);
+    };
+    source.addEventListener("change", reload);
+    source.addEventListener("resync", reload);
   }
 
 
@@ -193,7 +217,7 @@ class ToDoEase {
   /** ------------ API：任务 CRUD ------------ **/
   async loadTasks() {
     try {
-      const res = await fetch("/api/tasks");
+      const res = await fetch(`${API_ROOT}/api/tasks`);
       const data = await res.json();
       this.tasks = Array.isArray(data) ? data : [];
       this.tasks.forEach(t => { if (!Array.isArray(t.subtasks)) t.subtasks = []; });
@@ -258,7 +282,7 @@ class ToDoEase {
         taskDate = this.formatDateKey(new Date());
       }
 
-      const res = await fetch("/api/tasks", {
+      const res = await fetch(`${API_ROOT}/api/tasks`, {
         method: "POST",
         headers: { "Content-Type": "application/json" },
         body: JSON.stringify({ title, description, task_date: taskDate }),
@@ -284,7 +308,7 @@ class ToDoEase {
     try {
       const task = this.tasks.find(t => t.id === taskId);
       if (!task) return;
-      const res = await fetch(`/api/tasks/${taskId}`, {
+      const res = await fetch(`${API_ROOT}/api/tasks/${taskId}`, {
         method: "PUT",
         headers: { "Content-Type": "application/json" },
         body: JSON.stringify({ completed: !task.completed }),
@@ -310,7 +334,7 @@ class ToDoEase {
       }
       if (!subtask) return;
 
-      const res = await fetch(`/api/subtasks/${subtaskId}`, {
+      const res = await fetch(`${API_ROOT}/api/subtasks/${subtaskId}`, {
         method: "PUT",
         headers: { "Content-Type": "application/json" },
         body: JSON.stringify({ completed: !subtask.completed }),
@@ -329,7 +353,7 @@ class ToDoEase {
 
   async deleteTask(taskId) {
     try {
-      const res = await fetch(`/api/tasks/${taskId}`, { method: "DELETE" });
+      const res = await fetch(`${API_ROOT}/api/tasks/${taskId}`, { method: "DELETE" });
       if (!res.ok) return;
       this.tasks = this.tasks.filter(t => t.id !== taskId);
       this.collapseState.delete(taskId);
@@ -345,7 +369,7 @@ class ToDoEase {
 
   async createSubtask(taskId, title) {
     try {
-      const res = await fetch(`/api/tasks/${taskId}/subtasks`, {
+      const res = await fetch(`${API_ROOT}/api/tasks/${taskId}/subtasks`, {
         method: "POST",
         headers: { "Content-Type": "application/json" },
         body: JSON.stringify({ title }),
@@ -371,7 +395,7 @@ class ToDoEase {
 
   async deleteSubtask(subtaskId) {
     try {
-      const res = await fetch(`/api/subtasks/${subtaskId}`, { method: "DELETE" });
+      const res = await fetch(`${API_ROOT}/api/subtasks/${subtaskId}`, { method: "DELETE" });
       if (!res.ok) return;
       for (const t of this.tasks) {
         t.subtasks = (t.subtasks || []).filter(s => s.id !== subtaskId);
@@ -514,7 +538,7 @@ class ToDoEase {
 
   async saveTaskOrder(taskIds) {
     try {
-      await fetch("/api/tasks/reorder", {
+      await fetch(`${API_ROOT}/api/tasks/reorder`, {
         method: "PUT",
         headers: { "Content-Type": "application/json" },
         body: JSON.stringify(taskIds),
@@ -530,7 +554,7 @@ class ToDoEase {
     try {
       const year = this.currentDisplayMonth.getFullYear();
       const month = this.currentDisplayMonth.getMonth() + 1;
-      const res = await fetch(`/api/stats/monthly?year=${year}&month=${month}`);
+      const res = await fetch(`${API_ROOT}/api/stats/monthly?year=${year}&month=${month}`);
       if (!res.ok) throw new Error(`HTTP ${res.status}`);
       const stats = await res.json();
 
@@ -37,9 +37,34 @@ def main():
         "--paths", str(BACKEND_DIR),
         "--hidden-import=models",
         "--hidden-import=database",
+        "--hidden-import=pagination",
+        "--hidden-import=migrations",
+        "--hidden-import=ordering",
+        "--hidden-import=async_db",
+        "--hidden-import=batch",
+        "--hidden-import=changelog",
+        "--hidden-import=cache",
+        "--hidden-import=rollup",
+        "--hidden-import=search",
+        "--hidden-import=fastjson",
+        "--hidden-import=orjson",
+        "--hidden-import=static_assets",
+        "--hidden-import=startup",
+        "--hidden-import=metrics",
+        "--hidden-import=events",
+        "--hidden-import=transfer",
+        "--hidden-import=archive",
+        "--hidden-import=recurrence",
+        "--hidden-import=workspaces",
+        "--hidden-import=writeback",
+        "--hidden-import=aiosqlite",
+        "--hidden-import=sqlalchemy.dialects.sqlite.aiosqlite",
         "--exclude-module=pysqlite2",
         "--exclude-module=MySQLdb",
         "--exclude-module=psycopg2",
+        # 打包版不需要热重载和 WebSocket，去掉可省下启动时 import uvicorn 加载 watchfiles 的时间
+        "--exclude-module=watchfiles",
+        "--exclude-module=websockets",
         "--workpath", "build/pyi_tmp",
         "--distpath", str(DIST_DIR),
         str(BACKEND_ENTRY)
@@ -50,6 +75,8 @@ def main():
     fe_dir = PROJECT_ROOT / "frontend"
     if fe_dir.exists():
         shutil.copytree(fe_dir, out_dir / "frontend", dirs_exist_ok=True)
+        # 生成 .gz / .br 预压缩文件，运行时按 Accept-Encoding 直接返回
+        run([sys.executable, str(BACKEND_DIR / "static_assets.py"), str(out_dir / "frontend")])
 
     print(f"OK: backend built at {out_dir}")
 
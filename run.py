@@ -15,11 +15,14 @@ def install_requirements():
         return False
     return True
 
-def start_backend():
-    """启动Python后端服务"""
+def start_backend(workers=1):
+    """启动Python后端服务；workers 大于 1 时以多进程模式运行（共享同一个数据库文件）"""
     try:
-        print("启动ToDoEase后端服务...")
-        subprocess.run([sys.executable, "-m", "uvicorn", "backend.main:app", "--host", "127.0.0.1", "--port", "8000"])
+        print("启动ToDoEase后端服务..." if workers == 1 else f"启动ToDoEase后端服务（{workers} 个 worker）...")
+        args = [sys.executable, "-m", "uvicorn", "backend.main:app", "--host", "127.0.0.1", "--port", "8000", "--ws", "none", "--timeout-graceful-shutdown", "3"]
+        if workers > 1:
+            args += ["--workers", str(workers)]
+        subprocess.run(args, env=dict(os.environ, TODOEASE_WORKERS=str(workers)))
     except KeyboardInterrupt:
         print("\nToDoEase已停止运行")
     except Exception as e:
@@ -40,9 +43,12 @@ def main():
         return
     
     # 启动服务
+    # python run.py --workers 4
+    workers = int(sys.argv[sys.argv.index("--workers") + 1]) if "--workers" in sys.argv else 1
+    
     print("\n访问地址: http://127.0.0.1:8000")
     print("按 Ctrl+C 停止服务\n")
-    start_backend()
+    start_backend(workers)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
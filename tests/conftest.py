@@ -0,0 +1,42 @@
+import os
+import sys
+import tempfile
+
+# 后端模块在导入时读取环境变量、创建引擎：必须在导入 main 之前设置好
+os.environ["TODOEASE_DATA_DIR"] = tempfile.mkdtemp(prefix="todoease-test-")
+os.environ["TODOEASE_DB_POOL_SIZE"] = "2"
+os.environ["TODOEASE_DB_POOL_TIMEOUT"] = "3"
+os.environ.pop("TODOEASE_ASYNC_DB", None)
+os.environ.pop("TODOEASE_WORKSPACES", None)
+os.environ.pop("TODOEASE_WRITE_BEHIND_MS", None)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+import pytest
+from fastapi.testclient import TestClient
+
+
+@pytest.fixture(scope="session")
+def app():
+    import main
+    return main.app
+
+
+@pytest.fixture
+def client(app):
+    from database import (SessionLocal, Task, SubTask, DailyStat, TaskTemplate, TemplateOccurrence,
+                          ArchivedTask, ArchivedSubTask)
+
+    db = SessionLocal()
+    try:
+        db.query(SubTask).delete()
+        db.query(Task).delete()
+        db.query(ArchivedSubTask).delete()
+        db.query(ArchivedTask).delete()
+        db.query(DailyStat).delete()
+        db.query(TemplateOccurrence).delete()
+        db.query(TaskTemplate).delete()
+        db.commit()
+    finally:
+        db.close()
+    with TestClient(app) as c:
+        yield c
@@ -0,0 +1,48 @@
+from datetime import date
+
+import pytest
+
+OLD_DATE = "2020-01-06"
+
+
+@pytest.fixture
+def archived(client):
+    """新建的数据库（create_all 建表）中一个已归档、带一个子任务的任务"""
+    from archive import archive_completed
+
+    task = client.post("/api/tasks", json={"title": "旧任务", "completed": True, "task_date": OLD_DATE}).json()
+    client.post(f"/api/tasks/{task['id']}/subtasks", json={"title": "旧子任务"})
+    assert archive_completed(days=30, today=date(2026, 1, 1)) == 1
+    assert client.get("/api/tasks").json() == []
+    return task["id"]
+
+
+def _by_date(client):
+    return client.get("/api/tasks/by-date", params={"date": OLD_DATE}).json()
+
+
+def test_update_restores(client, archived):
+    response = client.put(f"/api/tasks/{archived}", json={"title": "改过"})
+    assert response.status_code == 200
+    assert [s["title"] for s in response.json()["subtasks"]] == ["旧子任务"]
+    assert [t["title"] for t in client.get("/api/tasks").json()] == ["改过"]
+    assert [t["title"] for t in _by_date(client)] == ["改过"]  # 不会同时留在归档表中
+
+
+def test_delete_restores(client, archived):
+    assert client.delete(f"/api/tasks/{archived}").status_code == 200
+    assert _by_date(client) == []
+    assert client.get("/api/stats").json()["total_tasks"] == 0
+
+
+def test_create_subtask_restores(client, archived):
+    assert client.post(f"/api/tasks/{archived}/subtasks", json={"title": "新子任务"}).status_code == 200
+    assert [s["title"] for s in client.get("/api/tasks").json()[0]["subtasks"]] == ["旧子任务", "新子任务"]
+
+
+def test_batch_restores(client, archived):
+    response = client.post("/api/batch", json={"operations": [
+        {"op": "update", "type": "task", "id": archived, "data": {"completed": False}},
+    ]})
+    assert response.status_code == 200
+    assert client.get("/api/tasks").json()[0]["completed"] is False
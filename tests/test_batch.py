@@ -0,0 +1,45 @@
+import pytest
+
+
+@pytest.fixture
+def task(client):
+    task = client.post("/api/tasks", json={"title": "任务"}).json()
+    client.post(f"/api/tasks/{task['id']}/subtasks", json={"title": "子任务"})
+    return client.get("/api/tasks").json()[0]
+
+
+def _batch(client, operations, atomic=True):
+    return client.post("/api/batch", json={"operations": operations, "atomic": atomic})
+
+
+def test_update_after_delete_fails(client, task):
+    """删除后再修改同一条：报错并整批回滚，而不是返回成功却丢掉修改"""
+    response = _batch(client, [
+        {"op": "delete", "type": "task", "id": task["id"]},
+        {"op": "update", "type": "task", "id": task["id"], "data": {"title": "改过"}},
+    ])
+    assert response.status_code == 400
+    assert response.json()["results"][1] == {"index": 1, "ok": False, "id": None,
+                                              "error": "Task was deleted earlier in this batch"}
+    assert client.get("/api/tasks").json() == [task]
+
+
+def test_create_subtask_under_deleted_task_fails(client, task):
+    """父任务在同一批中已删除时不能再为它建子任务（否则提交后留下孤儿子任务，仍能被搜索到）"""
+    response = _batch(client, [
+        {"op": "delete", "type": "task", "id": task["id"]},
+        {"op": "create", "type": "subtask", "task_id": task["id"], "data": {"title": "孤儿"}},
+    ], atomic=False)
+    assert response.status_code == 200
+    assert [r["ok"] for r in response.json()["results"]] == [True, False]
+    assert client.get("/api/tasks").json() == []
+    assert client.get("/api/search", params={"q": "孤儿"}).json()["results"] == []
+
+
+def test_subtask_of_deleted_task_fails(client, task):
+    """子任务随父任务级联删除后同样不能再修改"""
+    response = _batch(client, [
+        {"op": "delete", "type": "task", "id": task["id"]},
+        {"op": "update", "type": "subtask", "id": task["subtasks"][0]["id"], "data": {"completed": True}},
+    ])
+    assert response.json()["results"][1]["error"] == "Subtask was deleted earlier in this batch"
@@ -0,0 +1,139 @@
+import pytest
+
+import migrations
+from database import make_engine, create_tables
+from migrations import SCHEMA_VERSION, get_schema_version, migrate
+
+# 迁移前（user_version = 0）的表结构，与 benchmarks/query_plans.py 相同
+BASELINE_DDL = [
+    """CREATE TABLE tasks (
+        id INTEGER NOT NULL, title VARCHAR NOT NULL, description VARCHAR, completed BOOLEAN,
+        created_at DATETIME, task_date DATE, order_index INTEGER, PRIMARY KEY (id)
+    )""",
+    "CREATE INDEX ix_tasks_id ON tasks (id)",
+    """CREATE TABLE subtasks (
+        id INTEGER NOT NULL, title VARCHAR NOT NULL, completed BOOLEAN, created_at DATETIME,
+        order_index INTEGER, parent_task_id INTEGER, PRIMARY KEY (id),
+        FOREIGN KEY(parent_task_id) REFERENCES tasks (id)
+    )""",
+    "CREATE INDEX ix_subtasks_id ON subtasks (id)",
+    "INSERT INTO tasks (id, title, description, completed, task_date, order_index) "
+    "VALUES (1, 'old', '', 0, '2024-01-02', 1)",
+    "INSERT INTO subtasks (id, title, completed, order_index, parent_task_id) VALUES (1, 'old sub', 1, 0, 1)",
+]
+
+
+@pytest.fixture
+def old_engine(tmp_path):
+    path = str(tmp_path / "old.db")
+    bind = make_engine(path, pool_size=1)
+    with bind.begin() as conn:
+        for sql in BASELINE_DDL:
+            conn.exec_driver_sql(sql)
+    yield bind, path
+    bind.dispose()
+
+
+def _fail(conn):
+    raise RuntimeError("interrupted")
+
+
+def _tables(conn):
+    return {name for (name,) in conn.exec_driver_sql("SELECT name FROM sqlite_master WHERE type = 'table'")}
+
+
+@pytest.mark.parametrize("version", [3, 6])
+def test_interrupted_migration_rolls_back(old_engine, monkeypatch, version):
+    """迁移中途失败时整体回滚（不留下新增的列或 *_rebuild 表），重新执行后升级到最新版本"""
+    bind, path = old_engine
+    broken = [(v, d, steps + [_fail] if v == version else steps) for v, d, steps in migrations.MIGRATIONS]
+    monkeypatch.setattr(migrations, "MIGRATIONS", broken)
+    with pytest.raises(RuntimeError):
+        create_tables(bind, path)
+
+    with bind.connect() as conn:
+        assert get_schema_version(conn) == 0
+        columns = {row[1] for row in conn.exec_driver_sql("PRAGMA table_info(tasks)")}
+        assert "revision" not in columns
+        assert not {"tasks_rebuild", "subtasks_rebuild"} & _tables(conn)
+
+    monkeypatch.undo()
+    assert migrate(bind) == SCHEMA_VERSION
+    with bind.connect() as conn:
+        assert conn.exec_driver_sql("SELECT title, order_index FROM tasks").all() == [("old", 1024)]
+        assert conn.exec_driver_sql("SELECT total, completed FROM daily_stats").all() == [(1, 0)]
+        assert conn.exec_driver_sql("SELECT title FROM subtasks WHERE parent_task_id = 1").all() == [("old sub",)]
+
+
+def test_new_database_is_stamped(tmp_path):
+    path = str(tmp_path / "new.db")
+    bind = make_engine(path, pool_size=1)
+    try:
+        create_tables(bind, path)
+        with bind.connect() as conn:
+            assert get_schema_version(conn) == SCHEMA_VERSION
+            assert "meta" in _tables(conn)
+    finally:
+        bind.dispose()
+
+
+def _schema(conn):
+    """每张表的列（名称、类型、非空、默认值、主键）以及索引、触发器名称；不比较建表语句的写法"""
+    schema = {}
+    for name, kind in conn.exec_driver_sql(
+            "SELECT name, type FROM sqlite_master WHERE name NOT LIKE 'sqlite_%' AND name NOT LIKE 'search_%'"):
+        if kind == "table":
+            schema[name] = [row[1:] for row in conn.exec_driver_sql(f"PRAGMA table_info({name})")]
+        else:
+            schema[name] = kind
+    return schema
+
+
+def test_new_database_matches_migrated(old_engine, tmp_path):
+    """create_all 新建的库与从旧结构迁移上来的库结构一致（如 revision 的 DEFAULT 0，外部脚本插入时依赖它）"""
+    bind, path = old_engine
+    create_tables(bind, path)
+    new_path = str(tmp_path / "new.db")
+    new_bind = make_engine(new_path, pool_size=1)
+    try:
+        create_tables(new_bind, new_path)
+        with bind.connect() as migrated, new_bind.connect() as new:
+            assert _schema(new) == _schema(migrated)
+            new.exec_driver_sql("INSERT INTO tasks (title) VALUES ('external')")
+            assert new.exec_driver_sql("SELECT revision FROM tasks").scalar() > 0
+    finally:
+        new_bind.dispose()
+
+
+def test_revision_default_added_to_new_database_from_version_8(tmp_path, monkeypatch):
+    """版本 8 及以前由 create_all 新建的库 revision 没有默认值，迁移 9 补上，数据与索引保留"""
+    from database import Task, SubTask
+
+    path = str(tmp_path / "v8.db")
+    bind = make_engine(path, pool_size=1)
+    try:
+        for model in (Task, SubTask):
+            monkeypatch.setattr(model.__table__.c.revision, "server_default", None)
+        create_tables(bind, path)
+        monkeypatch.undo()
+        with bind.begin() as conn:
+            conn.exec_driver_sql("INSERT INTO tasks (title, revision) VALUES ('t', 0)")
+            conn.exec_driver_sql("INSERT INTO subtasks (title, parent_task_id, revision) VALUES ('s', 1, 0)")
+            conn.exec_driver_sql("PRAGMA user_version = 8")
+        defaults = lambda conn, table: [r[4] for r in conn.exec_driver_sql(f"PRAGMA table_info({table})")
+                                        if r[1] == "revision"]
+        with bind.connect() as conn:
+            assert defaults(conn, "tasks") == [None]
+            indexes = {name for (name,) in conn.exec_driver_sql("SELECT name FROM sqlite_master WHERE type = 'index'")}
+
+        assert migrate(bind) == SCHEMA_VERSION
+        with bind.connect() as conn:
+            assert defaults(conn, "tasks") == defaults(conn, "subtasks") == ["0"]
+            assert conn.exec_driver_sql("SELECT title FROM tasks").all() == [("t",)]
+            assert conn.exec_driver_sql("SELECT title FROM subtasks").all() == [("s",)]
+            assert indexes <= {name for (name,) in conn.exec_driver_sql(
+                "SELECT name FROM sqlite_master WHERE type = 'index'")}
+            conn.exec_driver_sql("INSERT INTO tasks (title) VALUES ('external')")  # 触发器照常工作
+            assert conn.exec_driver_sql("SELECT revision FROM tasks WHERE title = 'external'").scalar() > 0
+    finally:
+        bind.dispose()
@@ -0,0 +1,58 @@
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+from database import SessionLocal, Task, engine
+
+
+@contextmanager
+def count_statements():
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+def _add_tasks(client, count, subtasks=3):
+    for i in range(count):
+        task = client.post("/api/tasks", json={"title": f"t{i}"}).json()
+        for j in range(subtasks):
+            client.post(f"/api/tasks/{task['id']}/subtasks", json={"title": f"s{j}"})
+
+
+def _list_statements(client):
+    with count_statements() as statements:
+        response = client.get("/api/tasks")
+    assert response.status_code == 200
+    return len(statements), response.json()
+
+
+def test_task_list_query_count_is_constant(client):
+    """GET /api/tasks 的语句数与任务数、子任务数无关（子任务一次 IN 查询批量加载）"""
+    _add_tasks(client, 1)
+    one, tasks = _list_statements(client)
+    assert len(tasks) == 1
+
+    _add_tasks(client, 49)
+    many, tasks = _list_statements(client)
+    assert len(tasks) == 50 and all(len(t["subtasks"]) == 3 for t in tasks)
+    assert many == one
+
+
+def test_subtasks_relationship_loads_in_one_query(client):
+    """Task.subtasks 为 selectin：加载任意多个任务的子任务只多一条语句"""
+    _add_tasks(client, 20)
+    db = SessionLocal()
+    try:
+        with count_statements() as statements:
+            tasks = db.query(Task).all()
+            assert sum(len(t.subtasks) for t in tasks) == 60
+        assert len(statements) == 2
+    finally:
+        db.close()
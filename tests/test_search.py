@@ -0,0 +1,51 @@
+import pytest
+
+TEXTS = [
+    ("准备合同", "和法务确认预算"),
+    ("合同预算评审", ""),
+    ("写周报", "Review 合同"),
+    ("买菜", "a,b 清单"),
+]
+
+
+def _search(client, q):
+    response = client.get("/api/search", params={"q": q, "limit": 100})
+    assert response.status_code == 200
+    return {(r["type"], r["id"]) for r in response.json()["results"]}
+
+
+def _expected(client, q):
+    """逐行做子串匹配，与搜索接口的结果对照"""
+    terms = [t.lower() for t in q.split()]
+    found = set()
+    for task in client.get("/api/tasks").json():
+        text = f"{task['title']}\n{task['description']}".lower()
+        if all(t in text for t in terms):
+            found.add(("task", task["id"]))
+        for subtask in task["subtasks"]:
+            if all(t in subtask["title"].lower() for t in terms):
+                found.add(("subtask", subtask["id"]))
+    return found
+
+
+@pytest.mark.parametrize("q", ["合同", "预算", "合", "周", "a,", ",b", "re", "R", "合同 预算", "合同 review", "同", "单"])
+def test_short_terms_match_substrings(client, q):
+    """1–2 个字符的词走短词索引，结果与子串匹配一致；修改、删除后索引随之更新"""
+    ids = []
+    for title, description in TEXTS:
+        task = client.post("/api/tasks", json={"title": title, "description": description}).json()
+        ids.append(task["id"])
+    client.post(f"/api/tasks/{ids[3]}/subtasks", json={"title": "合同扫描件"})
+    assert _search(client, q) == _expected(client, q)
+
+    client.put(f"/api/tasks/{ids[0]}", json={"title": "准备材料", "description": ""})
+    client.delete(f"/api/tasks/{ids[1]}")
+    assert _search(client, q) == _expected(client, q)
+
+
+def test_short_terms_order_and_pages(client):
+    ids = [client.post("/api/tasks", json={"title": f"合同 {i}"}).json()["id"] for i in range(5)]
+    first = client.get("/api/search", params={"q": "合同", "limit": 3}).json()
+    second = client.get("/api/search", params={"q": "合同", "limit": 3, "offset": first["next_offset"]}).json()
+    assert [r["id"] for r in first["results"] + second["results"]] == ids[::-1]
+    assert second["next_offset"] is None
@@ -0,0 +1,56 @@
+import asyncio
+
+from database import DB_POOL_SIZE
+
+
+async def _open_streams(app, count: int):
+    """
+    同时打开 count 个 GET /api/tasks?stream=true：每个流发出第一块数据后停住，
+    等所有流都开始输出后再一起读完，期间各自的连接都不释放
+    """
+    started = 0
+    all_started = asyncio.Event()
+    finished = asyncio.Event()
+
+    async def one():
+        status = None
+        requested = False
+
+        async def receive():
+            nonlocal requested
+            if not requested:
+                requested = True
+                return {"type": "http.request", "body": b"", "more_body": False}
+            await finished.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            nonlocal started, status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body" and message.get("body"):
+                started += 1
+                if started == count:
+                    all_started.set()
+                await all_started.wait()
+
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+            "scheme": "http", "path": "/api/tasks", "raw_path": b"/api/tasks", "root_path": "",
+            "query_string": b"stream=true", "headers": [(b"host", b"testserver")],
+            "client": ("127.0.0.1", 1234), "server": ("testserver", 80),
+        }
+        await app(scope, receive, send)
+        return status
+
+    try:
+        return await asyncio.wait_for(asyncio.gather(*(one() for _ in range(count))), 20)
+    finally:
+        finished.set()
+
+
+def test_concurrent_streams_fit_in_pool(app, client):
+    """连接池大小个并发的流式列表请求都能完成：每个流只占用一个连接"""
+    for i in range(3):
+        assert client.post("/api/tasks", json={"title": f"t{i}"}).status_code == 200
+    assert asyncio.run(_open_streams(app, DB_POOL_SIZE)) == [200] * DB_POOL_SIZE
@@ -0,0 +1,31 @@
+import pytest
+
+
+def _create(client):
+    response = client.post("/api/templates", json={
+        "title": "周报", "frequency": "weekly", "weekdays": [4], "start_date": "2026-10-01",
+    })
+    assert response.status_code == 200
+    return response.json()
+
+
+@pytest.mark.parametrize("field", ["title", "description", "subtasks", "frequency", "interval",
+                                   "weekdays", "start_date", "order_index"])
+def test_update_rejects_null(client, field):
+    """显式传 null 返回 422，模板保持不变（不能写进非空列后变成 500）"""
+    template = _create(client)
+    response = client.put(f"/api/templates/{template['id']}", json={field: None})
+    assert response.status_code == 422
+    assert [t for t in client.get("/api/templates").json() if t["id"] == template["id"]] == [template]
+
+
+def test_update_partial_and_clear_end_date(client):
+    """省略的字段不修改；end_date 可以显式清除"""
+    template = _create(client)
+    response = client.put(f"/api/templates/{template['id']}", json={"end_date": "2026-12-31", "title": "月报"})
+    assert response.status_code == 200
+    assert response.json() == {**template, "end_date": "2026-12-31", "title": "月报"}
+
+    response = client.put(f"/api/templates/{template['id']}", json={"end_date": None})
+    assert response.status_code == 200
+    assert response.json() == {**template, "title": "月报"}
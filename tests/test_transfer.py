@@ -0,0 +1,31 @@
+import json
+
+import pytest
+
+
+def _import(client, body, fmt="ndjson"):
+    response = client.post("/api/import", params={"format": fmt}, content=body.encode())
+    assert response.status_code == 200
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+@pytest.mark.parametrize("task", [{"title": "b"}, {"title": "b", "task_date": None}, {"title": "b", "task_date": ""}])
+def test_import_rejects_missing_task_date(client, task):
+    """缺少 task_date 的行报错并给出行号，不会被当作今天导入"""
+    body = json.dumps({"title": "a", "task_date": "2026-01-02"}) + "\n" + json.dumps(task) + "\n"
+    progress = _import(client, body)
+    assert progress[-1]["error"] == "line 2: task_date is required"
+    assert client.get("/api/tasks").json() == []
+
+
+def test_import_csv_rejects_missing_task_date(client):
+    body = "type,id,title,task_date\ntask,1,a,2026-01-02\ntask,2,b,\n"
+    assert _import(client, body, "csv")[-1]["error"] == "line 3: task_date is required"
+
+
+def test_round_trip(client):
+    """导出的数据可以原样导入，日期保持不变"""
+    client.post("/api/tasks", json={"title": "a", "task_date": "2026-01-02"})
+    exported = client.get("/api/export").text
+    assert _import(client, exported)[-1]["done"] is True
+    assert [t["task_date"] for t in client.get("/api/tasks").json()] == ["2026-01-02", "2026-01-02"]
@@ -0,0 +1,35 @@
+import os
+import subprocess
+import sys
+import textwrap
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 工作区开关在导入 main 时读取，测试进程中已经导入的 main 没有开启，在子进程中运行
+SCRIPT = textwrap.dedent("""
+    import time
+    from fastapi.testclient import TestClient
+    import main
+    from workspaces import registry
+
+    with TestClient(main.app) as client:
+        for name in ("a", "b"):
+            assert client.get("/api/tasks", headers={"X-Workspace": name}).status_code == 200
+        assert sorted(w.name for w in registry.open_workspaces()) == ["a", "b"]
+        deadline = time.monotonic() + 5
+        while registry.open_workspaces() and time.monotonic() < deadline:
+            assert client.get("/api/tasks").status_code == 200  # 只有默认数据库的请求
+            time.sleep(0.2)
+        print(sorted(w.name for w in registry.open_workspaces()))
+""")
+
+
+def test_idle_workspaces_closed_without_workspace_requests(tmp_path):
+    """空闲的工作区由后台任务关闭，不依赖之后再有工作区请求"""
+    env = {**os.environ, "TODOEASE_DATA_DIR": str(tmp_path), "TODOEASE_WORKSPACES": "1",
+           "TODOEASE_WORKSPACE_IDLE_SECONDS": "0.5", "PYTHONPATH": os.path.join(ROOT, "backend")}
+    # cwd 为仓库根目录：静态资源以相对路径 frontend/ 挂载
+    result = subprocess.run([sys.executable, "-c", SCRIPT], cwd=ROOT, env=env,
+                            capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.splitlines()[-1] == "[]"